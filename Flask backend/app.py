@@ -1,18 +1,22 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-from langchain_chroma import Chroma
-from langchain.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
 from dotenv import load_dotenv
 import os
 
 # Functions
-from utils.get_embedding_function import get_embedding_function
-from utils.query_rag import query_rag
-from utils.populate_db import populate_database
-from utils.clear_db import clear_chroma_database
-import utils.test_rag as test_rag
+from utils.vector_store import get_db, collection_name, count_chunks, server_mode, store_location
+from utils.get_embedding_function import NATIVE_DIMENSIONS
+from utils.context_packer import MIN_TAIL_TOKENS
+from utils.query_rag import coalescing_stats, query_embedding_cache, query_rag, query_rag_batch
+from utils.admission import llm_admission
+from utils.llm_cache import prompt_cache
+from utils import metrics
+# Ingestion (populate/clear), embedding migration and evaluation are imported
+# inside their endpoints: a worker that only answers queries never loads the
+# PDF loaders, splitters or eval code.
+from utils.warmup import is_ready, start_warmup, warmup_status
 from routes.user_routes import bp as profile_bp
+from services.profile_cache import profile_cache
 
 
 # Load environment variables
@@ -23,6 +27,10 @@ CORS(app)  #  CORS for React frontend
 
 CHROMA_PATH = "chroma"
 
+# open Chroma / SQLite / clients and prime caches in the background;
+# /api/status answers 503 until this is done
+start_warmup()
+
 
 # Health check endpoint 
 @app.route('/', methods=['GET']) 
@@ -33,9 +41,13 @@ def health_check():
         "message": "RAG Flask Server is running",
         "endpoints": {
             "query": "/api/query (POST)",
+            "query_batch": "/api/query/batch (POST)",
             "health": "/ (GET)",
             "status": "/api/status (GET)",
-            "populate": "/api/populate (POST)"
+            "metrics": "/api/metrics (GET)",
+            "test_rag": "/api/test-rag (GET/POST starts a run, GET /api/test-rag/<job_id> polls)",
+            "populate": "/api/populate (POST starts a run, GET polls)",
+            "migrate_embeddings": "/api/migrate-embeddings (POST, GET)"
         }
     })
 
@@ -44,6 +56,15 @@ def health_check():
 def status_endpoint():
      
     try:
+        # Not hot yet – keep the load balancer from routing traffic here
+        if not is_ready():
+            return jsonify({
+                "success": False,
+                "ready": False,
+                "message": "Warming up",
+                "warmup": warmup_status()
+            }), 503
+
         # Check if OpenAI API key is set
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
@@ -52,26 +73,32 @@ def status_endpoint():
                 "message": "OpenAI API key not configured"
             }), 500
         
-        # Check if Chroma database exists
-        if not os.path.exists(CHROMA_PATH):
+        # Check if Chroma database exists (a Chroma server creates it on demand)
+        if not server_mode() and not os.path.exists(CHROMA_PATH):
             return jsonify({
                 "success": False,
                 "message": "Chroma database not found. Run populate_database.py first."
             }), 500
         
         # Try to initialize the database
-        embedding_function = get_embedding_function()
-        db = Chroma(persist_directory=CHROMA_PATH, embedding_function=embedding_function)
+        db = get_db()
         
-        # Get database stats
-        collection = db.get()
-        doc_count = len(collection['ids']) if collection['ids'] else 0
+        # Get database stats (summed over shards, if sharded)
+        doc_count = count_chunks(db)
         
         return jsonify({
             "success": True,
+            "ready": True,
             "message": "System is ready",
             "database_documents": doc_count,
-            "chroma_path": CHROMA_PATH
+            "chroma_path": store_location(),
+            "collection": collection_name(),
+            "profile_cache": profile_cache.stats(),
+            "query_coalescing": coalescing_stats(),
+            "llm_admission": llm_admission.stats(),
+            "llm_cache": prompt_cache.stats(),
+            "query_embedding_cache": query_embedding_cache.stats(),
+            "warmup": warmup_status()
         })
         
     except Exception as e:
@@ -80,11 +107,42 @@ def status_endpoint():
             "message": f"Configuration error: {str(e)}"
         }), 500
 
+# In-process counters / gauges / latency summaries (per worker)
+@app.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    return jsonify(metrics.snapshot())
+
+# Optional per-request settings shared by /api/query and /api/query/batch
+MIN_TOKEN_BUDGET = MIN_TAIL_TOKENS        # less leaves too little of a chunk to answer from
+MAX_TOKEN_BUDGET = 8000
+
+def query_options(data):
+    """token_budget / mmr_lambda from the request body; ValueError (-> 400) if one is malformed."""
+    token_budget = data.get('token_budget')
+    if token_budget is not None and (
+        isinstance(token_budget, bool) or not isinstance(token_budget, int)
+        or not MIN_TOKEN_BUDGET <= token_budget <= MAX_TOKEN_BUDGET
+    ):
+        raise ValueError(
+            f"'token_budget' must be an integer between {MIN_TOKEN_BUDGET} and {MAX_TOKEN_BUDGET}"
+        )
+    mmr_lambda = data.get('mmr_lambda')
+    if mmr_lambda is not None and (
+        isinstance(mmr_lambda, bool) or not isinstance(mmr_lambda, (int, float))
+        or not 0 <= mmr_lambda <= 1                      # also rejects NaN
+    ):
+        raise ValueError("'mmr_lambda' must be a number between 0 and 1")
+    return {
+        "token_budget": token_budget,
+        "mmr_lambda": float(mmr_lambda) if mmr_lambda is not None else None,
+    }
+
 #  Main query endpoint for RAG system
 @app.route('/api/query', methods=['POST'])
 def query_endpoint():
     
-    # Expected JSON: {"query": "your question here"}
+    # Expected JSON: {"query": "your question here", "user_id": "...", "token_budget": 1500 (optional),
+    #                 "mmr_lambda": 0.7 (optional, lower = more diverse context)}
   
     try:
         # Check if request has JSON data
@@ -110,11 +168,24 @@ def query_endpoint():
                 "success": False,
                 "message": "Query cannot be empty"
             }), 400
+
+        try:
+            options = query_options(data)
+        except ValueError as e:
+            return jsonify({"success": False, "message": str(e)}), 400
         
         # Process the query using imported query_rag function
         #result = query_rag(query_text)
-        result = query_rag(query_text=data['query'], user_id=data['user_id'])
+        result = query_rag(
+            query_text=data['query'],
+            user_id=data['user_id'],
+            **options,
+        )
         
+        # Shed under load: 429 (queue full) / 503 (waited too long) + Retry-After
+        if 'retry_after' in result:
+            return jsonify(result), result['status'], {"Retry-After": str(result['retry_after'])}
+
         # Return appropriate status code
         status_code = 200 if result['success'] else 500
         
@@ -128,7 +199,65 @@ def query_endpoint():
             "sources": []
         }), 500
 
-# Populate database endpoint
+# Batch query endpoint – many questions, one embedding call, concurrent LLM calls
+# Expected JSON: {"items": [{"query": "...", "user_id": "..."}, ...],
+#                 "max_concurrency": 4 (optional), "token_budget": 1500 (optional),
+#                 "mmr_lambda": 0.7 (optional)}
+MAX_BATCH_ITEMS = 100
+
+@app.route('/api/query/batch', methods=['POST'])
+def query_batch_endpoint():
+    try:
+        if not request.is_json:
+            return jsonify({
+                "success": False,
+                "message": "Request must be JSON"
+            }), 400
+
+        data = request.get_json() or {}
+        items = data.get('items')
+        if not isinstance(items, list) or not items:
+            return jsonify({
+                "success": False,
+                "message": "Missing 'items' list in request body"
+            }), 400
+        if len(items) > MAX_BATCH_ITEMS:
+            return jsonify({
+                "success": False,
+                "message": f"At most {MAX_BATCH_ITEMS} items per batch"
+            }), 413
+        if not all(isinstance(it, dict) and 'query' in it and 'user_id' in it for it in items):
+            return jsonify({
+                "success": False,
+                "message": "Every item needs 'query' and 'user_id'"
+            }), 400
+        try:
+            options = query_options(data)
+        except ValueError as e:
+            return jsonify({"success": False, "message": str(e)}), 400
+
+        result = query_rag_batch(
+            items,
+            max_concurrency=data.get('max_concurrency'),
+            **options,
+        )
+        shed = [r for r in result['results'] if 'retry_after' in r]
+        if not shed:
+            return jsonify(result), 200
+        # some items were shed: tell the client when to retry them; if nothing
+        # got through, the whole batch is a 429/503
+        headers = {"Retry-After": str(max(r['retry_after'] for r in shed))}
+        status_code = 200 if result['succeeded'] else max(r['status'] for r in shed)
+        return jsonify(result), status_code, headers
+
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "message": f"Server error: {str(e)}"
+        }), 500
+
+# Populate database endpoint – runs in the background (a full ingest takes
+# longer than the worker timeout); poll GET /api/populate for the result
 @app.route('/api/populate', methods=['POST'])
 def populate_endpoint():
     """
@@ -138,14 +267,12 @@ def populate_endpoint():
     try:
         data = request.get_json() if request.is_json else {}
         reset = data.get('reset', False)
-        
-        # Process the database population using imported function
-        result = populate_database(reset=reset)
-        
-        # Return appropriate status code
-        status_code = 200 if result['success'] else 500
-        
-        return jsonify(result), status_code
+        if not isinstance(reset, bool):
+            return jsonify({"success": False, "message": "'reset' must be true or false"}), 400
+
+        from utils.populate_db import start_populate
+        result = start_populate(reset=reset)
+        return jsonify(result), 202 if result['success'] else 409
         
     except Exception as e:
         return jsonify({
@@ -153,44 +280,76 @@ def populate_endpoint():
             "message": f"Server error: {str(e)}"
         }), 500
 
+
+# state of this worker's populate run; "failed" with "busy" in the result
+# means another worker held the write lock
+@app.route('/api/populate', methods=['GET'])
+def populate_status():
+    from utils.populate_db import get_populate_status
+    return jsonify({"success": True, "populate": get_populate_status()}), 200
+
 # Clear database endpoint
 @app.route('/api/clear-db', methods=['POST'])
 def clear_db():
     try:
+        from utils.clear_db import clear_chroma_database
         result = clear_chroma_database()
-        return jsonify(result), 200
+        return jsonify(result), 409 if result.get('busy') else 200
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
 
-@app.route('/api/test-rag', methods=['GET'])
-def run_rag_tests():
+# Re-embed the collection at another dimension in the background
+# Expected JSON: {"dimensions": 512}
+@app.route('/api/migrate-embeddings', methods=['POST'])
+def migrate_embeddings_endpoint():
     try:
-        results = []
-
-        # Run each test and collect pass/fail
-        for test_func, name in [
-            (test_rag.test_monopoly_rules, "Monopoly Rules Test"),
-            (test_rag.test_ticket_to_ride_rules, "Ticket to Ride Rules Test"),
-        ]:
-            try:
-                passed = test_func()
-                results.append({
-                    "test_name": name,
-                    "status": "passed" if passed else "failed"
-                })
-            except Exception as e:
-                results.append({
-                    "test_name": name,
-                    "status": "error",
-                    "error": str(e)
-                })
+        data = request.get_json() if request.is_json else {}
+        if not data or 'dimensions' not in data:
+            return jsonify({
+                "success": False,
+                "message": "Missing 'dimensions' parameter in request body"
+            }), 400
 
-        return jsonify({
-            "success": True,
-            "results": results
-        }), 200
+        dims = data['dimensions']
+        if isinstance(dims, bool) or not isinstance(dims, int) or not 1 <= dims <= NATIVE_DIMENSIONS:
+            return jsonify({
+                "success": False,
+                "message": f"'dimensions' must be an integer between 1 and {NATIVE_DIMENSIONS}"
+            }), 400
 
+        from utils.migrate_embeddings import start_migration
+        result = start_migration(dims)
+        return jsonify(result), 202 if result['success'] else 409
+    except Exception as e:
+        return jsonify({"success": False, "message": f"Server error: {str(e)}"}), 500
+
+
+@app.route('/api/migrate-embeddings', methods=['GET'])
+def migrate_embeddings_status():
+    from utils.migrate_embeddings import get_migration_status
+    return jsonify({"success": True, "migration": get_migration_status()}), 200
+
+
+# Evaluation runs in the background; poll the job for the report.
+# Optional JSON (POST): {"cases": "eval/cases.jsonl", "judge": "auto|deterministic|llm",
+#                        "concurrency": 4}
+# "cases" must be a .jsonl under eval/, "concurrency" an int in 1..16
+@app.route('/api/test-rag', methods=['GET', 'POST'])
+def run_rag_tests():
+    try:
+        data = (request.get_json(silent=True) or {}) if request.method == 'POST' else {}
+        from utils.eval_rag import start_eval
+        result = start_eval(
+            path=data.get('cases'),
+            judge_mode=data.get('judge', 'auto'),
+            concurrency=data.get('concurrency'),
+        )
+        result["status_url"] = f"/api/test-rag/{result['job_id']}"
+        return jsonify(result), 202
+
+    except ValueError as e:          # bad cases path / judge / concurrency
+        return jsonify({"success": False, "message": str(e)}), 400
     except Exception as e:
         return jsonify({
             "success": False,
@@ -198,6 +357,15 @@ def run_rag_tests():
         }), 500
 
 
+@app.route('/api/test-rag/<job_id>', methods=['GET'])
+def rag_test_status(job_id):
+    from utils.eval_rag import get_eval_job
+    job = get_eval_job(job_id)
+    if job is None:
+        return jsonify({"success": False, "message": "Unknown job id"}), 404
+    return jsonify({"success": True, **job}), 200
+
+
 # This line registers a Blueprint with  Flask application, enabling the routes defined in another file  to be used in the main app.
 app.register_blueprint(profile_bp)
 
@@ -213,7 +381,9 @@ if __name__ == '__main__':
         exit(1)
     
     # Check if database exists
-    if not os.path.exists(CHROMA_PATH):
+    if server_mode():
+        print(f"🌐 Using Chroma server at {store_location()}")
+    elif not os.path.exists(CHROMA_PATH):
         print(f"⚠️  Warning: Chroma database not found at {CHROMA_PATH}")
         print("Run 'python populate_database.py' to create the database first")
     
@@ -222,7 +392,7 @@ if __name__ == '__main__':
     print("  GET  /              - Health check")
     print("  GET  /api/status    - System status")
     print("  POST /api/query     - Query the RAG system")
-    print("  POST /api/populate  - Populate database with PDFs")
+    print("  POST /api/populate  - Populate database with PDFs (GET polls the run)")
    
     print("       -H 'Content-Type: application/json' \\")
     print("       -d '{\"reset\": true}'")
@@ -0,0 +1,102 @@
+"""
+compare_dimensions.py
+—————————————————————————————————
+Compares collections built at different embedding dimensions
+(see utils/migrate_embeddings.py) on:
+
+  • search latency   – mean / p95 of similarity search per query
+  • storage          – raw vector bytes and on-disk size of the Chroma dir
+  • quality          – overlap@k of each collection's top-k with the
+                       reference (largest) dimension's top-k
+
+Queries come from a text file (one per line) or a small built-in list.
+Only the queries are embedded, once per dimension.
+
+    python -m benchmarks.compare_dimensions --dims 1536 512 256 --k 6
+"""
+
+import argparse
+import json
+import os
+import time
+from typing import List
+
+import numpy as np
+
+from utils.get_embedding_function import get_embedding_function
+from utils.retrieval import search_shards
+from utils.vector_store import CHROMA_PATH, collection_name, count_chunks, get_db
+
+DEFAULT_QUERIES = [
+    "How much money does each player start with?",
+    "How is the longest continuous train scored?",
+    "What happens when a player lands on Free Parking?",
+    "How many train cards does each player draw at the start?",
+    "What is the aim of the project?",
+]
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total
+
+
+def compare(dims: List[int], queries: List[str], k: int) -> dict:
+    reference = max(dims)
+    per_dim, top_ids = {}, {}
+
+    for d in dims:
+        db = get_db(d)
+        count = count_chunks(db)
+        if not count:
+            per_dim[d] = {"collection": collection_name(d), "error": "empty collection"}
+            continue
+
+        vectors = get_embedding_function(d).embed_documents(queries)
+        latencies, top_ids[d] = [], []
+        for vec in vectors:
+            t0 = time.perf_counter()
+            hits = search_shards(db, vec, k)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            top_ids[d].append([doc.metadata.get("id") for doc, _ in hits])
+
+        per_dim[d] = {
+            "collection": collection_name(d),
+            "chunks": count,
+            "vector_bytes": count * d * 4,
+            "search_ms_mean": round(float(np.mean(latencies)), 2),
+            "search_ms_p95": round(float(np.percentile(latencies, 95)), 2),
+        }
+
+    for d in top_ids:
+        if reference not in top_ids:
+            break
+        overlaps = [
+            len(set(a) & set(b)) / max(len(b), 1)
+            for a, b in zip(top_ids[d], top_ids[reference])
+        ]
+        per_dim[d][f"overlap_at_{k}_vs_{reference}"] = round(float(np.mean(overlaps)), 4)
+
+    return {
+        "queries": len(queries),
+        "k": k,
+        "chroma_dir_bytes": _dir_size(CHROMA_PATH),
+        "dimensions": per_dim,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare embedding dimensions")
+    parser.add_argument("--dims", type=int, nargs="+", default=[1536, 512])
+    parser.add_argument("--k", type=int, default=6)
+    parser.add_argument("--queries", help="text file with one query per line")
+    args = parser.parse_args()
+
+    queries = DEFAULT_QUERIES
+    if args.queries:
+        with open(args.queries, encoding="utf-8") as fh:
+            queries = [line.strip() for line in fh if line.strip()]
+
+    print(json.dumps(compare(args.dims, queries, args.k), indent=2))
@@ -0,0 +1,100 @@
+"""
+import_benchmark.py
+—————————————————————————————————
+Cold-start guard for the query-serving process.
+
+Imports `app` in fresh interpreters (`python -X importtime`, warm-up off),
+takes the median cumulative import time, and checks which modules got
+loaded. It exits 1, so CI fails, when:
+
+  • the median exceeds `max_ms` in benchmarks/import_budget.json, or
+  • any module in its `forbidden` list is imported eagerly (ingestion,
+    eval, the OpenAI / Chroma clients, … – those load on demand or in the
+    background warm-up)
+
+    python -m benchmarks.import_benchmark            # check
+    python -m benchmarks.import_benchmark --update   # re-baseline max_ms
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BUDGET_FILE = os.path.join(os.path.dirname(__file__), "import_budget.json")
+HEADROOM = 1.5          # --update sets max_ms to median * HEADROOM
+
+_PROBE = "import json, sys; import {module}; print(json.dumps(sorted(sys.modules)))"
+
+
+def measure_once(module: str) -> tuple:
+    """(cumulative import ms of `module`, set of loaded module names)."""
+    env = {**os.environ, "WARMUP": "0", "PYTHONDONTWRITEBYTECODE": "1"}
+    env.setdefault("OPENAI_API_KEY", "import-benchmark")
+    # profile_service creates its tables at import – keep profiles.db untouched
+    env["PROFILE_DB_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROBE.format(module=module)],
+        capture_output=True, text=True, env=env, check=False,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{proc.stderr[-2000:]}")
+
+    cumulative_us = None
+    for line in proc.stderr.splitlines():
+        parts = [p.strip() for p in line.split("|")]
+        if len(parts) == 3 and parts[2] == module:
+            cumulative_us = int(parts[1])
+    if cumulative_us is None:
+        raise RuntimeError(f"no -X importtime line for {module}")
+    loaded = set(json.loads(proc.stdout.strip().splitlines()[-1]))
+    return cumulative_us / 1000, loaded
+
+
+def run(runs: int, budget: dict) -> dict:
+    module = budget.get("module", "app")
+    samples, loaded = [], set()
+    for _ in range(runs):
+        ms, loaded = measure_once(module)
+        samples.append(ms)
+
+    median = statistics.median(samples)
+    forbidden = sorted(m for m in budget.get("forbidden", []) if m in loaded)
+    return {
+        "module": module,
+        "runs": runs,
+        "median_ms": round(median, 1),
+        "min_ms": round(min(samples), 1),
+        "max_ms_budget": budget.get("max_ms"),
+        "modules_loaded": len(loaded),
+        "forbidden_loaded": forbidden,
+        "ok": not forbidden and (budget.get("max_ms") is None or median <= budget["max_ms"]),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fail if importing the app got slower")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--update", action="store_true",
+                        help=f"write median x {HEADROOM} as the new max_ms")
+    args = parser.parse_args()
+
+    with open(BUDGET_FILE, encoding="utf-8") as fh:
+        budget = json.load(fh)
+    report = run(args.runs, budget)
+    print(json.dumps(report, indent=2))
+
+    if args.update:
+        budget["max_ms"] = round(report["median_ms"] * HEADROOM)
+        with open(BUDGET_FILE, "w", encoding="utf-8") as fh:
+            json.dump(budget, fh, indent=2)
+            fh.write("\n")
+        print(f"📝 max_ms set to {budget['max_ms']}")
+    elif not report["ok"]:
+        print("❌ cold-start regression")
+        sys.exit(1)
+    else:
+        print("✅ import time within budget")
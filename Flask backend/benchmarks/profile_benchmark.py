@@ -0,0 +1,77 @@
+"""
+profile_benchmark.py
+—————————————————————————————————
+Profiles/sec for onboarding a team: one create_or_update() per profile
+(the old per-request path) vs. a single bulk_upsert(), plus per-id get()
+vs. get_many() with a cold cache.
+
+Runs against a throw-away SQLite file so profiles.db is never touched.
+
+    python -m benchmarks.profile_benchmark --n 5000
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+
+def run(n: int) -> dict:
+    tmp_dir = tempfile.mkdtemp(prefix="profile-bench-")
+    # must be set before profile_service creates its engine
+    os.environ["PROFILE_DB_URL"] = f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}"
+
+    from services import profile_service
+    from services.profile_cache import profile_cache
+
+    items = [
+        {"user_id": f"user-{i}", "role": "developer", "interests": ["AI", "Python"]}
+        for i in range(n)
+    ]
+
+    def rate(seconds: float) -> float:
+        return round(n / seconds, 1) if seconds else float("inf")
+
+    t0 = time.perf_counter()
+    for it in items:
+        profile_service.create_or_update(it["user_id"], it["role"], it["interests"])
+    single_write = time.perf_counter() - t0
+
+    for it in items:
+        it["role"] = "manager"
+    t0 = time.perf_counter()
+    profile_service.bulk_upsert(items)
+    bulk_write = time.perf_counter() - t0
+
+    ids = [it["user_id"] for it in items]
+    profile_cache.clear()
+    t0 = time.perf_counter()
+    for uid in ids:
+        profile_service.get(uid)
+    single_read = time.perf_counter() - t0
+
+    profile_cache.clear()
+    t0 = time.perf_counter()
+    profile_service.get_many(ids)
+    bulk_read = time.perf_counter() - t0
+
+    return {
+        "profiles": n,
+        "write_profiles_per_sec": {
+            "create_or_update": rate(single_write),
+            "bulk_upsert": rate(bulk_write),
+        },
+        "read_profiles_per_sec": {
+            "get": rate(single_read),
+            "get_many": rate(bulk_read),
+        },
+        "db": os.environ["PROFILE_DB_URL"],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profile write/read throughput")
+    parser.add_argument("--n", type=int, default=5000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.n), indent=2))
@@ -0,0 +1,111 @@
+"""
+quantization_benchmark.py
+—————————————————————————————————
+Recall@k vs. memory for the quantized first pass, measured on our own corpus.
+
+Uses the exported vector snapshot (run `python -m utils.vector_snapshot export`
+first) and samples chunk embeddings as queries, so no OpenAI calls are made.
+Ground truth is the exact float32 top-k.
+
+    python -m benchmarks.quantization_benchmark --queries 200 --k 6 --pq-m 96
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from utils.quantization import Int8Quantizer, ProductQuantizer, memory_bytes, top_candidates
+from utils.vector_snapshot import RESCORE_FACTOR, load_snapshot
+
+
+def _exact_topk(emb: np.ndarray, norms: np.ndarray, q: np.ndarray, k: int) -> np.ndarray:
+    dist = norms - 2.0 * emb @ q
+    top = np.argpartition(dist, min(k, len(dist) - 1))[:k + 1]
+    return top[np.argsort(dist[top])]
+
+
+def _rescore(emb: np.ndarray, norms: np.ndarray, q: np.ndarray, cand: np.ndarray, k: int) -> np.ndarray:
+    dist = norms[cand] - 2.0 * emb[cand] @ q
+    return cand[np.argsort(dist)[:k]]
+
+
+def run(n_queries: int, k: int, pq_m: int, seed: int = 0) -> dict:
+    snap = load_snapshot()
+    if snap is None or len(snap) == 0:
+        raise SystemExit("No snapshot found. Run `python -m utils.vector_snapshot export` first.")
+
+    emb = np.asarray(snap.embeddings, dtype=np.float32)
+    norms = np.einsum("ij,ij->i", emb, emb)
+    n, dim = emb.shape
+    rng = np.random.default_rng(seed)
+    q_rows = rng.choice(n, size=min(n_queries, n), replace=False)
+
+    int8 = Int8Quantizer.fit(emb)
+    int8_codes = int8.encode(emb)
+    int8_norms = int8.sq_norms(int8_codes)
+    methods = {"int8": lambda q: int8.distances(int8_codes, int8_norms, q)}
+    if pq_m and dim % pq_m == 0:
+        pq = ProductQuantizer.fit(emb, m=pq_m)
+        pq_codes = pq.encode(emb)
+        methods["pq"] = lambda q: pq.distances(pq_codes, q)
+
+    def recall(found, truth):
+        return len(set(found.tolist()) & set(truth.tolist())) / len(truth)
+
+    report = {
+        "corpus_chunks": int(n),
+        "dim": int(dim),
+        "queries": int(len(q_rows)),
+        "k": k,
+        "rescore_factor": RESCORE_FACTOR,
+        "methods": {},
+    }
+
+    t0 = time.perf_counter()
+    truths = {}
+    for r in q_rows:
+        # the query chunk itself is always nearest; drop it from the truth set
+        truths[r] = [i for i in _exact_topk(emb, norms, emb[r], k) if i != r][:k]
+    exact_ms = (time.perf_counter() - t0) * 1000 / len(q_rows)
+    report["methods"]["float32"] = {
+        "bytes": memory_bytes(n, dim, "float32"),
+        "recall_at_k": 1.0,
+        "ms_per_query": round(exact_ms, 3),
+    }
+
+    for name, approx_fn in methods.items():
+        raw_recall, rescored_recall, elapsed = [], [], 0.0
+        for r in q_rows:
+            q, truth = emb[r], np.asarray(truths[r])
+            t0 = time.perf_counter()
+            approx = approx_fn(q)
+            approx[r] = np.inf
+            cand = top_candidates(approx, k * RESCORE_FACTOR)
+            rescored = _rescore(emb, norms, q, cand, k)
+            elapsed += time.perf_counter() - t0
+
+            raw_recall.append(recall(cand[np.argsort(approx[cand])][:k], truth))
+            rescored_recall.append(recall(rescored, truth))
+
+        mem = memory_bytes(n, dim, name, pq_m)
+        report["methods"][name] = {
+            "bytes": mem,
+            "memory_saved": round(1 - mem / memory_bytes(n, dim, "float32"), 4),
+            "recall_at_k": round(float(np.mean(raw_recall)), 4),
+            "recall_at_k_rescored": round(float(np.mean(rescored_recall)), 4),
+            "ms_per_query": round(elapsed * 1000 / len(q_rows), 3),
+        }
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall@k vs. memory for quantized search")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=6)
+    parser.add_argument("--pq-m", type=int, default=96)
+    args = parser.parse_args()
+
+    result = run(args.queries, args.k, args.pq_m)
+    print(json.dumps(result, indent=2))
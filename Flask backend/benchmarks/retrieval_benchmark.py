@@ -0,0 +1,219 @@
+"""
+retrieval_benchmark.py
+—————————————————————————————————
+Retrieval-only quality benchmark: no LLM calls, and after the first run no
+embedding calls either (query vectors are cached on disk).
+
+For every query with known relevant chunk ids it measures, over a grid of
+first-pass depths (k) and ranking weights (ALPHA/BETA/GAMMA):
+
+  • first pass  – recall@k and latency of `retrieve` (snapshot/partitions/Chroma)
+  • ranked      – recall@top_k, MRR and latency of `rank` over those candidates
+
+Labels come from a JSONL file, one query per line:
+
+    {"query": "What is the aim of the project?",
+     "relevant": ["data/FYP Proposal - Group 21.pdf:2:0"],
+     "profile": {"role": "researcher", "interests": ["AI"]}}
+
+or, without labels, `--synthetic N` samples N chunks from the collection
+and uses a sentence from each as the query (the chunk itself is relevant).
+
+    python -m benchmarks.retrieval_benchmark --synthetic 100 \\
+        --k 10 20 40 --alpha 0.4 0.6 0.8 --beta 0.1 0.3 --gamma 0 0.1
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import random
+import re
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from models.user_profile import UserProfile
+from services.personalized_ranking import ALPHA, BETA, GAMMA, rank
+from utils.get_embedding_function import EMBEDDING_MODEL, get_embedding_dimensions, get_embedding_function
+from utils.retrieval import retrieve
+from utils.vector_store import get_shards
+
+EMBEDDING_CACHE = os.path.join("benchmarks", ".cache", "query_embeddings.npz")
+
+
+# ---------- Query embeddings (cached) ---------- #
+def _cache_key(text: str, dims: int) -> str:
+    return hashlib.sha1(f"{EMBEDDING_MODEL}|{dims}|{text}".encode("utf-8")).hexdigest()
+
+
+def embed_queries(queries: List[str], cache_path: str = EMBEDDING_CACHE) -> np.ndarray:
+    """Embed `queries`, calling the API only for texts not already in the cache."""
+    dims = get_embedding_dimensions()
+    cache: Dict[str, np.ndarray] = {}
+    if os.path.exists(cache_path):
+        with np.load(cache_path) as stored:
+            cache = {k: stored[k] for k in stored.files}
+
+    keys = [_cache_key(q, dims) for q in queries]
+    missing = list(dict.fromkeys(q for q, k in zip(queries, keys) if k not in cache))
+    if missing:
+        print(f"🔢 Embedding {len(missing)} uncached queries")
+        vectors = get_embedding_function().embed_documents(missing)
+        for q, vec in zip(missing, vectors):
+            cache[_cache_key(q, dims)] = np.asarray(vec, dtype=np.float32)
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        np.savez(cache_path, **cache)
+    return np.stack([cache[k] for k in keys])
+
+
+# ---------- Labels ---------- #
+def load_labels(path: str) -> List[dict]:
+    with open(path, encoding="utf-8") as fh:
+        return [json.loads(line) for line in fh if line.strip()]
+
+
+def synthetic_labels(n: int, seed: int = 0) -> List[dict]:
+    """Self-retrieval set: a sentence of a random chunk should find that chunk."""
+    data = {"ids": [], "documents": [], "metadatas": []}
+    for shard in get_shards():
+        part = shard.get(include=["documents", "metadatas"])
+        for field in data:
+            data[field].extend(part[field])
+    rng = random.Random(seed)
+    rows = list(range(len(data["ids"])))
+    rng.shuffle(rows)
+
+    labels = []
+    for i in rows:
+        sentences = [s for s in re.split(r"(?<=[.!?])\s+", data["documents"][i]) if len(s.split()) >= 6]
+        if not sentences:
+            continue
+        meta = data["metadatas"][i] or {}
+        audience = (meta.get("audience") or "general").split(",")
+        labels.append({
+            "query": rng.choice(sentences),
+            "relevant": [data["ids"][i]],
+            "profile": {
+                "role": audience[0],
+                "interests": [t for t in (meta.get("topics") or "").split(",") if t],
+            },
+        })
+        if len(labels) == n:
+            break
+    return labels
+
+
+# ---------- Metrics ---------- #
+def recall_at(ids: List[str], relevant: set) -> float:
+    return len(relevant.intersection(ids)) / len(relevant) if relevant else 0.0
+
+
+def reciprocal_rank(ids: List[str], relevant: set) -> float:
+    for pos, cid in enumerate(ids, 1):
+        if cid in relevant:
+            return 1.0 / pos
+    return 0.0
+
+
+def _ms(values: List[float]) -> dict:
+    return {
+        "mean": round(float(np.mean(values)), 3),
+        "p95": round(float(np.percentile(values, 95)), 3),
+    }
+
+
+def run(
+    labels: List[dict],
+    ks: List[int],
+    top_k: int,
+    alphas: List[float],
+    betas: List[float],
+    gammas: List[float],
+) -> dict:
+    vectors = embed_queries([lab["query"] for lab in labels])
+    profiles = [
+        UserProfile(
+            user_id="bench",
+            role=(lab.get("profile") or {}).get("role", "general"),
+            interests=(lab.get("profile") or {}).get("interests", ()),
+        )
+        for lab in labels
+    ]
+    relevant = [set(lab["relevant"]) for lab in labels]
+    embedding_fn = get_embedding_function()
+
+    first_pass, ranked = [], []
+    for k in ks:
+        candidates, latencies = [], []
+        for vec, profile in zip(vectors, profiles):
+            t0 = time.perf_counter()
+            candidates.append(retrieve(vec.tolist(), profile, embedding_fn, k=k))
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+        cand_ids = [[d.metadata.get("id") for d, _ in c] for c in candidates]
+        first_pass.append({
+            "k": k,
+            f"recall_at_{top_k}": round(float(np.mean(
+                [recall_at(ids[:top_k], rel) for ids, rel in zip(cand_ids, relevant)])), 4),
+            "recall_at_k": round(float(np.mean(
+                [recall_at(ids, rel) for ids, rel in zip(cand_ids, relevant)])), 4),
+            "mrr": round(float(np.mean(
+                [reciprocal_rank(ids, rel) for ids, rel in zip(cand_ids, relevant)])), 4),
+            "latency_ms": _ms(latencies),
+        })
+
+        for alpha, beta, gamma in itertools.product(alphas, betas, gammas):
+            recalls, rrs, rank_ms = [], [], []
+            for cands, profile, rel in zip(candidates, profiles, relevant):
+                t0 = time.perf_counter()
+                top = rank(cands, profile, top_k=top_k, alpha=alpha, beta=beta, gamma=gamma)
+                rank_ms.append((time.perf_counter() - t0) * 1000)
+                ids = [d.metadata.get("id") for d, _ in top]
+                recalls.append(recall_at(ids, rel))
+                rrs.append(reciprocal_rank(ids, rel))
+            ranked.append({
+                "k": k,
+                "alpha": alpha,
+                "beta": beta,
+                "gamma": gamma,
+                f"recall_at_{top_k}": round(float(np.mean(recalls)), 4),
+                "mrr": round(float(np.mean(rrs)), 4),
+                "rank_ms": _ms(rank_ms),
+            })
+
+    ranked.sort(key=lambda r: (r["mrr"], r[f"recall_at_{top_k}"]), reverse=True)
+    return {
+        "queries": len(labels),
+        "top_k": top_k,
+        "first_pass": first_pass,
+        "ranked": ranked,
+        "best": ranked[0] if ranked else None,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline recall@k / MRR for retrieval + ranking")
+    parser.add_argument("--labels", help="JSONL with query / relevant ids / profile")
+    parser.add_argument("--synthetic", type=int, default=100,
+                        help="sample N self-retrieval queries when --labels is not given")
+    parser.add_argument("--k", type=int, nargs="+", default=[10, 20, 40])
+    parser.add_argument("--top-k", type=int, default=6)
+    parser.add_argument("--alpha", type=float, nargs="+", default=[ALPHA])
+    parser.add_argument("--beta", type=float, nargs="+", default=[BETA])
+    parser.add_argument("--gamma", type=float, nargs="+", default=[GAMMA])
+    parser.add_argument("--out", help="also write the full report to this file")
+    args = parser.parse_args()
+
+    labels = load_labels(args.labels) if args.labels else synthetic_labels(args.synthetic)
+    report = run(labels, args.k, args.top_k, args.alpha, args.beta, args.gamma)
+    print(json.dumps({k: v for k, v in report.items() if k != "ranked"}, indent=2))
+    print(f"{len(report['ranked'])} ranked configurations, top 5:")
+    for r in report["ranked"][:5]:
+        print(f"  k={r['k']:<3} α={r['alpha']} β={r['beta']} γ={r['gamma']}  "
+              f"recall@{args.top_k}={r[f'recall_at_{args.top_k}']}  MRR={r['mrr']}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
@@ -0,0 +1,90 @@
+"""
+splitter_benchmark.py
+—————————————————————————————————
+Character splitter (RecursiveCharacterTextSplitter 800/80) vs. the
+token-aware streaming splitter (utils/token_splitter.py) on the PDFs in
+data/. The pages are read through the page cache, so only the first run
+parses them.
+
+For each splitter it reports the chunk count, the chunk size in tokens
+(mean, p5, p95, max, stdev, and how many exceed the budget), throughput,
+and peak Python memory while splitting.
+
+    python -m benchmarks.splitter_benchmark --repeat 5 --chunk-tokens 200 --overlap 20
+"""
+
+import argparse
+import json
+import statistics
+import time
+import tracemalloc
+from typing import Callable, Iterable, List
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from utils.context_packer import CONTEXT_MODEL, _encoding
+from utils.page_cache import iter_pages
+from utils.token_splitter import split_pages
+
+
+def _char_splitter(pages: Iterable[Document]) -> List[Document]:
+    splitter = RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=80, length_function=len)
+    return splitter.split_documents(list(pages))
+
+
+def _measure(name: str, split: Callable, pages: List[Document], repeat: int, budget: int) -> dict:
+    chunks, seconds = [], []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        chunks = list(split(iter(pages)))
+        seconds.append(time.perf_counter() - t0)
+
+    tracemalloc.start()
+    list(split(iter(pages)))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    enc = _encoding(CONTEXT_MODEL)
+    sizes = sorted(len(enc.encode(c.page_content)) for c in chunks) or [0]
+    chars = sum(len(p.page_content) for p in pages)
+    best = min(seconds)
+    return {
+        "splitter": name,
+        "chunks": len(chunks),
+        "tokens_mean": round(statistics.mean(sizes), 1),
+        "tokens_p5": sizes[int(0.05 * (len(sizes) - 1))],
+        "tokens_p95": sizes[int(0.95 * (len(sizes) - 1))],
+        "tokens_max": sizes[-1],
+        "tokens_stdev": round(statistics.pstdev(sizes), 1),
+        "over_budget": sum(1 for s in sizes if s > budget),
+        "total_tokens": sum(sizes),
+        "ms": round(best * 1000, 1),
+        "pages_per_s": round(len(pages) / best) if best else None,
+        "mb_per_s": round(chars / best / 1e6, 2) if best else None,
+        "peak_kb": round(peak / 1024),
+    }
+
+
+def run(data_path: str, repeat: int, chunk_tokens: int, overlap: int) -> List[dict]:
+    pages = list(iter_pages(data_path))
+    if not pages:
+        raise SystemExit(f"No PDFs found in {data_path}/")
+    return [
+        _measure("chars-800/80", _char_splitter, pages, repeat, chunk_tokens),
+        _measure(
+            f"tokens-{chunk_tokens}/{overlap}",
+            lambda it: split_pages(it, chunk_tokens, overlap),
+            pages, repeat, chunk_tokens,
+        ),
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Character vs token-aware chunking")
+    parser.add_argument("--data", default="data")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--chunk-tokens", type=int, default=200)
+    parser.add_argument("--overlap", type=int, default=20)
+    args = parser.parse_args()
+    print(json.dumps(run(args.data, args.repeat, args.chunk_tokens, args.overlap), indent=2))
@@ -0,0 +1,30 @@
+"""
+gunicorn.conf.py
+—————————————————————————————————
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Threads per worker suit this app: requests mostly wait on OpenAI, and the
+admission controller / coalescing / caches are per process.
+"""
+
+import multiprocessing
+import os
+
+# read by utils/warmup.py: the master must not warm up (nothing it opens survives fork)
+os.environ.setdefault("PREFORK_SERVER", "1")
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.getenv("GUNICORN_WORKERS", str(min(4, multiprocessing.cpu_count()))))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))      # populate / migration / eval run in background threads
+graceful_timeout = 30
+accesslog = "-"
+
+
+def post_fork(server, worker):
+    from utils.prefork import after_fork
+
+    after_fork()
+    server.log.info(f"worker {worker.pid} ready to warm up")
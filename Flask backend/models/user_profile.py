@@ -1,7 +1,7 @@
 from __future__ import annotations
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import List
+from typing import Tuple
 
 
 
@@ -11,34 +11,39 @@ This file defines a UserProfile data class that represents a user’s profile in
 """
 
 
-@dataclass
+@dataclass(frozen=True)
 class UserProfile:
     """
     In-memory representation of a user.
+    Immutable, so one instance can be shared from the profile cache.
     """
     user_id: str
     role: str
-    interests: List[str] = field(default_factory=list)
+    interests: Tuple[str, ...] = ()
     created_at: datetime = field(default_factory=datetime.utcnow)
     updated_at: datetime = field(default_factory=datetime.utcnow)
 
+    def __post_init__(self):
+        # accept any iterable (e.g. a JSON list) but always store a tuple
+        object.__setattr__(self, "interests", tuple(self.interests))
+
     # convenience helpers ------------
     def as_dict(self) -> dict:
         return {
             "user_id": self.user_id,
             "role": self.role,
-            "interests": self.interests,
+            "interests": list(self.interests),
             "created_at": self.created_at.isoformat(),
             "updated_at": self.updated_at.isoformat(),
         }
 
     @classmethod
     def from_row(cls, row) -> "UserProfile":
-        """Build from SQLAlchemy row object."""
+        """Build from SQLAlchemy row object (interests come from user_interests)."""
         return cls(
             user_id=row.user_id,
             role=row.role,
-            interests=row.interests.split(",") if row.interests else [],
+            interests=(i.interest for i in row.interest_rows),
             created_at=row.created_at,
             updated_at=row.updated_at,
         )
@@ -1,5 +1,12 @@
 from flask import Blueprint, request, jsonify
-from services.profile_service import create_or_update, get as get_profile
+from services.profile_service import (
+    bulk_upsert,
+    create_or_update,
+    get as get_profile,
+    get_many as get_profiles,
+)
+
+MAX_BULK_ITEMS = 5000
 
 
 # All routes registered under this blueprint will be prefixed by /api/profile.
@@ -37,3 +44,41 @@ def upsert_profile():
     return jsonify({"success": True, "profile": prof.as_dict()}), 200   # Returns a JSON response
 
 
+
+
+# Bulk create/update – one transaction for the whole list
+# Expected JSON: {"profiles": [{"user_id": "...", "role": "...", "interests": [...]}, ...]}
+@bp.route("/bulk", methods=["POST"])
+def bulk_upsert_profiles():
+    data = request.get_json(force=True) or {}
+    items = data.get("profiles")
+    if not isinstance(items, list) or not items:
+        return jsonify({"success": False, "message": "Body must contain a non-empty 'profiles' list"}), 400
+    if len(items) > MAX_BULK_ITEMS:
+        return jsonify({"success": False, "message": f"At most {MAX_BULK_ITEMS} profiles per request"}), 413
+
+    for i, item in enumerate(items):
+        if not isinstance(item, dict) or "user_id" not in item or "role" not in item:
+            return jsonify({"success": False, "message": f"Item {i} needs 'user_id' and 'role'"}), 400
+
+    saved = bulk_upsert(items)
+    return jsonify({"success": True, "count": len(saved), "profiles": [p.as_dict() for p in saved]}), 200
+
+
+# Bulk fetch – POST so large id lists do not hit URL length limits
+# Expected JSON: {"user_ids": ["a", "b", ...]}
+@bp.route("/bulk-get", methods=["POST"])
+def bulk_fetch_profiles():
+    data = request.get_json(force=True) or {}
+    user_ids = data.get("user_ids")
+    if not isinstance(user_ids, list):
+        return jsonify({"success": False, "message": "Body must contain a 'user_ids' list"}), 400
+    if len(user_ids) > MAX_BULK_ITEMS:
+        return jsonify({"success": False, "message": f"At most {MAX_BULK_ITEMS} ids per request"}), 413
+
+    found = get_profiles(user_ids)
+    return jsonify({
+        "success": True,
+        "profiles": [p.as_dict() for p in found.values()],
+        "missing": [uid for uid in user_ids if uid not in found],
+    }), 200
@@ -1,5 +1,5 @@
-from typing import List, Tuple
-from langchain.docstore.document import Document
+from typing import List, Optional, Sequence, Tuple
+from langchain_core.documents import Document
 from models.user_profile import UserProfile
 
 # Ranks documents based on how well they match the user’s profile using three factors  and return the documents
@@ -15,12 +15,25 @@ BETA = 0.3   # role match
 GAMMA = 0.1  # interest overlap
 
 
+def _tags(value) -> List[str]:
+    # Chroma metadata can't hold lists, so tag_chunks stores "developer,manager"
+    if isinstance(value, str):
+        return [v for v in value.split(",") if v]
+    return list(value or [])
+
+
+def distance_to_similarity(distance: float) -> float:
+    # Candidates carry Chroma's distance (lower = closer). For unit-length
+    # OpenAI embeddings in the default squared-L2 space, cos = 1 - d / 2.
+    return 1.0 - distance / 2.0
+
+
 def _role_match(chunk_meta: dict, role: str) -> float:
-    return 1.0 if role in chunk_meta.get("audience", []) else 0.0
+    return 1.0 if role in _tags(chunk_meta.get("audience")) else 0.0
 
 
-def _interest_overlap(chunk_meta: dict, interests: List[str]) -> float:
-    chunk_topics = set(chunk_meta.get("topics", []))
+def _interest_overlap(chunk_meta: dict, interests: Sequence[str]) -> float:
+    chunk_topics = set(_tags(chunk_meta.get("topics")))
     if not chunk_topics or not interests:
         return 0.0
     overlap = chunk_topics.intersection(interests)
@@ -32,18 +45,27 @@ def rank(
     candidates: List[Tuple[Document, float]],
     profile: UserProfile,
     top_k: int = 6,
+    alpha: Optional[float] = None,
+    beta: Optional[float] = None,
+    gamma: Optional[float] = None,
 ) -> List[Tuple[Document, float]]:
     """
-    Re-sorts (Document, similarity_score) using blended metric.
-    Returns top_k tuples.
+    Re-sorts (Document, distance) using blended metric.
+    Returns top_k (Document, score) tuples, best first.
+    Weights default to ALPHA/BETA/GAMMA (override to tune, see
+    benchmarks/retrieval_benchmark.py).
     """
+    alpha = ALPHA if alpha is None else alpha
+    beta = BETA if beta is None else beta
+    gamma = GAMMA if gamma is None else gamma
+
     scored = []
-    for doc, sim in candidates:
+    for doc, dist in candidates:
         meta = doc.metadata or {}
         score = (
-            ALPHA * sim
-            + BETA * _role_match(meta, profile.role)
-            + GAMMA * _interest_overlap(meta, profile.interests)
+            alpha * distance_to_similarity(dist)
+            + beta * _role_match(meta, profile.role)
+            + gamma * _interest_overlap(meta, profile.interests)
         )
         scored.append((doc, score))
 
@@ -58,8 +80,8 @@ def _debug_scores(candidates: List[Tuple[Document, float]], profile_role: str) -
     Prints detailed scoring breakdown for each candidate document.
     Useful during development; currently not called anywhere.
     """
-    for doc, sim in candidates:
+    for doc, dist in candidates:
         meta = doc.metadata or {}
-        role_score = 1.0 if profile_role in meta.get("audience", []) else 0.0
-        print(f"Doc ID: {meta.get('id', 'Unknown')} | Sim: {sim:.3f} | Role Match: {role_score}")
+        role_score = _role_match(meta, profile_role)
+        print(f"Doc ID: {meta.get('id', 'Unknown')} | Sim: {distance_to_similarity(dist):.3f} | Role Match: {role_score}")
 
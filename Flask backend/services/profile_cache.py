@@ -0,0 +1,70 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable
+
+# In-process TTL + LRU cache in front of the profile table.
+# Entries are immutable UserProfile objects, so they are handed out as-is.
+# Writes through profile_service invalidate/refresh the entry in this process;
+# other worker processes see the change once their entry's TTL expires.
+
+PROFILE_CACHE_TTL = float(os.getenv("PROFILE_CACHE_TTL", "300"))       # seconds
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "10000"))     # entries
+
+
+class TTLCache:
+    """Thread-safe mapping with a max size (LRU eviction) and per-entry expiry."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, value) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+profile_cache = TTLCache(PROFILE_CACHE_SIZE, PROFILE_CACHE_TTL)
@@ -1,21 +1,54 @@
+import os
 from datetime import datetime
-from typing import Optional, List
+from typing import Dict, Iterable, Optional, List
 
 from sqlalchemy import (
     Column,
     String,
     DateTime,
+    ForeignKey,
+    Index,
+    Integer,
     create_engine,
+    delete,
+    event,
+    select,
     text,
 )
-from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import declarative_base, relationship, sessionmaker
 from models.user_profile import UserProfile
+from services.profile_cache import profile_cache
 
-DB_URL = "sqlite:///profiles.db"  # location for datasbase profile.
+DB_URL = os.getenv("PROFILE_DB_URL", "sqlite:///profiles.db")  # location for datasbase profile.
 Base = declarative_base()
-_engine = create_engine(DB_URL, echo=False, future=True)  # using SQLite — a lightweight, file-based database management system.
+_engine = create_engine(
+    DB_URL,
+    echo=False,
+    future=True,
+    # QueuePool: readers reuse open connections instead of reconnecting per request
+    pool_size=int(os.getenv("PROFILE_DB_POOL_SIZE", "10")),
+    max_overflow=int(os.getenv("PROFILE_DB_MAX_OVERFLOW", "20")),
+    pool_pre_ping=True,
+    connect_args={"check_same_thread": False, "timeout": 30},
+)  # using SQLite — a lightweight, file-based database management system.
 SessionLocal = sessionmaker(bind=_engine, expire_on_commit=False)
 
+BULK_READ_CHUNK = 500   # ids per IN (...) clause, well under SQLite's variable limit
+
+
+# WAL lets readers run while a writer commits; NORMAL sync is durable enough in WAL mode.
+@event.listens_for(_engine, "connect")
+def _set_sqlite_pragmas(dbapi_conn, _record):
+    cur = dbapi_conn.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute("PRAGMA synchronous=NORMAL")
+    cur.execute("PRAGMA busy_timeout=5000")
+    cur.execute("PRAGMA cache_size=-20000")   # ~20 MB page cache per connection
+    cur.execute("PRAGMA temp_store=MEMORY")
+    cur.execute("PRAGMA foreign_keys=ON")     # user_interests cascades on delete
+    cur.close()
+
 # Provides CRUD operations for managing UserProfile data in a SQLite database using SQLAlchemy
 
 
@@ -23,22 +56,88 @@ class _ProfileRow(Base):
     __tablename__ = "user_profiles"
 
     user_id = Column(String, primary_key=True, index=True)
-    role = Column(String, nullable=False)
-    interests = Column(String, nullable=True)  # comma-separated
+    role = Column(String, nullable=False, index=True)
+    # legacy comma-separated column; migrated into user_interests and no longer written
+    interests = Column(String, nullable=True)
     created_at = Column(DateTime, server_default=text("CURRENT_TIMESTAMP"))
     updated_at = Column(DateTime, onupdate=datetime.utcnow)
 
+    # loaded with one extra "IN" query per batch of profiles
+    interest_rows = relationship(
+        "_InterestRow",
+        order_by="_InterestRow.position",
+        cascade="all, delete-orphan",
+        lazy="selectin",
+    )
+
+
+# One row per (user, interest) so "who is interested in X" is an index lookup.
+class _InterestRow(Base):
+    __tablename__ = "user_interests"
+    __table_args__ = (Index("ix_user_interests_interest", "interest"),)
+
+    user_id = Column(
+        String,
+        ForeignKey("user_profiles.user_id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    interest = Column(String, primary_key=True)
+    position = Column(Integer, nullable=False, default=0)  # keeps the user's order
+
+
+def _interest_rows(interests: Iterable[str]) -> List["_InterestRow"]:
+    unique = dict.fromkeys(i for i in interests if i)       # de-dup, keep order
+    return [_InterestRow(interest=i, position=n) for n, i in enumerate(unique)]
+
+
+# Moves the old comma-separated column into user_interests (idempotent).
+def _migrate_legacy_interests() -> None:
+    with _engine.begin() as conn:
+        # create_all() does not add indexes to a table that already exists
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_user_profiles_role ON user_profiles (role)"
+        ))
+        legacy = conn.execute(text(
+            "SELECT user_id, interests FROM user_profiles "
+            "WHERE interests IS NOT NULL AND interests != ''"
+        )).all()
+        if not legacy:
+            return
+
+        rows = [
+            {"user_id": uid, "interest": r.interest, "position": r.position}
+            for uid, csv in legacy
+            for r in _interest_rows(csv.split(","))
+        ]
+        if rows:
+            conn.execute(
+                sqlite_insert(_InterestRow).on_conflict_do_nothing(), rows
+            )
+        conn.execute(text(
+            "UPDATE user_profiles SET interests = NULL WHERE interests IS NOT NULL"
+        ))
+        print(f"🔀 Migrated interests of {len(legacy)} profiles into user_interests")
+
 
 # create table on first import
 #This creates the table based on the _ProfileRow class (which is an ORM model) if it doesn’t already exist.
 Base.metadata.create_all(_engine)
+_migrate_legacy_interests()
 
 
 # ---------- CRUD helpers ---------- #
+# Reads go through the in-process TTL/LRU cache (services/profile_cache.py);
+# only misses touch SQLite.
 def get(user_id: str) -> Optional[UserProfile]:
+    prof = profile_cache.get(user_id)
+    if prof is not None:
+        return prof
     with SessionLocal() as db:
         row = db.get(_ProfileRow, user_id)
-        return UserProfile.from_row(row) if row else None
+        prof = UserProfile.from_row(row) if row else None
+    if prof is not None:
+        profile_cache.put(user_id, prof)
+    return prof
 
 #If the user exists → update role/interests, Else → create a new entry, Commits changes and returns a UserProfile.
 def create_or_update(
@@ -52,21 +151,122 @@ def create_or_update(
 
         if row:
             row.role = role
-            row.interests = ",".join(interests)
+            row.interest_rows = _interest_rows(interests)
             row.updated_at = now
         else:
             row = _ProfileRow(
                 user_id=user_id,
                 role=role,
-                interests=",".join(interests),
+                interest_rows=_interest_rows(interests),
                 created_at=now,
                 updated_at=now,
             )
             db.add(row)
+        profile_cache.invalidate(user_id)
         db.commit()
-        return UserProfile.from_row(row)
+        prof = UserProfile.from_row(row)
+    # write-through: the fresh profile replaces whatever was cached
+    profile_cache.put(user_id, prof)
+    return prof
+
 
 
+# ---------- Bulk helpers ---------- #
+def get_many(user_ids: Iterable[str]) -> Dict[str, UserProfile]:
+    """Profiles for every known id in `user_ids` (unknown ids are omitted)."""
+    found: Dict[str, UserProfile] = {}
+    missing = []
+    for uid in dict.fromkeys(user_ids):            # de-dup, keep order
+        prof = profile_cache.get(uid)
+        if prof is not None:
+            found[uid] = prof
+        else:
+            missing.append(uid)
+
+    if missing:
+        with SessionLocal() as db:
+            for start in range(0, len(missing), BULK_READ_CHUNK):
+                ids = missing[start:start + BULK_READ_CHUNK]
+                rows = db.scalars(select(_ProfileRow).where(_ProfileRow.user_id.in_(ids)))
+                for row in rows:
+                    prof = UserProfile.from_row(row)
+                    found[row.user_id] = prof
+                    profile_cache.put(row.user_id, prof)
+    return found
+
+
+def bulk_upsert(profiles: List[dict]) -> List[UserProfile]:
+    """
+    Create or update many profiles in one transaction with
+    INSERT ... ON CONFLICT(user_id) DO UPDATE. Each item needs
+    user_id and role; interests defaults to [].
+    """
+    now = datetime.utcnow()
+    rows, interests = {}, {}
+    for p in profiles:
+        rows[p["user_id"]] = {         # last one wins if an id repeats
+            "user_id": p["user_id"],
+            "role": p["role"],
+            "created_at": now,
+            "updated_at": now,
+        }
+        interests[p["user_id"]] = _interest_rows(p.get("interests", []))
+    if not rows:
+        return []
+
+    stmt = sqlite_insert(_ProfileRow)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[_ProfileRow.user_id],
+        set_={
+            "role": stmt.excluded.role,
+            "updated_at": stmt.excluded.updated_at,
+        },
+    )
+    interest_params = [
+        {"user_id": uid, "interest": r.interest, "position": r.position}
+        for uid, irows in interests.items()
+        for r in irows
+    ]
+    ids = list(rows)
+    with SessionLocal() as db:
+        db.execute(stmt, list(rows.values()))     # executemany, single commit
+        for start in range(0, len(ids), BULK_READ_CHUNK):
+            db.execute(delete(_InterestRow).where(
+                _InterestRow.user_id.in_(ids[start:start + BULK_READ_CHUNK])
+            ))
+        if interest_params:
+            db.execute(sqlite_insert(_InterestRow), interest_params)
+        db.commit()
+
+    for uid in rows:
+        profile_cache.invalidate(uid)
+    saved = get_many(rows)
+    return [saved[uid] for uid in rows if uid in saved]
+
+
+# ---------- Index-backed queries ---------- #
+def profiles_by_role(role: str, limit: Optional[int] = None) -> List[UserProfile]:
+    """All profiles with `role` (uses ix_user_profiles_role)."""
+    stmt = select(_ProfileRow).where(_ProfileRow.role == role).order_by(_ProfileRow.user_id)
+    if limit:
+        stmt = stmt.limit(limit)
+    with SessionLocal() as db:
+        return [UserProfile.from_row(r) for r in db.scalars(stmt)]
+
+
+def profiles_by_interest(interest: str, limit: Optional[int] = None) -> List[UserProfile]:
+    """All profiles listing `interest` (uses ix_user_interests_interest)."""
+    stmt = (
+        select(_ProfileRow)
+        .join(_InterestRow, _InterestRow.user_id == _ProfileRow.user_id)
+        .where(_InterestRow.interest == interest)
+        .order_by(_ProfileRow.user_id)
+    )
+    if limit:
+        stmt = stmt.limit(limit)
+    with SessionLocal() as db:
+        return [UserProfile.from_row(r) for r in db.scalars(stmt)]
+
 
 # Additional helper function 
 def _format_interests(interests: List[str]) -> str:
@@ -0,0 +1,31 @@
+"""
+test_token_splitter.py
+—————————————————————————————————
+Run from "Flask backend/":  python -m pytest tests
+"""
+
+from utils.context_packer import count_tokens
+from utils.token_splitter import split_text
+
+
+def _chunks(text, chunk_tokens, overlap_tokens=0):
+    return [text[s:e] for s, e, _n in split_text(text, chunk_tokens, overlap_tokens)]
+
+
+def test_sentences_are_packed_within_budget():
+    text = " ".join(f"Sentence number {i} says something short." for i in range(40))
+    chunks = _chunks(text, 30)
+    assert len(chunks) > 1
+    assert all(count_tokens(c) <= 30 for c in chunks)
+    assert chunks[0].startswith("Sentence number 0 ")
+    assert chunks[-1].endswith("number 39 says something short.")
+
+
+def test_word_longer_than_budget_is_cut_into_token_windows():
+    blob = "-".join(f"x{i}" for i in range(300))       # one whitespace-free "word"
+    text = f"Intro sentence here. {blob} Outro sentence here."
+    chunks = _chunks(text, 20)
+    assert all(count_tokens(c) <= 20 for c in chunks)
+    assert len(chunks) > 300 // 20
+    # without overlap the chunks cover the page exactly, in order
+    assert "".join(chunks).replace(" ", "") == text.replace(" ", "")
@@ -0,0 +1,137 @@
+"""
+admission.py
+—————————————————————————————————
+Admission control for the LLM stage of `query_rag`.
+
+At most LLM_MAX_CONCURRENCY chat completions run at once per process. Extra
+requests wait in a bounded queue where interactive traffic (`/api/query`)
+is always admitted before batch traffic (`/api/query/batch`), FIFO within
+a priority. Instead of piling up and tripping the provider's rate limit,
+requests are shed early:
+
+    queue full                     -> Overloaded(status=429)
+    waited LLM_QUEUE_TIMEOUT secs  -> Overloaded(status=503)
+
+Both carry `retry_after` (seconds) for the Retry-After header, estimated
+from the queue length and recent LLM call durations.
+"""
+
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from utils import metrics
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_QUEUE_SIZE = int(os.getenv("LLM_QUEUE_SIZE", "32"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "15"))
+
+INTERACTIVE = 0
+BATCH = 1
+PRIORITIES = {"interactive": INTERACTIVE, "batch": BATCH}
+
+
+class Overloaded(Exception):
+    def __init__(self, message: str, status: int, retry_after: int):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    def __init__(self, max_concurrency: int, queue_size: int, queue_timeout: float):
+        self.max_concurrency = max(1, max_concurrency)
+        self.queue_size = max(0, queue_size)
+        self.queue_timeout = queue_timeout
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting = []                 # heap of (priority, seq)
+        self._seq = itertools.count()
+        self._avg_hold = 2.0               # seconds, EWMA of slot hold time
+
+    # ---------- estimates ---------- #
+    def retry_after(self) -> int:
+        ahead = len(self._waiting) + 1
+        return max(1, math.ceil(ahead / self.max_concurrency * self._avg_hold))
+
+    def queue_depth(self) -> int:
+        return len(self._waiting)
+
+    def active(self) -> int:
+        return self._active
+
+    # ---------- acquire / release ---------- #
+    def acquire(self, priority: int = INTERACTIVE) -> float:
+        """Wait for a slot; returns the time spent queued (seconds)."""
+        t0 = time.perf_counter()
+        with self._cond:
+            if self._active < self.max_concurrency and not self._waiting:
+                self._active += 1
+                metrics.incr("llm.admitted")
+                metrics.observe("llm.wait_ms", 0.0)
+                return 0.0
+
+            if len(self._waiting) >= self.queue_size:
+                metrics.incr("llm.rejected")
+                raise Overloaded("LLM queue is full", 429, self.retry_after())
+
+            entry = (priority, next(self._seq))
+            heapq.heappush(self._waiting, entry)
+            deadline = t0 + self.queue_timeout
+            try:
+                while not (self._waiting[0] == entry and self._active < self.max_concurrency):
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        metrics.incr("llm.timed_out")
+                        raise Overloaded(
+                            "Timed out waiting for an LLM slot", 503, self.retry_after()
+                        )
+                    self._cond.wait(remaining)
+                heapq.heappop(self._waiting)
+                self._active += 1
+            finally:
+                if entry in self._waiting:        # gave up: leave the queue
+                    self._waiting.remove(entry)
+                    heapq.heapify(self._waiting)
+                # the next in line may now be at the head (or a slot is free)
+                self._cond.notify_all()
+
+        waited = time.perf_counter() - t0
+        metrics.incr("llm.admitted")
+        metrics.observe("llm.wait_ms", waited * 1000)
+        return waited
+
+    def release(self, held: float = None) -> None:
+        with self._cond:
+            self._active -= 1
+            if held is not None:
+                self._avg_hold = 0.8 * self._avg_hold + 0.2 * held
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, priority: int = INTERACTIVE):
+        self.acquire(priority)
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - t0)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "active": self._active,
+                "queue_depth": len(self._waiting),
+                "queue_size": self.queue_size,
+                "avg_llm_seconds": round(self._avg_hold, 2),
+            }
+
+
+llm_admission = AdmissionController(LLM_MAX_CONCURRENCY, LLM_QUEUE_SIZE, LLM_QUEUE_TIMEOUT)
+metrics.register_gauge("llm.queue_depth", llm_admission.queue_depth)
+metrics.register_gauge("llm.active", llm_admission.active)
@@ -3,26 +3,37 @@ import shutil
 from langchain_community.document_loaders import PyPDFDirectoryLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain.schema.document import Document
-from utils.get_embedding_function import get_embedding_function
-from langchain_chroma import Chroma
+from utils.vector_store import bump_corpus_version, drop_partitions, count_chunks, get_db, get_shards
+from utils.vector_snapshot import refresh_snapshot_if_present
+from utils.write_lock import WriterBusy, busy_result, single_writer
 
 CHROMA_PATH = "chroma"
 DATA_PATH = "data"
 
 def clear_chroma_database():
+    try:
+        with single_writer():
+            return _clear()
+    except WriterBusy as exc:
+        return busy_result(exc)
+
+
+def _clear():
     # Load the existing Chroma DB
-    db = Chroma(
-        persist_directory=CHROMA_PATH,
-        embedding_function=get_embedding_function()
-    )
+    db = get_db()
 
-    # Get all existing document IDs
-    existing_items = db.get(include=[])
-    existing_ids = existing_items.get("ids", [])
-    deleted_count = len(existing_ids)
+    # Get all existing document IDs (in every shard, if sharded)
+    deleted_count = 0
+    for shard in get_shards(db):
+        existing_ids = shard.get(include=[]).get("ids", [])
+        if existing_ids:
+            shard.delete(ids=existing_ids)
+            deleted_count += len(existing_ids)
 
     if deleted_count > 0:
-        db.delete(ids=existing_ids)
+        drop_partitions(db)
+        bump_corpus_version()
+        refresh_snapshot_if_present(db)
         message = f"🗑️ Deleted {deleted_count} documents from Chroma database."
     else:
         message = "📂 No documents to delete in the Chroma database."
@@ -60,11 +71,6 @@ def preview_database_status():
     Prints the number of documents currently in the Chroma DB.
     May be used for manual debugging or future CLI extension.
     """
-    db = Chroma(
-        persist_directory=CHROMA_PATH,
-        embedding_function=get_embedding_function()
-    )
-    existing_items = db.get(include=[])
-    doc_count = len(existing_items.get("ids", []))
+    doc_count = count_chunks(get_db())
     print(f"📊 Chroma DB currently holds {doc_count} documents.")
 
@@ -0,0 +1,194 @@
+"""
+context_packer.py
+—————————————————————————————————
+Turns the ranked chunks into the prompt context without paying for the same
+text twice:
+
+1. adjacent chunks of the same page (ids "source:page:i", "source:page:i+1")
+   are merged into one block and the `chunk_overlap` text repeated at the
+   start of the second chunk is removed
+2. near-identical blocks are dropped, keeping the higher-ranked one: a block
+   goes if >= DEDUP_THRESHOLD of its word 3-grams already appear in a kept
+   block (this also catches a chunk that was merged into a larger block)
+3. blocks are added in rank order until the token budget (counted with the
+   model's tiktoken encoding) is used up; the last block may be cut short,
+   and the first one always goes in, cut to the budget if it is larger
+
+Also reports how many tokens this saved versus joining the chunks verbatim.
+"""
+
+import os
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+CONTEXT_MODEL = "gpt-3.5-turbo"
+SEPARATOR = "\n\n---\n\n"
+DEDUP_THRESHOLD = 0.9
+MIN_OVERLAP = 8          # shorter common prefix/suffix is treated as coincidence
+MAX_OVERLAP = 400        # comfortably above split_documents' chunk_overlap
+MIN_TAIL_TOKENS = 40     # do not bother appending a block cut shorter than this
+
+
+class _ApproxEncoding:
+    """Stand-in when tiktoken's BPE files cannot be loaded (e.g. offline host)."""
+
+    _piece = re.compile(r"\w+|[^\w\s]|\s+")
+
+    def encode(self, text: str) -> List[str]:
+        return self._piece.findall(text)
+
+    def decode(self, tokens: List[str]) -> str:
+        return "".join(tokens)
+
+
+@lru_cache(maxsize=4)
+def _encoding(model: str):
+    try:
+        import tiktoken
+
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as exc:
+        print(f"⚠️  tiktoken unavailable ({exc}); using approximate token counts")
+        return _ApproxEncoding()
+
+
+def count_tokens(text: str, model: str = CONTEXT_MODEL) -> int:
+    return len(_encoding(model).encode(text))
+
+
+@dataclass
+class PackedContext:
+    text: str
+    sources: List[str]
+    stats: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class _Block:
+    text: str
+    ids: List[str]
+    rank: int                 # best (lowest) rank among the merged chunks
+
+
+def _parse_id(chunk_id: str) -> Optional[Tuple[str, str, int]]:
+    parts = chunk_id.rsplit(":", 2)
+    if len(parts) != 3 or not parts[2].isdigit():
+        return None
+    return parts[0], parts[1], int(parts[2])
+
+
+def strip_overlap(prev: str, nxt: str) -> str:
+    """Drop the prefix of `nxt` that repeats the end of `prev`."""
+    limit = min(len(prev), len(nxt), MAX_OVERLAP)
+    for k in range(limit, MIN_OVERLAP - 1, -1):
+        if prev.endswith(nxt[:k]):
+            return nxt[k:]
+    return nxt
+
+
+def _merge_adjacent(chunks: List[Tuple[Document, float]]) -> Tuple[List[_Block], int]:
+    """Merge consecutive chunks of the same page; returns blocks and merge count."""
+    parsed = []
+    loose = []
+    for rank, (doc, _score) in enumerate(chunks):
+        cid = doc.metadata.get("id", "")
+        key = _parse_id(cid)
+        if key is None:
+            loose.append(_Block(doc.page_content, [cid or "Unknown"], rank))
+        else:
+            parsed.append((key, rank, doc))
+
+    parsed.sort(key=lambda t: t[0])
+    blocks, merged = [], 0
+    prev_key = None
+    for key, rank, doc in parsed:
+        if prev_key and key[:2] == prev_key[:2] and key[2] == prev_key[2] + 1:
+            last = blocks[-1]
+            last.text += strip_overlap(last.text, doc.page_content)
+            last.ids.append(doc.metadata["id"])
+            last.rank = min(last.rank, rank)
+            merged += 1
+        elif prev_key and key == prev_key:
+            continue              # same chunk twice (e.g. from two partitions)
+        else:
+            blocks.append(_Block(doc.page_content, [doc.metadata["id"]], rank))
+        prev_key = key
+
+    blocks.extend(loose)
+    blocks.sort(key=lambda b: b.rank)
+    return blocks, merged
+
+
+def _shingles(text: str, n: int = 3) -> set:
+    words = re.findall(r"\w+", text.lower())
+    return {tuple(words[i:i + n]) for i in range(max(len(words) - n + 1, 1))}
+
+
+def _dedup(blocks: List[_Block]) -> Tuple[List[_Block], int]:
+    kept, kept_sh, dropped = [], [], 0
+    for b in blocks:
+        sh = _shingles(b.text)
+        if any(len(sh & o) / max(len(sh), 1) >= DEDUP_THRESHOLD for o in kept_sh):
+            dropped += 1
+            continue
+        kept.append(b)
+        kept_sh.append(sh)
+    return kept, dropped
+
+
+def pack_context(
+    chunks: List[Tuple[Document, float]],
+    token_budget: Optional[int] = None,
+    model: str = CONTEXT_MODEL,
+) -> PackedContext:
+    """Build the prompt context from ranked (Document, score) pairs."""
+    budget = token_budget or CONTEXT_TOKEN_BUDGET
+    enc = _encoding(model)
+
+    naive_tokens = len(enc.encode(SEPARATOR.join(d.page_content for d, _ in chunks)))
+    blocks, merged = _merge_adjacent(chunks)
+    blocks, dropped = _dedup(blocks)
+
+    sep_tokens = len(enc.encode(SEPARATOR))
+    parts, sources, used, truncated = [], [], 0, 0
+    for b in blocks:
+        sep = sep_tokens if parts else 0
+        cost = len(enc.encode(b.text)) + sep
+        remaining = budget - used
+        if cost <= remaining:
+            parts.append(b.text)
+        elif not parts or remaining - sep >= MIN_TAIL_TOKENS:
+            # never send the question without context: the best block is cut to fit
+            tokens = enc.encode(b.text)[:remaining - sep]
+            parts.append(enc.decode(tokens))
+            cost = remaining
+            truncated += 1
+        else:
+            continue
+        sources.extend(b.ids)
+        used += cost
+
+    text = SEPARATOR.join(parts)
+    packed_tokens = len(enc.encode(text))
+    return PackedContext(
+        text=text,
+        sources=sources,
+        stats={
+            "token_budget": budget,
+            "tokens_naive": naive_tokens,
+            "tokens_packed": packed_tokens,
+            "tokens_saved": naive_tokens - packed_tokens,
+            "chunks_in": len(chunks),
+            "chunks_merged": merged,
+            "duplicates_dropped": dropped,
+            "blocks_truncated": truncated,
+        },
+    )
@@ -0,0 +1,119 @@
+"""
+document_index.py
+—————————————————————————————————
+One vector per PDF, for two-stage retrieval (RETRIEVAL_MODE=two_stage).
+
+Each PDF's vector is the normalized mean of its chunks' stored embeddings:
+the centroid. No summary is generated, so building the index costs no
+API calls and nothing is re-embedded. They live in the collection
+"<collection>__docs", id = source path, metadata = source, chunk count and
+the union of the chunks' audience / topics tags.
+
+At query time `top_documents` picks the TWO_STAGE_DOCS closest PDFs and
+retrieval then searches only their chunks (and, when sharded, only the
+shards holding them). See utils/retrieval.retrieve_two_stage.
+
+`populate_database` refreshes the entries of the PDFs it touched. To
+backfill an existing collection:
+
+    python -m utils.document_index rebuild
+"""
+
+import os
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from utils.vector_store import VECTOR_SHARDS, get_db, get_shards, shard_of
+
+if TYPE_CHECKING:
+    from langchain_chroma import Chroma
+
+TWO_STAGE_DOCS = int(os.getenv("TWO_STAGE_DOCS", "5"))
+DOC_INDEX_SUFFIX = "__docs"
+
+
+def get_doc_index(db: Optional["Chroma"] = None) -> "Chroma":
+    from langchain_chroma import Chroma
+
+    db = db or get_db()
+    return Chroma(
+        collection_name=f"{db._collection.name}{DOC_INDEX_SUFFIX}",
+        client=db._client,
+        embedding_function=db.embeddings,
+    )
+
+
+def _chunks_of(db: "Chroma", source: str) -> dict:
+    shards = get_shards(db)
+    if VECTOR_SHARDS > 1:
+        shards = [shards[shard_of(source)]]          # a PDF lives in exactly one shard
+    out = {"embeddings": [], "metadatas": []}
+    for shard in shards:
+        part = shard.get(where={"source": source}, include=["embeddings", "metadatas"])
+        out["embeddings"].extend(part["embeddings"])
+        out["metadatas"].extend(part["metadatas"])
+    return out
+
+
+def _union(metadatas: List[dict], field: str) -> str:
+    tags = set()
+    for meta in metadatas:
+        tags.update(t for t in ((meta or {}).get(field) or "").split(",") if t)
+    return ",".join(sorted(tags))
+
+
+def update_document_index(db: "Chroma", sources: Iterable[str]) -> int:
+    """(Re)compute the centroid of every PDF in `sources`; returns how many were written."""
+    index = get_doc_index(db)
+    ids, vectors, metas, stale = [], [], [], []
+    for source in sorted(set(s for s in sources if s)):
+        chunks = _chunks_of(db, source)
+        if len(chunks["embeddings"]) == 0:
+            stale.append(source)                     # PDF gone – drop its entry
+            continue
+        emb = np.asarray(chunks["embeddings"], dtype=np.float32)
+        emb /= np.linalg.norm(emb, axis=1, keepdims=True) + 1e-12
+        centroid = emb.mean(axis=0)
+        centroid /= np.linalg.norm(centroid) + 1e-12
+
+        ids.append(source)
+        vectors.append(centroid.tolist())
+        metas.append({
+            "source": source,
+            "chunks": len(emb),
+            "audience": _union(chunks["metadatas"], "audience"),
+            "topics": _union(chunks["metadatas"], "topics"),
+        })
+    if ids:
+        index._collection.upsert(ids=ids, embeddings=vectors, metadatas=metas, documents=ids)
+    if stale:
+        index._collection.delete(ids=stale)
+    return len(ids)
+
+
+def rebuild_document_index(db: Optional["Chroma"] = None) -> Dict[str, int]:
+    db = db or get_db()
+    sources = set()
+    for shard in get_shards(db):
+        for meta in shard.get(include=["metadatas"])["metadatas"]:
+            sources.add((meta or {}).get("source"))
+    return {"documents": update_document_index(db, sources)}
+
+
+def top_documents(db: "Chroma", query_vec: List[float], n: int = TWO_STAGE_DOCS) -> List[str]:
+    """Sources of the `n` PDFs whose centroid is closest to the query ([] if not built)."""
+    index = get_doc_index(db)
+    if index._collection.count() == 0:
+        return []
+    res = index._collection.query(query_embeddings=[query_vec], n_results=n, include=[])
+    return res["ids"][0]
+
+
+if __name__ == "__main__":
+    import sys
+
+    if sys.argv[1:] == ["rebuild"]:
+        print(rebuild_document_index())
+    else:
+        print("usage: python -m utils.document_index rebuild")
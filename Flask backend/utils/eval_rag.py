@@ -0,0 +1,321 @@
+"""
+eval_rag.py
+—————————————————————————————————
+Dataset-driven evaluation of the RAG pipeline.
+
+Cases live in a JSONL file (default eval/cases.jsonl), one per line:
+
+    {"id": "ttr-longest-route",
+     "question": "How many points does the longest continuous train get ...?",
+     "expected": "10 points",
+     "profile": {"role": "general", "interests": []},   # or "user_id": "dev-42"
+     "judge": "auto",                                    # optional, per case
+     "negative": false}                                  # true = must NOT match
+
+Cases run concurrently (EVAL_CONCURRENCY at a time) and each answer is
+graded by a judge:
+
+    deterministic – free: every number in `expected` must appear in the
+                    answer, or (no numbers) >= 80% of its words must
+    llm           – asks the chat model whether the answers match
+    auto          – deterministic first, LLM only when that says no
+
+The report has accuracy plus per-case latency and token usage (answer and
+judge calls, 0 when served from the LLM cache).
+
+    python -m utils.eval_rag --cases eval/cases.jsonl --judge auto --concurrency 4
+"""
+
+import argparse
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from models.user_profile import UserProfile
+from utils.llm_cache import get_chat_model
+from utils.query_rag import answer_for_profile, query_rag
+
+EVAL_CASES_PATH = os.getenv("EVAL_CASES_PATH", os.path.join("eval", "cases.jsonl"))
+EVAL_CONCURRENCY = int(os.getenv("EVAL_CONCURRENCY", "4"))
+EVAL_DIR = os.path.dirname(EVAL_CASES_PATH) or "eval"    # the API may only read case files here
+MAX_EVAL_CONCURRENCY = 16
+JUDGES = ("deterministic", "llm", "auto")
+WORD_RECALL = 0.8
+
+EVAL_PROMPT = """
+Expected Response: {expected_response}
+Actual Response: {actual_response}
+---
+(Answer with 'true' or 'false') Does the actual response match the expected response?
+"""
+
+
+# ---------- Cases ---------- #
+def load_cases(path: str = EVAL_CASES_PATH) -> List[dict]:
+    cases = []
+    with open(path, encoding="utf-8") as fh:
+        for n, line in enumerate(fh, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                case = json.loads(line)
+            except json.JSONDecodeError:
+                # line number only – never echo the file's contents back
+                raise ValueError(f"{path}:{n}: not valid JSON") from None
+            if "question" not in case or "expected" not in case:
+                raise ValueError(f"{path}:{n}: case needs 'question' and 'expected'")
+            case.setdefault("id", f"case-{n}")
+            cases.append(case)
+    return cases
+
+
+def resolve_cases_path(path: Optional[str]) -> str:
+    """Case file requested over the API: must be a .jsonl inside EVAL_DIR."""
+    if not path:
+        return EVAL_CASES_PATH
+    root = os.path.realpath(EVAL_DIR)
+    full = os.path.realpath(path)            # relative to the app dir, e.g. eval/cases.jsonl
+    if os.path.commonpath([root, full]) != root or not full.endswith(".jsonl"):
+        raise ValueError(f"'cases' must be a .jsonl file inside {EVAL_DIR}/")
+    return full
+
+
+def parse_concurrency(value) -> Optional[int]:
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError("'concurrency' must be an integer")
+    if not 1 <= value <= MAX_EVAL_CONCURRENCY:
+        raise ValueError(f"'concurrency' must be between 1 and {MAX_EVAL_CONCURRENCY}")
+    return value
+
+
+# ---------- Judges ---------- #
+def _numbers(text: str) -> set:
+    return set(re.findall(r"\d+(?:\.\d+)?", text.replace(",", "")))
+
+
+def _words(text: str) -> set:
+    return set(re.findall(r"\w+", text.lower()))
+
+
+def deterministic_judge(expected: str, actual: str) -> bool:
+    expected_numbers = _numbers(expected)
+    if expected_numbers:
+        return expected_numbers <= _numbers(actual)
+    expected_words = _words(expected)
+    if not expected_words:
+        return False
+    return len(expected_words & _words(actual)) / len(expected_words) >= WORD_RECALL
+
+
+def llm_judge(expected: str, actual: str) -> Tuple[bool, dict]:
+    """Returns (match, token usage of the judge call)."""
+    prompt = EVAL_PROMPT.format(expected_response=expected, actual_response=actual)
+    resp = get_chat_model("gpt-3.5-turbo", temperature=0).invoke(prompt)
+    usage = (getattr(resp, "response_metadata", None) or {}).get("token_usage") or {}
+    verdict = (resp.content if hasattr(resp, "content") else str(resp)).strip().lower()
+    if "true" in verdict:
+        return True, usage
+    if "false" in verdict:
+        return False, usage
+    raise ValueError(f"Invalid evaluation result: {verdict!r}")
+
+
+def judge(expected: str, actual: str, mode: str = "auto") -> Tuple[bool, str, dict]:
+    """Returns (match, judge that decided, judge token usage)."""
+    if mode not in JUDGES:
+        raise ValueError(f"Unknown judge {mode!r}; use one of {JUDGES}")
+    if mode != "llm":
+        match = deterministic_judge(expected, actual)
+        if match or mode == "deterministic":
+            return match, "deterministic", {}
+    match, usage = llm_judge(expected, actual)
+    return match, "llm", usage
+
+
+# ---------- Running ---------- #
+def _tokens(usage: dict) -> int:
+    return int(usage.get("total_tokens", 0)) if usage else 0
+
+
+def run_case(case: dict, default_judge: str = "auto") -> dict:
+    t0 = time.perf_counter()
+    out = {"id": case["id"], "question": case["question"], "expected": case["expected"]}
+    try:
+        if case.get("user_id"):
+            result = query_rag(case["question"], case["user_id"])
+        else:
+            spec = case.get("profile") or {}
+            profile = UserProfile(
+                user_id=f"eval:{case['id']}",
+                role=spec.get("role", "general"),
+                interests=spec.get("interests", ()),
+            )
+            result = answer_for_profile(case["question"], profile)
+        out["latency_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        out["response"] = result.get("response", "")
+        answer_usage = result.get("token_usage") or {}
+
+        if not result.get("success"):
+            out.update(status="error", passed=False, error=result.get("message"),
+                       tokens={"answer": _tokens(answer_usage), "judge": 0})
+            return out
+
+        match, decided_by, judge_usage = judge(
+            case["expected"], out["response"], case.get("judge", default_judge)
+        )
+        passed = match != bool(case.get("negative"))
+        out.update(
+            status="passed" if passed else "failed",
+            passed=passed,
+            judge=decided_by,
+            tokens={"answer": _tokens(answer_usage), "judge": _tokens(judge_usage)},
+        )
+    except Exception as exc:
+        out.setdefault("latency_ms", round((time.perf_counter() - t0) * 1000, 1))
+        out.update(status="error", passed=False, error=str(exc),
+                   tokens=out.get("tokens", {"answer": 0, "judge": 0}))
+    return out
+
+
+def _pct(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+def run_eval(
+    cases: List[dict],
+    judge_mode: str = "auto",
+    concurrency: Optional[int] = None,
+    on_progress=None,
+) -> dict:
+    """Run every case with at most `concurrency` in flight; results in input order."""
+    if judge_mode not in JUDGES:
+        raise ValueError(f"Unknown judge {judge_mode!r}; use one of {JUDGES}")
+    t0 = time.perf_counter()
+    workers = max(1, min(concurrency or EVAL_CONCURRENCY, len(cases) or 1))
+    results = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for res in pool.map(lambda c: run_case(c, judge_mode), cases):
+            results.append(res)
+            if on_progress:
+                on_progress(len(results))
+
+    latencies = [r["latency_ms"] for r in results]
+    passed = sum(1 for r in results if r["passed"])
+    return {
+        "success": True,
+        "total": len(results),
+        "passed": passed,
+        "failed": sum(1 for r in results if r["status"] == "failed"),
+        "errors": sum(1 for r in results if r["status"] == "error"),
+        "accuracy": round(passed / len(results), 3) if results else 0.0,
+        "judge": judge_mode,
+        "concurrency": workers,
+        "latency_ms": {
+            "avg": round(sum(latencies) / len(latencies), 1) if latencies else 0.0,
+            "p50": _pct(latencies, 0.50),
+            "p95": _pct(latencies, 0.95),
+        },
+        "tokens": {
+            "answer": sum(r["tokens"]["answer"] for r in results),
+            "judge": sum(r["tokens"]["judge"] for r in results),
+        },
+        "wall_seconds": round(time.perf_counter() - t0, 2),
+        "results": results,
+    }
+
+
+# ---------- Background jobs (for /api/test-rag) ---------- #
+_jobs: dict = {}
+_jobs_lock = threading.Lock()
+MAX_JOBS = 20            # finished jobs kept for polling
+
+
+def _set_job(job_id: str, **fields) -> None:
+    with _jobs_lock:
+        _jobs[job_id].update(fields)
+
+
+def get_eval_job(job_id: str) -> Optional[dict]:
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        return dict(job) if job else None
+
+
+def start_eval(
+    path: Optional[str] = None,
+    judge_mode: str = "auto",
+    concurrency: Optional[int] = None,
+) -> dict:
+    """
+    Load the cases and run them on a daemon thread; poll `get_eval_job`.
+    Arguments come from the API, so the path is confined to EVAL_DIR and
+    concurrency to 1..MAX_EVAL_CONCURRENCY (ValueError otherwise).
+    """
+    concurrency = parse_concurrency(concurrency)
+    try:
+        cases = load_cases(resolve_cases_path(path))
+    except FileNotFoundError:
+        raise ValueError("Case file not found") from None
+    if judge_mode not in JUDGES:
+        raise ValueError(f"Unknown judge {judge_mode!r}; use one of {JUDGES}")
+    job_id = uuid.uuid4().hex[:12]
+    with _jobs_lock:
+        finished = [j for j, v in _jobs.items() if v["state"] != "running"]
+        for old in finished[:max(0, len(finished) - MAX_JOBS + 1)]:
+            _jobs.pop(old)
+        _jobs[job_id] = {
+            "job_id": job_id,
+            "state": "running",
+            "total": len(cases),
+            "completed": 0,
+            "started_at": datetime.utcnow().isoformat(),
+            "report": None,
+        }
+
+    def _run():
+        try:
+            report = run_eval(
+                cases, judge_mode, concurrency,
+                on_progress=lambda n: _set_job(job_id, completed=n),
+            )
+            _set_job(job_id, state="done", report=report)
+        except Exception as exc:
+            _set_job(job_id, state="failed", report={"success": False, "message": str(exc)})
+
+    threading.Thread(target=_run, name=f"eval-{job_id}", daemon=True).start()
+    return {"success": True, "job_id": job_id, "total": len(cases)}
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Evaluate the RAG pipeline on a JSONL dataset")
+    parser.add_argument("--cases", default=EVAL_CASES_PATH)
+    parser.add_argument("--judge", choices=JUDGES, default="auto")
+    parser.add_argument("--concurrency", type=int, default=EVAL_CONCURRENCY)
+    parser.add_argument("--out", help="also write the full report to this file")
+    args = parser.parse_args()
+
+    report = run_eval(load_cases(args.cases), args.judge, args.concurrency)
+    for r in report["results"]:
+        mark = {"passed": "✅", "failed": "❌"}.get(r["status"], "⚠️ ")
+        print(f"{mark} {r['id']:<28} {r['latency_ms']:>8.1f} ms  "
+              f"tokens {r['tokens']['answer']}+{r['tokens']['judge']}  {r.get('error', '')}")
+    print(f"\n🏁 accuracy {report['accuracy']:.1%} ({report['passed']}/{report['total']}), "
+          f"p95 {report['latency_ms']['p95']} ms, tokens {report['tokens']}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
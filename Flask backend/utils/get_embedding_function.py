@@ -1,22 +1,50 @@
-from langchain_openai import OpenAIEmbeddings
 import os
+from functools import lru_cache
+from typing import Optional
 from dotenv import load_dotenv
 
 load_dotenv()
 
-def get_embedding_function():
+EMBEDDING_MODEL = "text-embedding-3-small"
+NATIVE_DIMENSIONS = 1536
+# text-embedding-3-* can return shortened vectors; smaller = less storage, faster search
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", str(NATIVE_DIMENSIONS)))
+
+
+def get_embedding_dimensions(dimensions: Optional[int] = None) -> int:
+    dims = dimensions or EMBEDDING_DIMENSIONS
+    if not 1 <= dims <= NATIVE_DIMENSIONS:
+        raise ValueError(
+            f"Embedding dimensions must be between 1 and {NATIVE_DIMENSIONS}, got {dims}."
+        )
+    return dims
+
+
+def get_embedding_function(dimensions: Optional[int] = None):
     # Returns OpenAI embeddings function using text-embedding-3-small model.
+    # `dimensions` defaults to EMBEDDING_DIMENSIONS (env), i.e. the full 1536.
 
+    dims = get_embedding_dimensions(dimensions)
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         raise ValueError(
             "OpenAI API key not found. Please set the OPENAI_API_KEY environment variable."
         )
-    
+    return _embeddings(dims, api_key)
+
+
+# one client (and HTTP connection pool) per process, built on first use
+@lru_cache(maxsize=4)
+def _embeddings(dims: int, api_key: str):
+    # imported here so importing this module (for the constants) stays cheap
+    from langchain_openai import OpenAIEmbeddings
+
     # Use text-embedding-3-small - it's cost-effective and performs well
+    extra = {"dimensions": dims} if dims != NATIVE_DIMENSIONS else {}
     embeddings = OpenAIEmbeddings(
-        model="text-embedding-3-small",
-        openai_api_key=api_key
+        model=EMBEDDING_MODEL,
+        openai_api_key=api_key,
+        **extra
     )
     
     return embeddings
@@ -0,0 +1,218 @@
+"""
+llm_cache.py
+—————————————————————————————————
+Exact-prompt completion cache for the chat model.
+
+Everything here runs at temperature 0, so the same prompt to the same model
+with the same parameters gives the same answer; the cache keeps those
+answers on disk (SQLite, shared by all workers) so repeated questions,
+re-ingesting unchanged PDFs (`classify_chunk`) and eval re-runs cost nothing.
+
+    llm = get_chat_model()                # ChatOpenAI wrapped in CachedChatModel
+    llm.invoke(prompt)                    # hit -> stored answer, miss -> API + store
+
+Key  = sha256(model, temperature, max_tokens, top_p, seed, base url, prompt)
+Only temperature-0 calls are cached. Entries older than LLM_CACHE_MAX_AGE_DAYS
+are ignored and purged; past LLM_CACHE_MAX_ENTRIES the least recently used
+ones are evicted. LLM_CACHE=0 disables the cache.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import TYPE_CHECKING, Optional
+
+from utils import metrics
+
+if TYPE_CHECKING:
+    from langchain_core.messages import AIMessage
+    from langchain_openai import ChatOpenAI
+
+LLM_CACHE = os.getenv("LLM_CACHE", "1") != "0"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.db")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "50000"))
+LLM_CACHE_MAX_AGE_DAYS = float(os.getenv("LLM_CACHE_MAX_AGE_DAYS", "30"))
+EVICT_EVERY = 200          # puts between eviction sweeps
+
+
+class PromptCache:
+    def __init__(self, path: str, max_entries: int, max_age_days: float):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age_days * 86400
+        self._lock = threading.Lock()
+        self._conn = None
+        self._puts = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS completions (
+                       key TEXT PRIMARY KEY,
+                       model TEXT,
+                       content TEXT NOT NULL,
+                       token_usage TEXT,
+                       created REAL NOT NULL,
+                       last_hit REAL NOT NULL)"""
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_completions_last_hit ON completions(last_hit)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            row = db.execute(
+                "SELECT content, token_usage FROM completions WHERE key=? AND created>=?",
+                (key, now - self.max_age),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                metrics.incr("llm_cache.miss")
+                return None
+            db.execute("UPDATE completions SET last_hit=? WHERE key=?", (now, key))
+            db.commit()
+            self.hits += 1
+        metrics.incr("llm_cache.hit")
+        return {"content": row[0], "token_usage": json.loads(row[1] or "{}")}
+
+    def put(self, key: str, model: str, content: str, token_usage: dict) -> None:
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO completions VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, content, json.dumps(token_usage or {}), now, now),
+            )
+            db.commit()
+            self._puts += 1
+            if self._puts % EVICT_EVERY == 0:
+                self._evict(db, now)
+
+    def _evict(self, db: sqlite3.Connection, now: float) -> None:
+        db.execute("DELETE FROM completions WHERE created<?", (now - self.max_age,))
+        db.execute(
+            """DELETE FROM completions WHERE key IN (
+                   SELECT key FROM completions ORDER BY last_hit DESC LIMIT -1 OFFSET ?)""",
+            (self.max_entries,),
+        )
+        db.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db().execute("DELETE FROM completions")
+            self._db().commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._db().execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+            total = self.hits + self.misses
+            return {
+                "entries": entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
+
+
+prompt_cache = PromptCache(LLM_CACHE_PATH, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_MAX_AGE_DAYS)
+
+
+def _prompt_text(prompt) -> str:
+    if isinstance(prompt, str):
+        return prompt
+    if hasattr(prompt, "to_messages"):          # ChatPromptValue
+        prompt = prompt.to_messages()
+    return json.dumps(
+        [(getattr(m, "type", ""), getattr(m, "content", str(m))) for m in prompt]
+    )
+
+
+class CachedChatModel:
+    """
+    Wraps a chat model: `invoke` consults the cache first. Call `lookup` and
+    `invoke_uncached` separately when the API call itself needs guarding
+    (query_rag only takes an admission slot on a miss).
+    """
+
+    def __init__(self, llm: "ChatOpenAI", cache: PromptCache = prompt_cache):
+        self.llm = llm
+        self.cache = cache
+        self.enabled = LLM_CACHE and not llm.temperature
+
+    def key(self, prompt) -> str:
+        params = {
+            "model": self.llm.model_name,
+            "temperature": self.llm.temperature,
+            "max_tokens": self.llm.max_tokens,
+            "top_p": self.llm.top_p,
+            "seed": self.llm.seed,
+            "base_url": self.llm.openai_api_base,
+            "model_kwargs": self.llm.model_kwargs,
+            "prompt": _prompt_text(prompt),
+        }
+        blob = json.dumps(params, sort_keys=True, default=str)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt) -> Optional["AIMessage"]:
+        if not self.enabled:
+            return None
+        hit = self.cache.get(self.key(prompt))
+        if hit is None:
+            return None
+        from langchain_core.messages import AIMessage
+
+        metrics.incr("llm_cache.tokens_saved", hit["token_usage"].get("total_tokens", 0))
+        # nothing was spent on this call; the original usage is kept for reference
+        return AIMessage(
+            content=hit["content"],
+            response_metadata={
+                "cache_hit": True,
+                "token_usage": {},
+                "cached_token_usage": hit["token_usage"],
+            },
+        )
+
+    def invoke_uncached(self, prompt, **kwargs):
+        resp = self.llm.invoke(prompt, **kwargs)
+        if self.enabled and not kwargs:
+            usage = (getattr(resp, "response_metadata", None) or {}).get("token_usage") or {}
+            self.cache.put(self.key(prompt), self.llm.model_name, resp.content, usage)
+        return resp
+
+    def invoke(self, prompt, **kwargs):
+        return (None if kwargs else self.lookup(prompt)) or self.invoke_uncached(prompt, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
+
+
+def get_chat_model(model: str = "gpt-3.5-turbo", temperature: float = 0.0) -> CachedChatModel:
+    from langchain_openai import ChatOpenAI   # the openai SDK is slow to import
+
+    return CachedChatModel(
+        ChatOpenAI(
+            model=model,
+            temperature=temperature,
+            openai_api_key=os.getenv("OPENAI_API_KEY"),
+        )
+    )
+
+
+if __name__ == "__main__":
+    import sys
+
+    if sys.argv[1:] == ["clear"]:
+        prompt_cache.clear()
+    print(prompt_cache.stats())
@@ -0,0 +1,78 @@
+"""
+metrics.py
+—————————————————————————————————
+Tiny in-process metrics registry served by `/api/metrics`.
+
+    incr("llm.rejected")                 # counter
+    observe("llm.wait_ms", 12.5)         # summary over the last SAMPLE_WINDOW values
+    register_gauge("llm.queue_depth", fn)  # read on every snapshot()
+
+Per-worker only (each gunicorn worker reports its own numbers).
+"""
+
+import threading
+from collections import deque
+from typing import Callable, Deque, Dict
+
+SAMPLE_WINDOW = 1000
+
+_lock = threading.Lock()
+_counters: Dict[str, int] = {}
+_samples: Dict[str, Deque[float]] = {}
+_observed: Dict[str, int] = {}
+_gauges: Dict[str, Callable[[], float]] = {}
+
+
+def incr(name: str, n: int = 1) -> None:
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def observe(name: str, value: float) -> None:
+    with _lock:
+        _samples.setdefault(name, deque(maxlen=SAMPLE_WINDOW)).append(value)
+        _observed[name] = _observed.get(name, 0) + 1
+
+
+def register_gauge(name: str, fn: Callable[[], float]) -> None:
+    with _lock:
+        _gauges[name] = fn
+
+
+def _summary(values) -> dict:
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def pct(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 2)
+
+    return {
+        "avg": round(sum(ordered) / len(ordered), 2),
+        "p50": pct(0.50),
+        "p95": pct(0.95),
+        "max": round(ordered[-1], 2),
+    }
+
+
+def snapshot() -> dict:
+    with _lock:
+        counters = dict(_counters)
+        samples = {k: list(v) for k, v in _samples.items()}
+        observed = dict(_observed)
+        gauges = dict(_gauges)
+    return {
+        "counters": counters,
+        "gauges": {name: fn() for name, fn in gauges.items()},
+        "summaries": {
+            name: {"count": observed[name], **_summary(values)}
+            for name, values in samples.items()
+        },
+    }
+
+
+def reset() -> None:
+    with _lock:
+        _counters.clear()
+        _samples.clear()
+        _observed.clear()
@@ -0,0 +1,142 @@
+"""
+migrate_embeddings.py
+—————————————————————————————————
+Builds a copy of the live collection at a different embedding dimension.
+
+Chunk text and metadata (including the LLM audience/topic tags) are read
+back from the existing collection, so no PDF is re-parsed and no chunk is
+re-classified — only the embedding call is repeated. The target collection
+is filled in batches and ids already present are skipped, so an interrupted
+migration simply resumes. Its partitions (VECTOR_PARTITIONS) and document
+index are then rebuilt from the stored vectors, so partitioned and two-stage
+retrieval work as soon as the app switches over.
+
+Once it finishes, point the app at it with EMBEDDING_DIMENSIONS=<dims>.
+
+    python -m utils.migrate_embeddings 512
+"""
+
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+from utils.document_index import rebuild_document_index
+from utils.get_embedding_function import get_embedding_dimensions
+from utils.vector_store import VECTOR_PARTITIONS, collection_name, get_db, get_shards, rebuild_partitions
+from utils.write_lock import WriterBusy, busy_result, single_writer
+
+BATCH_SIZE = 256
+
+# progress of the background migration (one at a time per process)
+_status: dict = {"state": "idle"}
+_status_lock = threading.Lock()
+
+
+def _set_status(**fields) -> None:
+    with _status_lock:
+        _status.update(fields)
+
+
+def get_migration_status() -> dict:
+    with _status_lock:
+        return dict(_status)
+
+
+def migrate_embeddings(
+    dimensions: int,
+    source_dimensions: Optional[int] = None,
+    batch_size: int = BATCH_SIZE,
+) -> dict:
+    """Re-embed every chunk of the source collection into the `dimensions` collection."""
+    try:
+        with single_writer():
+            return _migrate(dimensions, source_dimensions, batch_size)
+    except WriterBusy as exc:
+        return busy_result(exc)
+
+
+def _migrate(dimensions: int, source_dimensions: Optional[int], batch_size: int) -> dict:
+    dims = get_embedding_dimensions(dimensions)
+    src_dims = get_embedding_dimensions(source_dimensions)
+    if dims == src_dims:
+        return {"success": False,
+                "message": f"Source collection is already at {dims} dimensions."}
+
+    # shard i of the source goes to shard i of the target (same as unsharded: one pair)
+    target_db = get_db(dims)
+    pairs = list(zip(get_shards(get_db(src_dims)), get_shards(target_db)))
+    src_ids, todo_by_pair = [], []
+    for source, target in pairs:
+        ids = source.get(include=[])["ids"]
+        done = set(target.get(include=[])["ids"])
+        src_ids.extend(ids)
+        todo_by_pair.append([i for i in ids if i not in done])
+    todo = [i for ids in todo_by_pair for i in ids]
+
+    _set_status(state="running", target=collection_name(dims), dimensions=dims,
+                total=len(src_ids), migrated=len(src_ids) - len(todo),
+                started_at=datetime.utcnow().isoformat())
+    print(f"🔁 Re-embedding {len(todo)} of {len(src_ids)} chunks at {dims} dims")
+
+    t0 = time.perf_counter()
+    migrated = len(src_ids) - len(todo)
+    for (source, target), pair_todo in zip(pairs, todo_by_pair):
+        for start in range(0, len(pair_todo), batch_size):
+            batch_ids = pair_todo[start:start + batch_size]
+            batch = source.get(ids=batch_ids, include=["documents", "metadatas"])
+            target.add_texts(
+                texts=batch["documents"],
+                metadatas=batch["metadatas"],
+                ids=batch["ids"],
+            )
+            migrated += len(batch_ids)
+            _set_status(migrated=migrated)
+
+    # derived collections, built from the stored vectors (no embedding calls)
+    _set_status(state="indexing")
+    partitions = rebuild_partitions(db=target_db) if VECTOR_PARTITIONS else {}
+    documents = rebuild_document_index(target_db)["documents"]
+
+    result = {
+        "success": True,
+        "message": f"Collection '{collection_name(dims)}' is ready.",
+        "collection": collection_name(dims),
+        "dimensions": dims,
+        "chunks_total": len(src_ids),
+        "chunks_embedded": len(todo),
+        "partitions": partitions,
+        "documents_indexed": documents,
+        "seconds": round(time.perf_counter() - t0, 2),
+    }
+    _set_status(state="done", result=result)
+    print(f"✅ {result['message']} Set EMBEDDING_DIMENSIONS={dims} to use it.")
+    return result
+
+
+def start_migration(dimensions: int, source_dimensions: Optional[int] = None) -> dict:
+    """Run `migrate_embeddings` on a daemon thread; poll `get_migration_status`."""
+    if get_migration_status()["state"] in ("running", "indexing"):
+        return {"success": False, "message": "A migration is already running."}
+
+    def _run():
+        try:
+            result = migrate_embeddings(dimensions, source_dimensions)
+            if not result["success"]:
+                _set_status(state="failed", result=result)
+        except Exception as exc:
+            _set_status(state="failed", result={"success": False, "message": str(exc)})
+
+    _set_status(state="running", result=None)
+    threading.Thread(target=_run, name="embedding-migration", daemon=True).start()
+    return {"success": True, "message": "Migration started.", "dimensions": dimensions}
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("usage: python -m utils.migrate_embeddings <dimensions> [source_dimensions]")
+        sys.exit(1)
+    src = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    print(migrate_embeddings(int(sys.argv[1]), src))
@@ -0,0 +1,111 @@
+"""
+mmr.py
+—————————————————————————————————
+Maximal-marginal-relevance selection over the retrieved candidates.
+
+`rank_chunks` scores each chunk on its own, so two near-identical chunks of
+the same page can take two of the six context slots. MMR picks chunks one
+at a time, trading the personalized score against similarity to what was
+already picked:
+
+    next = argmax  λ · relevance(c) − (1 − λ) · max_{s ∈ picked} cos(c, s)
+
+λ = 1 is plain ranking, lower values diversify more. The candidates'
+cosine-similarity matrix is computed once with NumPy; each greedy step is
+a vector update, so there is no per-pair Python loop.
+
+Candidate vectors come from the snapshot when one is loaded, otherwise
+from Chroma (stored embeddings, nothing is re-embedded).
+"""
+
+import os
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from utils import metrics
+from utils.vector_snapshot import load_snapshot
+from utils.vector_store import get_by_ids, get_db
+
+# default λ; "" / 1 disables MMR unless a request asks for it
+MMR_LAMBDA = os.getenv("MMR_LAMBDA", "")
+
+
+def default_lambda() -> Optional[float]:
+    return float(MMR_LAMBDA) if MMR_LAMBDA else None
+
+
+def candidate_embeddings(docs: List[Document], embedding_fn=None) -> Optional[np.ndarray]:
+    """(n, d) matrix of the stored vectors of `docs`, or None if any is missing."""
+    ids = [d.metadata.get("id") for d in docs]
+    if not all(ids):
+        return None
+
+    snapshot = load_snapshot()
+    if snapshot is not None:
+        rows = [snapshot.row_of(i) for i in ids]
+        if all(r is not None for r in rows):
+            return np.asarray(snapshot.embeddings[rows], dtype=np.float32)
+
+    data = get_by_ids(get_db(embedding_function=embedding_fn), ids, ["embeddings"])
+    by_id = dict(zip(data["ids"], data["embeddings"]))
+    if len(by_id) != len(set(ids)):
+        return None
+    return np.asarray([by_id[i] for i in ids], dtype=np.float32)
+
+
+def mmr_select(
+    embeddings: np.ndarray,
+    relevance: np.ndarray,
+    k: int,
+    lambda_mult: float,
+) -> List[int]:
+    """Greedy MMR; returns the indices of the `k` picked rows in pick order."""
+    n = len(relevance)
+    if n == 0:
+        return []
+    k = min(k, n)
+
+    unit = embeddings / (np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-12)
+    sim = unit @ unit.T                                  # one (n, n) matrix per query
+
+    # scale relevance to [0, 1] so it is comparable with cosine similarity
+    rel = relevance.astype(np.float32)
+    span = float(rel.max() - rel.min())
+    rel = (rel - rel.min()) / span if span > 0 else np.ones_like(rel)
+
+    picked = [int(np.argmax(rel))]
+    max_sim = sim[picked[0]].copy()                      # similarity to the picked set
+    available = np.ones(n, dtype=bool)
+    available[picked[0]] = False
+    for _ in range(k - 1):
+        score = lambda_mult * rel - (1.0 - lambda_mult) * max_sim
+        score[~available] = -np.inf
+        j = int(np.argmax(score))
+        picked.append(j)
+        available[j] = False
+        np.maximum(max_sim, sim[j], out=max_sim)
+    return picked
+
+
+def diversify(
+    scored: List[Tuple[Document, float]],
+    k: int,
+    lambda_mult: float,
+    embedding_fn=None,
+) -> List[Tuple[Document, float]]:
+    """
+    Pick `k` of the (Document, personalized score) pairs with MMR. Falls back
+    to the top `k` by score when the vectors are not available.
+    """
+    if len(scored) <= 1 or lambda_mult >= 1.0:
+        return scored[:k]
+    t0 = time.perf_counter()
+    emb = candidate_embeddings([d for d, _ in scored], embedding_fn)
+    if emb is None:
+        return scored[:k]
+    order = mmr_select(emb, np.array([s for _, s in scored]), k, lambda_mult)
+    metrics.observe("mmr.ms", (time.perf_counter() - t0) * 1000)
+    return [scored[i] for i in order]
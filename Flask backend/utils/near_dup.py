@@ -0,0 +1,154 @@
+"""
+near_dup.py
+—————————————————————————————————
+Near-duplicate chunk detection for ingestion (MinHash + LSH).
+
+Our PDFs repeat boilerplate: headers, legal text, the same rules summary
+in every edition. Without this, every copy is classified, embedded and
+stored. `deduplicate` keeps the first copy of each near-duplicate group
+and records the other PDFs it appears in on that chunk:
+
+    metadata["duplicate_sources"] = "data/rules-2023.pdf,data/rules-2024.pdf"
+
+(comma-joined like audience / topics). Skipped copies cost no LLM
+tagging, no embedding and no index space.
+
+  • signature: word 5-gram shingles, each hashed once with mmh3, then
+    NUM_PERM universal-hash permutations in NumPy. The minimum per
+    permutation estimates Jaccard similarity.
+  • LSH: the signature is cut into LSH_BANDS bands. Chunks sharing any
+    band are candidates, and a candidate counts as a duplicate when its
+    estimated Jaccard is >= NEAR_DUP_THRESHOLD. With 16 bands × 8 rows,
+    pairs at 0.85 are found ~99% of the time and pairs below 0.5 almost
+    never become candidates.
+
+The index is built in memory per populate, from the stored chunks plus the
+new ones. That is CPU only, roughly 3 seconds per 10k chunks. It is off by
+default; NEAR_DUP=1 turns it on.
+"""
+
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+NEAR_DUP = os.getenv("NEAR_DUP", "0") == "1"
+NEAR_DUP_THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.85"))
+NUM_PERM = 128
+LSH_BANDS = 16                      # 16 bands x 8 rows = NUM_PERM
+SHINGLE_WORDS = 5
+
+_MERSENNE = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_rng = np.random.RandomState(1)     # fixed: signatures must match across runs
+_A = _rng.randint(1, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+_B = _rng.randint(0, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+_TOKEN = re.compile(r"\w+")
+
+
+def signature(text: str) -> Optional[np.ndarray]:
+    """MinHash signature of `text` (uint64[NUM_PERM]), None for empty text."""
+    import mmh3
+
+    words = _TOKEN.findall(text.lower())
+    if not words:
+        return None
+    n = min(SHINGLE_WORDS, len(words))
+    shingles = {" ".join(words[i:i + n]) for i in range(len(words) - n + 1)}
+    hashes = np.fromiter((mmh3.hash(s, signed=False) for s in shingles),
+                         dtype=np.uint64, count=len(shingles))
+    # (a*h + b) mod p, truncated to 32 bits; uint64 overflow is intended
+    permuted = ((hashes[:, None] * _A + _B) % _MERSENNE) & _MAX_HASH
+    return permuted.min(axis=0)
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.mean(a == b))
+
+
+class LSHIndex:
+    def __init__(self, bands: int = LSH_BANDS, threshold: float = NEAR_DUP_THRESHOLD):
+        self.bands = bands
+        self.rows = NUM_PERM // bands
+        self.threshold = threshold
+        self._buckets: List[Dict[bytes, List[str]]] = [{} for _ in range(bands)]
+        self._sigs: Dict[str, np.ndarray] = {}
+
+    def _band_keys(self, sig: np.ndarray):
+        for b in range(self.bands):
+            yield b, sig[b * self.rows:(b + 1) * self.rows].tobytes()
+
+    def add(self, key: str, sig: np.ndarray) -> None:
+        self._sigs[key] = sig
+        for b, band in self._band_keys(sig):
+            self._buckets[b].setdefault(band, []).append(key)
+
+    def query(self, sig: np.ndarray) -> Optional[Tuple[str, float]]:
+        """Most similar indexed key at or above the threshold, with its similarity."""
+        candidates = set()
+        for b, band in self._band_keys(sig):
+            candidates.update(self._buckets[b].get(band, ()))
+        best = None
+        for key in candidates:
+            sim = similarity(sig, self._sigs[key])
+            if sim >= self.threshold and (best is None or sim > best[1]):
+                best = (key, sim)
+        return best
+
+    def __len__(self) -> int:
+        return len(self._sigs)
+
+
+def _add_source(metadata: dict, source: str) -> bool:
+    """Record `source` in duplicate_sources; False if it was already there (or is the chunk's own)."""
+    if not source or source == metadata.get("source"):
+        return False
+    sources = [s for s in (metadata.get("duplicate_sources") or "").split(",") if s]
+    if source in sources:
+        return False
+    metadata["duplicate_sources"] = ",".join(sources + [source])
+    return True
+
+
+def deduplicate(
+    new_chunks: List[Document],
+    stored: List[Tuple[str, str, dict]],
+) -> Tuple[List[Document], Dict[str, dict], int]:
+    """
+    Drop the new chunks that near-duplicate a stored chunk or an earlier new
+    one. `stored` is [(id, text, metadata)] of what is already in Chroma.
+
+    Returns (chunks to store, {stored id: updated metadata}, skipped count).
+    """
+    index = LSHIndex()
+    stored_meta: Dict[str, dict] = {}
+    for chunk_id, text, meta in stored:
+        sig = signature(text or "")
+        if sig is not None:
+            index.add(chunk_id, sig)
+            stored_meta[chunk_id] = dict(meta or {})
+
+    kept: List[Document] = []
+    kept_by_id: Dict[str, Document] = {}
+    updated: Dict[str, dict] = {}
+    skipped = 0
+    for chunk in new_chunks:
+        sig = signature(chunk.page_content)
+        hit = index.query(sig) if sig is not None else None
+        if hit is None:
+            kept.append(chunk)
+            if sig is not None:
+                index.add(chunk.metadata["id"], sig)
+                kept_by_id[chunk.metadata["id"]] = chunk
+            continue
+
+        skipped += 1
+        original_id = hit[0]
+        source = chunk.metadata.get("source")
+        if original_id in kept_by_id:
+            _add_source(kept_by_id[original_id].metadata, source)
+        elif _add_source(stored_meta[original_id], source):
+            updated[original_id] = stored_meta[original_id]
+    return kept, updated, skipped
@@ -0,0 +1,162 @@
+"""
+page_cache.py
+—————————————————————————————————
+Extracted PDF text, cached so populate doesn't parse the same PDF twice.
+
+Text extraction (pypdf) is the slowest CPU step of ingestion. Each PDF's
+pages are stored once as zstd-compressed JSON lines,
+
+    page_cache/<sha256 of the PDF bytes>.jsonl.zst
+    {"page_content": "...", "metadata": {"page": 0, "total_pages": 12, ...}}
+
+keyed by content, so a renamed or moved PDF still hits and an edited one
+misses. A full rebuild (`populate --reset`) or re-splitting with another
+chunk size then reads text straight from the cache. The key also covers
+PARSER_VERSION and the pypdf version, so a parser change invalidates it.
+
+PAGE_CACHE=0 turns it off. Inspect or empty it with:
+
+    python -m utils.page_cache [clear]
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+PAGE_CACHE = os.getenv("PAGE_CACHE", "1") != "0"
+PAGE_CACHE_PATH = os.getenv("PAGE_CACHE_PATH", "page_cache")
+PARSER_VERSION = "pypdf-plain-1"        # bump when the extraction settings change
+PDF_GLOB = "**/[!.]*.pdf"               # same as PyPDFDirectoryLoader's default
+ZSTD_LEVEL = 10
+HASH_BLOCK = 1 << 20
+
+_stats = {"hits": 0, "misses": 0}
+
+
+def _parser_tag() -> str:
+    try:
+        import pypdf
+
+        return f"{PARSER_VERSION}:{pypdf.__version__}"
+    except ImportError:
+        return PARSER_VERSION
+
+
+def content_key(path: str) -> str:
+    h = hashlib.sha256(_parser_tag().encode("utf-8"))
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(HASH_BLOCK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _cache_file(key: str) -> str:
+    return os.path.join(PAGE_CACHE_PATH, f"{key}.jsonl.zst")
+
+
+def _read(cache_file: str, source: str) -> List[Document]:
+    import zstandard
+
+    with open(cache_file, "rb") as fh:
+        raw = zstandard.ZstdDecompressor().stream_reader(fh).read()
+    pages = []
+    for line in raw.decode("utf-8").splitlines():
+        row = json.loads(line)
+        # the cache is keyed by content; the path is whatever it is called now
+        pages.append(Document(page_content=row["page_content"],
+                              metadata={**row["metadata"], "source": source}))
+    return pages
+
+
+def _write(cache_file: str, pages: List[Document]) -> None:
+    import zstandard
+
+    os.makedirs(PAGE_CACHE_PATH, exist_ok=True)
+    lines = "".join(
+        json.dumps({
+            "page_content": p.page_content,
+            "metadata": {k: v for k, v in p.metadata.items() if k != "source"},
+        }, ensure_ascii=False, default=str) + "\n"
+        for p in pages
+    )
+    tmp = f"{cache_file}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as fh:
+        fh.write(zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(lines.encode("utf-8")))
+    os.replace(tmp, cache_file)          # readers never see a half-written file
+
+
+def _parse(path: str) -> List[Document]:
+    from langchain_community.document_loaders import PyPDFLoader
+
+    pages = PyPDFLoader(path).load()
+    for page in pages:
+        page.metadata["source"] = path
+    return pages
+
+
+def load_pdf(path: str) -> Tuple[List[Document], bool]:
+    """Pages of one PDF and whether they came from the cache."""
+    if not PAGE_CACHE:
+        return _parse(path), False
+    cache_file = _cache_file(content_key(path))
+    if os.path.exists(cache_file):
+        try:
+            pages = _read(cache_file, path)
+            _stats["hits"] += 1
+            return pages, True
+        except Exception as exc:                 # corrupt entry – re-parse and overwrite
+            print(f"⚠️  Page cache entry {cache_file} unreadable ({exc}); re-parsing")
+    pages = _parse(path)
+    _write(cache_file, pages)
+    _stats["misses"] += 1
+    return pages, False
+
+
+def pdf_paths(data_path: str) -> List[str]:
+    root = Path(data_path)
+    return [
+        str(p) for p in sorted(root.glob(PDF_GLOB))
+        if p.is_file() and not any(part.startswith(".") for part in p.relative_to(root).parts)
+    ]
+
+
+def iter_pages(data_path: str, stats: Optional[dict] = None) -> Iterator[Document]:
+    """
+    Every page of every PDF under `data_path`, from the cache where possible.
+    If given, `stats["hits"]` / `stats["misses"]` count the PDFs read from the
+    cache / parsed by this call.
+    """
+    for path in pdf_paths(data_path):
+        pages, hit = load_pdf(path)
+        if stats is not None:
+            key = "hits" if hit else "misses"
+            stats[key] = stats.get(key, 0) + 1
+        yield from pages
+
+
+def stats() -> dict:
+    files = list(Path(PAGE_CACHE_PATH).glob("*.jsonl.zst"))
+    return {
+        **_stats,
+        "entries": len(files),
+        "bytes": sum(f.stat().st_size for f in files),
+    }
+
+
+def clear() -> int:
+    files = list(Path(PAGE_CACHE_PATH).glob("*.jsonl.zst"))
+    for f in files:
+        f.unlink()
+    return len(files)
+
+
+if __name__ == "__main__":
+    import sys
+
+    if sys.argv[1:] == ["clear"]:
+        print(f"🗑️ Removed {clear()} cached PDFs")
+    print(stats())
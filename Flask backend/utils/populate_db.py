@@ -20,18 +20,33 @@ In here meta data is like
 
 """
 
-import os, json, re, shutil
+import os, json, re
+import threading
+from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 
-from langchain_community.document_loaders import PyPDFDirectoryLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain.schema.document import Document
-from langchain_openai import ChatOpenAI          # NEW
 from dotenv import load_dotenv                   # NEW
-from langchain_chroma import Chroma
 
-from utils.get_embedding_function import get_embedding_function
+from utils import page_cache
+from utils.document_index import update_document_index
+from utils.near_dup import NEAR_DUP, deduplicate
+from utils.vector_store import (
+    VECTOR_SHARDS,
+    add_to_partitions,
+    bump_corpus_version,
+    get_db,
+    get_shards,
+    reset_store,
+    shard_of,
+)
+from utils.vector_snapshot import refresh_snapshot_if_present
+from utils.llm_cache import get_chat_model
+from utils.write_lock import WriterBusy, busy_result, single_writer
+from utils.token_splitter import SPLITTER, split_pages
 
 load_dotenv()  # make sure OPENAI_API_KEY is available
 
@@ -41,7 +56,10 @@ DATA_PATH   = "data"
 
 # 1.  LLM & tag vocabulary
 
-LLM = ChatOpenAI(model="gpt-3.5-turbo", temperature=0.0)
+# built on first use, not at import (keeps app start-up and CLI --help fast)
+@lru_cache(maxsize=1)
+def get_llm():
+    return get_chat_model("gpt-3.5-turbo", temperature=0.0)   # re-ingesting an unchanged chunk hits the cache
 
 ROLE_SET  = [
     "developer", "manager", "admin", "support", "customer", "researcher",
@@ -58,7 +76,10 @@ def classify_chunk(text: str) -> dict:
     Falls back to {'general', []} on any error.
     """
     # shrink long chunks to ~800 chars to save tokens
-    sample = re.sub(r"\s+", " ", text)[:800]
+    # (SPLITTER=tokens chunks are already within CHUNK_TOKENS)
+    sample = re.sub(r"\s+", " ", text)
+    if SPLITTER != "tokens":
+        sample = sample[:800]
 
     prompt = (
         "Identify the primary audience role(s) (choose from: "
@@ -70,7 +91,7 @@ def classify_chunk(text: str) -> dict:
     )
 
     try:
-        resp   = LLM.invoke(prompt)
+        resp   = get_llm().invoke(prompt)
         parsed = json.loads(resp.content)
 
         audience = [r for r in parsed.get("audience", []) if r in ROLE_SET]
@@ -84,9 +105,17 @@ def classify_chunk(text: str) -> dict:
 # 2.  ETL helpers (mostly unchanged)
 
 def load_documents() -> List[Document]:
-    return PyPDFDirectoryLoader(DATA_PATH).load()
+    # same pages as PyPDFDirectoryLoader(DATA_PATH).load(), but unchanged PDFs
+    # come from the extracted-text cache instead of being parsed again
+    cache_stats = {"hits": 0, "misses": 0}
+    docs = list(page_cache.iter_pages(DATA_PATH, cache_stats))
+    print(f"📄 Loaded {len(docs)} pages ({cache_stats['hits']} PDFs from cache, "
+          f"{cache_stats['misses']} parsed)")
+    return docs
 
 def split_documents(docs: List[Document]) -> List[Document]:
+    if SPLITTER == "tokens":
+        return list(split_pages(docs))      # CHUNK_TOKENS / CHUNK_OVERLAP_TOKENS
     splitter = RecursiveCharacterTextSplitter(
         chunk_size=800, chunk_overlap=80, length_function=len
     )
@@ -116,65 +145,141 @@ def tag_chunks(chunks: list[Document]) -> list[Document]:
 # Stores the chunks in a Chroma vector database
 # Prevents duplication by checking if chunk ID already exists.
 
-def add_to_chroma(chunks: List[Document]) -> int:
-    db = Chroma(persist_directory=CHROMA_PATH,
-                embedding_function=get_embedding_function())
+def add_to_chroma(chunks: List[Document], stats: Optional[dict] = None) -> int:
+    db = get_db()
 
     chunks = calculate_chunk_ids(chunks)
-    chunks = tag_chunks(chunks)                # ← NEW: content-based tags
 
-    existing_ids = set(db.get(include=[])["ids"])
+    shards = get_shards(db)                    # just [db] unless VECTOR_SHARDS > 1
+    existing_ids, stored, shard_of_id = set(), [], {}
+    for i, shard in enumerate(shards):
+        data = shard.get(include=["documents", "metadatas"] if NEAR_DUP else [])
+        existing_ids.update(data["ids"])
+        if NEAR_DUP:
+            stored.extend(zip(data["ids"], data["documents"], data["metadatas"]))
+            shard_of_id.update((chunk_id, i) for chunk_id in data["ids"])
     new_chunks   = [c for c in chunks if c.metadata["id"] not in existing_ids]
 
+    skipped = 0
+    if NEAR_DUP and new_chunks:
+        # boilerplate repeated across PDFs is stored once, with the other
+        # PDFs listed in its duplicate_sources (see utils/near_dup.py)
+        new_chunks, updated, skipped = deduplicate(new_chunks, stored)
+        for chunk_id, meta in updated.items():
+            shards[shard_of_id[chunk_id]]._collection.update(ids=[chunk_id], metadatas=[meta])
+        print(f"♻️  Near-duplicates skipped: {skipped}"
+              + (f" ({len(updated)} stored chunks got new sources)" if updated else ""))
+        if updated and not new_chunks:
+            bump_corpus_version()
+            refresh_snapshot_if_present(db)
+    if stats is not None:
+        stats["near_duplicates_skipped"] = skipped
+
     if not new_chunks:
         print("✅ No new documents to add")
         return 0
 
+    new_chunks = tag_chunks(new_chunks)        # ← NEW: content-based tags (only what gets stored)
+
     print(f"👉 Adding new documents: {len(new_chunks)}")
-    db.add_documents(new_chunks, ids=[c.metadata["id"] for c in new_chunks])
-    print("✅ Documents added and persisted automatically")
+    by_shard: dict = {}
+    for c in new_chunks:
+        # whole PDFs stay together: same source -> same shard
+        i = shard_of(c.metadata.get("source")) if VECTOR_SHARDS > 1 else 0
+        by_shard.setdefault(i, []).append(c)
+
+    parts = {}
+    for i, shard_chunks in sorted(by_shard.items()):
+        shard_ids = [c.metadata["id"] for c in shard_chunks]
+        shards[i].add_documents(shard_chunks, ids=shard_ids)
+        parts.update(add_to_partitions(shards[i], shard_ids, db))   # per-role/topic copies, if enabled
+    print("✅ Documents added and persisted automatically"
+          + (f" across {len(by_shard)} shards" if VECTOR_SHARDS > 1 else ""))
+    if parts:
+        print(f"🗂️  Updated {len(parts)} partitions")
+    # one centroid per touched PDF, for RETRIEVAL_MODE=two_stage
+    indexed = update_document_index(db, {c.metadata.get("source") for c in new_chunks})
+    print(f"📚 Document index: {indexed} PDFs updated")
+    bump_corpus_version()
+    refresh_snapshot_if_present(db)   # keep the workers' mmap snapshot current
     return len(new_chunks)
 
 
 # 3.  CLI wrapper (unchanged API)
 
 def clear_database():
-    if os.path.exists(CHROMA_PATH):
-        shutil.rmtree(CHROMA_PATH)
+    reset_store()       # embedded: rm -r chroma/, server: drop our collections
 
 def populate_database(reset: bool = False):
     try:
-        if reset:
-            print("✨ Clearing Database")
-            clear_database()
-
-        if not os.path.exists(DATA_PATH):
-            return {"success": False,
-                    "message": f"Data directory '{DATA_PATH}' not found."}
-
-        docs = load_documents()
-        if not docs:
-            return {"success": False,
-                    "message": "No PDF documents found in data/."}
-
-        chunks         = split_documents(docs)
-        new_docs_added = add_to_chroma(chunks)
-
-        msg = ("Database populated successfully"
-               if new_docs_added else
-               "No new documents were added. All documents already exist.")
-
-        return {
-            "success": True,
-            "message": msg,
-            "documents_processed": len(docs),
-            "chunks_created": len(chunks),
-            "new_documents_added": new_docs_added,
-        }
-
+        # one writer at a time across workers / CLI (see utils/write_lock.py)
+        with single_writer():
+            if reset:
+                print("✨ Clearing Database")
+                clear_database()
+
+            if not os.path.exists(DATA_PATH):
+                return {"success": False,
+                        "message": f"Data directory '{DATA_PATH}' not found."}
+
+            docs = load_documents()
+            if not docs:
+                return {"success": False,
+                        "message": "No PDF documents found in data/."}
+
+            chunks         = split_documents(docs)
+            ingest_stats   = {}
+            new_docs_added = add_to_chroma(chunks, ingest_stats)
+
+            msg = ("Database populated successfully"
+                   if new_docs_added else
+                   "No new documents were added. All documents already exist.")
+
+            return {
+                "success": True,
+                "message": msg,
+                "documents_processed": len(docs),
+                "chunks_created": len(chunks),
+                "new_documents_added": new_docs_added,
+                **ingest_stats,
+            }
+
+    except WriterBusy as exc:
+        return busy_result(exc)
     except Exception as exc:
         return {"success": False,
                 "message": f"Error populating database: {exc}"}
 
+# 4.  Background runs (POST /api/populate) – a full ingest outlives any
+#     request timeout, so the endpoint starts it here and clients poll
+
+_status: dict = {"state": "idle"}       # one run at a time per process
+_status_lock = threading.Lock()
+
+
+def get_populate_status() -> dict:
+    with _status_lock:
+        return dict(_status)
+
+
+def start_populate(reset: bool = False) -> dict:
+    """Run `populate_database` on a daemon thread; poll `get_populate_status`."""
+    with _status_lock:
+        if _status["state"] == "running":
+            return {"success": False, "message": "A populate is already running."}
+        _status.clear()
+        _status.update(state="running", reset=reset, result=None,
+                       started_at=datetime.utcnow().isoformat())
+
+    def _run():
+        result = populate_database(reset=reset)        # reports its own errors
+        with _status_lock:
+            _status.update(state="done" if result["success"] else "failed", result=result,
+                           finished_at=datetime.utcnow().isoformat())
+
+    threading.Thread(target=_run, name="populate", daemon=True).start()
+    return {"success": True, "message": "Populate started.", "reset": reset}
+
+
 if __name__ == "__main__":
     print(populate_database(reset=False))
@@ -0,0 +1,62 @@
+"""
+prefork.py
+—————————————————————————————————
+Hooks for running the app under a pre-fork server (gunicorn.conf.py).
+
+`preload_shared_state()` runs once in the master, before the workers are
+forked. It loads what is read-only and safe to share copy-on-write:
+the heavy modules (langchain, chromadb, openai), the prompt template, the
+tiktoken encoding and the memory-mapped vector snapshot. It opens no
+Chroma client, SQLite connection or HTTP client. Those hold file
+descriptors, locks and threads that must not be shared across fork.
+
+`after_fork()` runs in every worker. It drops anything the master did
+open (the profile DB pool was touched at import, for `create_all`), then
+starts the per-worker warm-up.
+"""
+
+import time
+
+
+def preload_shared_state() -> dict:
+    t0 = time.perf_counter()
+
+    import chromadb            # noqa: F401  (module import only, no client)
+    import langchain_chroma    # noqa: F401
+    import langchain_openai    # noqa: F401
+
+    from utils.context_packer import CONTEXT_MODEL, _encoding
+    from utils.query_rag import _prompt_template
+    from utils.vector_snapshot import load_snapshot
+
+    _prompt_template()
+    _encoding(CONTEXT_MODEL)
+    snapshot = load_snapshot()     # np.load(mmap_mode="r"): pages shared by every worker
+
+    info = {
+        "seconds": round(time.perf_counter() - t0, 2),
+        "snapshot_rows": len(snapshot) if snapshot is not None else 0,
+    }
+    print(f"📦 Preloaded shared state in {info['seconds']}s "
+          f"(snapshot rows: {info['snapshot_rows']})")
+    return info
+
+
+def after_fork() -> None:
+    from services.profile_service import _engine
+    from utils import query_log, warmup
+    from utils.get_embedding_function import _embeddings
+    from utils.llm_cache import prompt_cache
+    from utils.query_rag import _get_llm
+    from utils.vector_store import reset_client
+
+    # connections inherited from the master belong to the master
+    _engine.dispose(close=False)
+    prompt_cache._conn = None
+    query_log.reset_after_fork()
+    reset_client()
+    _embeddings.cache_clear()         # HTTP pools must not be shared across fork
+    _get_llm.cache_clear()
+
+    warmup.reset_after_fork()
+    warmup.start_warmup(force=True)
@@ -0,0 +1,156 @@
+"""
+quantization.py
+—————————————————————————————————
+Compact representations of chunk embeddings used for the first search pass.
+
+int8  – per-dimension symmetric scalar quantization (4x smaller than float32)
+pq    – product quantization: the vector is cut into `m` sub-vectors and each
+        one is replaced by the id of its nearest of 256 centroids
+        (1 byte per sub-vector, e.g. 1536 dims / m=96 -> 96 bytes, 64x smaller)
+
+Both return approximate squared-L2 distances; callers rescore the best
+candidates against the full-precision vectors (see VectorSnapshot).
+"""
+
+from typing import Optional
+
+import numpy as np
+
+BLOCK_ROWS = 8192   # rows decoded at a time, bounds temporary memory
+
+
+# 1.  int8 scalar quantization
+
+class Int8Quantizer:
+    """x ≈ codes * scale, with codes in [-127, 127] and one scale per dimension."""
+
+    def __init__(self, scale: np.ndarray):
+        self.scale = np.asarray(scale, dtype=np.float32)
+
+    @classmethod
+    def fit(cls, vectors: np.ndarray) -> "Int8Quantizer":
+        peak = np.abs(vectors).max(axis=0) if len(vectors) else np.ones(vectors.shape[1])
+        return cls(np.where(peak > 0, peak / 127.0, 1.0))
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.rint(vectors / self.scale)
+        return np.clip(codes, -127, 127).astype(np.int8)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return codes.astype(np.float32) * self.scale
+
+    def sq_norms(self, codes: np.ndarray) -> np.ndarray:
+        """Squared norm of every reconstructed row (stored next to the codes)."""
+        out = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), BLOCK_ROWS):
+            rec = self.decode(codes[start:start + BLOCK_ROWS])
+            out[start:start + len(rec)] = np.einsum("ij,ij->i", rec, rec)
+        return out
+
+    def distances(
+        self,
+        codes: np.ndarray,
+        sq_norms: np.ndarray,
+        query: np.ndarray,
+    ) -> np.ndarray:
+        """Approximate squared L2 from `query` to every coded row."""
+        # codes·(scale*q) == decode(codes)·q, without materialising decode()
+        scaled_q = (query * self.scale).astype(np.float32)
+        dots = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), BLOCK_ROWS):
+            block = codes[start:start + BLOCK_ROWS]
+            dots[start:start + len(block)] = block.astype(np.float32) @ scaled_q
+        return sq_norms - 2.0 * dots + float(query @ query)
+
+
+# 2.  Product quantization
+
+def _kmeans(x: np.ndarray, k: int, iters: int, rng: np.random.Generator) -> np.ndarray:
+    k = min(k, len(x))
+    centroids = x[rng.choice(len(x), size=k, replace=False)].copy()
+    for _ in range(iters):
+        d = (
+            np.einsum("ij,ij->i", x, x)[:, None]
+            - 2.0 * x @ centroids.T
+            + np.einsum("ij,ij->i", centroids, centroids)[None, :]
+        )
+        assign = d.argmin(axis=1)
+        for c in range(k):
+            members = x[assign == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+    return centroids
+
+
+class ProductQuantizer:
+    """`m` sub-spaces × up to 256 centroids each; codes are uint8 [n, m]."""
+
+    def __init__(self, codebooks: np.ndarray):
+        # codebooks: [m, ksub, dsub]
+        self.codebooks = np.asarray(codebooks, dtype=np.float32)
+        self.m, self.ksub, self.dsub = self.codebooks.shape
+
+    @classmethod
+    def fit(
+        cls,
+        vectors: np.ndarray,
+        m: int,
+        ksub: int = 256,
+        iters: int = 15,
+        sample: int = 20000,
+        seed: int = 0,
+    ) -> "ProductQuantizer":
+        n, dim = vectors.shape
+        if dim % m:
+            raise ValueError(f"dimension {dim} is not divisible by m={m}")
+        rng = np.random.default_rng(seed)
+        train = vectors[rng.choice(n, size=min(n, sample), replace=False)]
+        train = np.asarray(train, dtype=np.float32)
+        dsub = dim // m
+        ksub = min(ksub, len(train))
+
+        books = np.zeros((m, ksub, dsub), dtype=np.float32)
+        for j in range(m):
+            books[j] = _kmeans(train[:, j * dsub:(j + 1) * dsub], ksub, iters, rng)
+        return cls(books)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.empty((len(vectors), self.m), dtype=np.uint8)
+        c_norms = np.einsum("mkd,mkd->mk", self.codebooks, self.codebooks)
+        for start in range(0, len(vectors), BLOCK_ROWS):
+            block = np.asarray(vectors[start:start + BLOCK_ROWS], dtype=np.float32)
+            for j in range(self.m):
+                sub = block[:, j * self.dsub:(j + 1) * self.dsub]
+                d = c_norms[j][None, :] - 2.0 * sub @ self.codebooks[j].T
+                codes[start:start + len(block), j] = d.argmin(axis=1)
+        return codes
+
+    def distances(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """Asymmetric distance: exact query vs. quantized rows, via lookup tables."""
+        q = query.reshape(self.m, 1, self.dsub)
+        tables = ((self.codebooks - q) ** 2).sum(axis=2)      # [m, ksub]
+        out = np.zeros(len(codes), dtype=np.float32)
+        for j in range(self.m):
+            out += tables[j][codes[:, j]]
+        return out
+
+
+# 3.  Shared helpers
+
+def top_candidates(approx: np.ndarray, n: int) -> np.ndarray:
+    """Indices of the `n` smallest approximate distances (unordered)."""
+    n = min(n, approx.shape[0])
+    if n <= 0:
+        return np.zeros(0, dtype=np.int64)
+    return np.argpartition(approx, n - 1)[:n]
+
+
+def memory_bytes(n: int, dim: int, mode: str, pq_m: Optional[int] = None) -> int:
+    """Bytes needed to hold `n` vectors in the given representation."""
+    if mode == "float32":
+        return n * dim * 4
+    if mode == "int8":
+        return n * dim + dim * 4 + n * 4          # codes + scales + norms
+    if mode == "pq":
+        return n * pq_m + 256 * dim * 4           # codes + codebooks
+    raise ValueError(f"unknown mode: {mode}")
@@ -0,0 +1,123 @@
+"""
+query_log.py
+—————————————————————————————————
+Opt-in (QUERY_LOG=1) rolling log of answered questions, in SQLite shared
+by all workers, so a freshly started process can warm its caches with what
+users actually ask (see utils/warmup.py).
+
+It stores raw question text and user ids, so it is off by default. When
+on, entries older than QUERY_LOG_RETENTION_HOURS are deleted and at most
+QUERY_LOG_KEEP are kept. `record` only puts the entry on a queue; a
+background thread does the SQLite writes, so requests never wait on disk.
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import List, Tuple
+
+QUERY_LOG = os.getenv("QUERY_LOG", "0") == "1"
+QUERY_LOG_PATH = os.getenv("QUERY_LOG_PATH", "query_log.db")
+QUERY_LOG_KEEP = int(os.getenv("QUERY_LOG_KEEP", "10000"))
+QUERY_LOG_RETENTION_HOURS = float(os.getenv("QUERY_LOG_RETENTION_HOURS", "48"))
+PRUNE_EVERY = 500
+MAX_PENDING = 10000          # drop entries rather than grow without bound
+
+_lock = threading.Lock()
+_conn = None
+_writes = 0
+_pending: "queue.Queue" = queue.Queue(MAX_PENDING)
+_writer = None
+
+
+def _db() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        conn = sqlite3.connect(QUERY_LOG_PATH, timeout=5, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS queries (
+                   id INTEGER PRIMARY KEY AUTOINCREMENT,
+                   query TEXT NOT NULL,
+                   user_id TEXT NOT NULL,
+                   ts REAL NOT NULL)"""
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_queries_ts ON queries(ts)")
+        _conn = conn
+    return _conn
+
+
+def _write(rows: List[tuple]) -> None:
+    global _writes
+    with _lock:
+        db = _db()
+        db.executemany("INSERT INTO queries (query, user_id, ts) VALUES (?, ?, ?)", rows)
+        before = _writes
+        _writes += len(rows)
+        if _writes // PRUNE_EVERY != before // PRUNE_EVERY:
+            db.execute("DELETE FROM queries WHERE ts < ?",
+                       (time.time() - QUERY_LOG_RETENTION_HOURS * 3600,))
+            db.execute(
+                "DELETE FROM queries WHERE id <= (SELECT MAX(id) FROM queries) - ?",
+                (QUERY_LOG_KEEP,),
+            )
+        db.commit()
+
+
+def _drain() -> None:
+    while True:
+        rows = [_pending.get()]
+        while len(rows) < 500:
+            try:
+                rows.append(_pending.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            _write(rows)
+        except sqlite3.Error as exc:
+            print(f"⚠️  query log write failed: {exc}")
+
+
+def _ensure_writer() -> None:
+    global _writer
+    if _writer is None:
+        with _lock:
+            if _writer is None:
+                _writer = threading.Thread(target=_drain, name="query-log", daemon=True)
+                _writer.start()
+
+
+def record(query: str, user_id: str) -> None:
+    """Queue one question (no-op unless QUERY_LOG=1); never blocks or fails a request."""
+    if not QUERY_LOG:
+        return
+    _ensure_writer()
+    try:
+        _pending.put_nowait((query, user_id, time.time()))
+    except queue.Full:
+        pass
+
+
+def frequent(limit: int = 20, window_hours: float = 24) -> List[Tuple[str, str, int]]:
+    """Most asked (query, user_id, count) in the last `window_hours` ([] when the log is off)."""
+    if not QUERY_LOG:
+        return []
+    since = time.time() - min(window_hours, QUERY_LOG_RETENTION_HOURS) * 3600
+    with _lock:
+        return _db().execute(
+            """SELECT query, user_id, COUNT(*) AS n FROM queries
+               WHERE ts >= ? GROUP BY query, user_id
+               ORDER BY n DESC, MAX(ts) DESC LIMIT ?""",
+            (since, limit),
+        ).fetchall()
+
+
+def reset_after_fork() -> None:
+    """The parent's connection and writer thread do not exist in a forked child."""
+    global _conn, _writer, _lock, _pending
+    _conn, _writer = None, None
+    _lock = threading.Lock()
+    _pending = queue.Queue(MAX_PENDING)
@@ -95,21 +95,53 @@ Returns the generated answer
 
 
 #personlize QA
-from typing import List
+from typing import Dict, List, Optional, Sequence, Tuple
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import os
+import time
 
-from langchain_chroma import Chroma
-from langchain.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
+from functools import lru_cache
 from dotenv import load_dotenv
 
-from services.profile_service import get as get_profile
+from services.profile_service import get as get_profile, get_many as get_profiles
+from services.profile_cache import TTLCache
 from services.personalized_ranking import rank as rank_chunks
-from utils.get_embedding_function import get_embedding_function
+from utils.get_embedding_function import (
+    EMBEDDING_MODEL,
+    get_embedding_dimensions,
+    get_embedding_function,
+)
+from utils import query_log
+from utils.retrieval import (
+    FIRST_PASS_K,
+    RETRIEVAL_MODE,
+    retrieve,
+    retrieve_adaptive,
+    retrieve_two_stage,
+    retrieve_many,
+    trim_to_dominant,
+)
+from utils.context_packer import PackedContext, pack_context
+from utils.mmr import default_lambda, diversify
+from utils.singleflight import SingleFlight, normalize_query
+from utils.admission import BATCH, INTERACTIVE, Overloaded, llm_admission
+from utils.llm_cache import CachedChatModel, get_chat_model
+from utils import metrics
+from utils.vector_store import corpus_version
 
 load_dotenv()
 CHROMA_PATH = "chroma"
+LLM_MODEL = "gpt-3.5-turbo"
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "4"))
+CONTEXT_CHUNKS = 6       # chunks handed to the packer (rank's top_k)
+
+# identical questions in flight at the same time share one pipeline run
+_inflight = SingleFlight()
+
+# question text -> embedding; filled by queries and by the startup warm-up
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "2000"))
+query_embedding_cache = TTLCache(QUERY_EMBEDDING_CACHE_SIZE, ttl=24 * 3600)
 
 BASE_TEMPLATE = """
 {system_message}
@@ -124,9 +156,16 @@ Answer the question **only** using the following context:
 """.strip()
 
 # Builds the final prompt using the user's role & interests from their profile.
+@lru_cache(maxsize=1)
+def _prompt_template():
+    from langchain_core.prompts import ChatPromptTemplate
+
+    return ChatPromptTemplate.from_template(BASE_TEMPLATE)
+
+
 def _build_prompt(
     profile_role: str,
-    profile_interests: List[str],
+    profile_interests: Sequence[str],
     context: str,
     question: str,
 ) -> str:
@@ -135,15 +174,140 @@ def _build_prompt(
         f"The user is a {profile_role} interested in {', '.join(profile_interests) or 'varied topics'}. "
         "Frame the answer accordingly."
     )
-    prompt_template = ChatPromptTemplate.from_template(BASE_TEMPLATE)
-    return prompt_template.format(
+    return _prompt_template().format(
         system_message=sys_msg, context=context, question=question
     )
 
 
-def query_rag(query_text: str, user_id: str) -> dict:
+def _error(message: str) -> dict:
+    return {
+        "success": False,
+        "message": message,
+        "response": "",
+        "sources": [],
+    }
+
+
+def _embedding_key(text: str) -> tuple:
+    return (EMBEDDING_MODEL, get_embedding_dimensions(), text)
+
+
+def _embed_query(embedding_fn, query_text: str) -> List[float]:
+    key = _embedding_key(query_text)
+    vec = query_embedding_cache.get(key)
+    if vec is None:
+        vec = embedding_fn.embed_query(query_text)
+        query_embedding_cache.put(key, vec)
+    return vec
+
+
+def prime_query_embeddings(queries: List[str]) -> List[List[float]]:
+    """Embed `queries` in one call (cached ones skipped) and cache them."""
+    missing = [
+        q for q in dict.fromkeys(queries)
+        if query_embedding_cache.get(_embedding_key(q)) is None
+    ]
+    vectors = dict(zip(missing, get_embedding_function().embed_documents(missing))) if missing else {}
+    for q, vec in vectors.items():
+        query_embedding_cache.put(_embedding_key(q), vec)
+    return [vectors.get(q) or query_embedding_cache.get(_embedding_key(q)) for q in queries]
+
+
+def _overloaded(exc: Overloaded) -> dict:
+    # picked up by app.py to answer 429/503 with a Retry-After header
+    return {**_error(f"Server busy: {exc}"), "status": exc.status, "retry_after": exc.retry_after}
+
+
+@lru_cache(maxsize=1)
+def _get_llm() -> CachedChatModel:
+    # temperature 0 → identical prompts are answered from the on-disk cache
+    # built once per process (warm-up builds it), not per request
+    return get_chat_model(LLM_MODEL, temperature=0.0)
+
+
+# Steps 2–3 shared by the single and batch paths: re-rank, pack context, build prompt.
+def _prepare_prompt(
+    query_text: str,
+    profile,
+    raw_results,
+    token_budget: Optional[int],
+    retrieval_info: Optional[dict] = None,
+    mmr_lambda: Optional[float] = None,
+) -> Tuple[str, PackedContext]:
+    # 2) personalized re-ranking
+    #  Uses a custom logic (in rank_chunks) to re-rank based on user preferences.
+    # More personalized than just cosine similarity.
+    if mmr_lambda is not None and mmr_lambda < 1.0:
+        # score every candidate, then let MMR skip near-duplicates of picked chunks
+        scored = rank_chunks(raw_results, profile, top_k=len(raw_results))
+        top_ranked = diversify(scored, CONTEXT_CHUNKS, mmr_lambda)
+    else:
+        top_ranked = rank_chunks(raw_results, profile, top_k=CONTEXT_CHUNKS)
+    ranked_count = len(top_ranked)
+    if RETRIEVAL_MODE == "adaptive":
+        # a clearly dominant head does not need the weaker chunks as padding
+        top_ranked = trim_to_dominant(top_ranked, raw_results)
+
+    # Merges the content of top documents into a single context for the prompt,
+    # joining adjacent chunks, stripping overlap/duplicates and fitting the budget.
+    packed = pack_context(top_ranked, token_budget)
+    packed.stats.update(
+        retrieval_mode=RETRIEVAL_MODE,
+        candidates=len(raw_results),
+        chunks_trimmed=ranked_count - len(top_ranked),
+        mmr_lambda=mmr_lambda,
+        **(retrieval_info or {}),
+    )
+
+    # 3) prompt
+    prompt = _build_prompt(
+        profile.role, profile.interests, packed.text, query_text
+    )
+    return prompt, packed
+
+
+# 4) call LLM – cached answers return straight away; real calls only run once
+# admitted (see utils/admission.py), so bursts queue or get shed here instead
+# of hitting the provider's rate limit.
+def _generate(
+    llm: CachedChatModel, prompt: str, priority: int = INTERACTIVE
+) -> Tuple[str, dict]:
+    """Returns (answer text, token usage); usage is {} on a cache hit."""
+    resp = llm.lookup(prompt)
+    if resp is None:
+        with llm_admission.slot(priority):
+            t0 = time.perf_counter()
+            resp = llm.invoke_uncached(prompt)
+            metrics.observe("llm.call_ms", (time.perf_counter() - t0) * 1000)
+    usage = (getattr(resp, "response_metadata", None) or {}).get("token_usage") or {}
+    return (resp.content if hasattr(resp, "content") else str(resp)), usage
+
+
+def _answer(answer: str, packed: PackedContext, usage: dict) -> dict:
+    # Document IDs (or "Unknown") of the chunks that made it into the context.
+    sources = packed.sources
+    return {
+        "success": True,
+        "response": answer,
+        "sources": sources,
+        "num_sources": len(sources),
+        "context": packed.stats,
+        "token_usage": usage,
+        "timestamp": datetime.utcnow().isoformat(),
+    }
+
+
+def query_rag(
+    query_text: str,
+    user_id: str,
+    token_budget: Optional[int] = None,
+    mmr_lambda: Optional[float] = None,
+) -> dict:
     """
     Main entry point for Flask `/api/query`.
+    `token_budget` caps the context tokens (defaults to CONTEXT_TOKEN_BUDGET).
+    `mmr_lambda` (0–1) diversifies the context chunks (defaults to MMR_LAMBDA,
+    unset = off).
     """
     try:
 
@@ -151,79 +315,180 @@ def query_rag(query_text: str, user_id: str) -> dict:
         # Includes their role and interests.
         profile = get_profile(user_id) 
         if not profile:
-            return {
-                "success": False,
-                "message": f"No profile found for user_id={user_id}.",
-                "response": "",
-                "sources": [],
-            }
-
-        # 1) retrieval
-        embedding_fn = get_embedding_function()
-        db = Chroma(
-            persist_directory=CHROMA_PATH, embedding_function=embedding_fn
+            return _error(f"No profile found for user_id={user_id}.")
+        query_log.record(query_text, user_id)        # feeds the startup warm-up
+        return answer_for_profile(query_text, profile, token_budget, mmr_lambda)
+
+    except Exception as exc:
+        return _error(f"query_rag error: {exc}")
+
+
+def answer_for_profile(
+    query_text: str,
+    profile,
+    token_budget: Optional[int] = None,
+    mmr_lambda: Optional[float] = None,
+) -> dict:
+    """
+    `query_rag` for a UserProfile that need not be stored (used by the eval
+    harness to answer as an arbitrary role / interest set).
+    """
+    try:
+        if mmr_lambda is None:
+            mmr_lambda = default_lambda()
+
+        # Everything below depends only on this key, so concurrent identical
+        # requests wait for one run and all receive its result.
+        key = (
+            normalize_query(query_text),
+            profile.role,
+            tuple(sorted(profile.interests)),
+            token_budget,
+            mmr_lambda,
+            corpus_version(),
         )
-        # Define Chroma filter
-        chroma_filter = {
-            "$or": [
-                {"audience": {"$eq": profile.role}},
-                {"topics": {"$in": profile.interests}},
-            ]
-        }
-
-        # first pass – wider net
-        # Retrieves top 20 similar documents based on embeddings and the filter.
-        raw_results = db.similarity_search_with_score(
-            query_text, k=20, filter=chroma_filter
-        )  #  Returns a list of tuples: (Document, similarity_score).
-
-        if not raw_results:
-            return {
-                "success": False,
-                "message": "No relevant documents found.",
-                "response": "",
-                "sources": [],
-            }
-
-        # 2) personalized re-ranking
-        #  Uses a custom logic (in rank_chunks) to re-rank based on user preferences.
-        # More personalized than just cosine similarity.
-        top_ranked = rank_chunks(raw_results, profile)
-        
-        # Merges the content of top documents into a single context for the prompt.
-        context_text = "\n\n---\n\n".join(
-            [doc.page_content for doc, _ in top_ranked]
+        result, shared = _inflight.do(
+            key, lambda: _run_pipeline(query_text, profile, token_budget, mmr_lambda)
         )
+        return {**result, "coalesced": True} if shared else result
 
-        # 3) prompt
-        prompt = _build_prompt(
-            profile.role, profile.interests, context_text, query_text
-        )
+    except Overloaded as exc:
+        return _overloaded(exc)
+    except Exception as exc:
+        return _error(f"query_rag error: {exc}")
+
+
+def _run_pipeline(
+    query_text: str,
+    profile,
+    token_budget: Optional[int],
+    mmr_lambda: Optional[float] = None,
+) -> dict:
+    # 1) retrieval
+    # first pass – wider net
+    # Retrieves top 20 candidates from the snapshot, the profile's partitions
+    # or the filtered collection (see utils/retrieval.py).
+    # (RETRIEVAL_MODE=adaptive: start smaller, widen only when scores are flat;
+    #  RETRIEVAL_MODE=two_stage: closest PDFs first, then only their chunks)
+    embedding_fn = get_embedding_function()
+    query_vec = _embed_query(embedding_fn, query_text)
+    info = None
+    if RETRIEVAL_MODE == "adaptive":
+        raw_results, info = retrieve_adaptive(query_vec, profile, embedding_fn)
+    elif RETRIEVAL_MODE == "two_stage":
+        raw_results, info = retrieve_two_stage(query_vec, profile, embedding_fn, k=FIRST_PASS_K)
+    else:
+        raw_results = retrieve(query_vec, profile, embedding_fn, k=FIRST_PASS_K)
+    #  Returns a list of tuples: (Document, distance).
+
+    if not raw_results:
+        return _error("No relevant documents found.")
+
+    prompt, packed = _prepare_prompt(
+        query_text, profile, raw_results, token_budget, info, mmr_lambda
+    )
+    answer, usage = _generate(_get_llm(), prompt)
+    return _answer(answer, packed, usage)
 
-        # 4) call LLM
-        llm = ChatOpenAI(
-            model="gpt-3.5-turbo",
-            temperature=0.0,
-            openai_api_key=os.getenv("OPENAI_API_KEY"),
-        )
-        resp = llm.invoke(prompt)
-        answer = resp.content if hasattr(resp, "content") else str(resp)
-        
-        # Gathers the document IDs (or "Unknown") from metadata to show sources used.
-        sources = [doc.metadata.get("id", "Unknown") for doc, _ in top_ranked]
 
-        return {
-            "success": True,
-            "response": answer,
-            "sources": sources,
-            "num_sources": len(sources),
-            "timestamp": datetime.utcnow().isoformat(),
-        }
+def coalescing_stats() -> dict:
+    return _inflight.stats()
 
-    except Exception as exc:
-        return {
-            "success": False,
-            "message": f"query_rag error: {exc}",
-            "response": "",
-            "sources": [],
-        }
+
+def query_rag_batch(
+    items: List[dict],
+    max_concurrency: Optional[int] = None,
+    token_budget: Optional[int] = None,
+    mmr_lambda: Optional[float] = None,
+) -> dict:
+    """
+    Entry point for `/api/query/batch`. `items` is [{"query": ..., "user_id": ...}].
+
+    Profiles are loaded in one query, all questions are embedded in a single
+    embedding call, candidates for users with the same role/interests are
+    fetched in one Chroma query, and the LLM calls run concurrently (at most
+    `max_concurrency` at a time, queued behind interactive queries).
+    Results come back in input order.
+    """
+    t_start = time.perf_counter()
+    if mmr_lambda is None:
+        mmr_lambda = default_lambda()
+    results: List[Optional[dict]] = [None] * len(items)
+    timings: Dict[str, float] = {}
+
+    profiles = get_profiles(it["user_id"] for it in items if it.get("user_id"))
+    todo = []
+    for idx, it in enumerate(items):
+        query_text = (it.get("query") or "").strip()
+        profile = profiles.get(it.get("user_id"))
+        if not query_text:
+            results[idx] = _error("Query cannot be empty")
+        elif profile is None:
+            results[idx] = _error(f"No profile found for user_id={it.get('user_id')}.")
+        else:
+            todo.append((idx, query_text, profile))
+
+    if todo:
+        # 1) one embedding call for every distinct question
+        t0 = time.perf_counter()
+        embedding_fn = get_embedding_function()
+        distinct = list(dict.fromkeys(q for _, q, _ in todo))
+        vectors = dict(zip(distinct, embedding_fn.embed_documents(distinct)))
+        timings["embed_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
+        # 1b) retrieval, grouped by filter
+        t0 = time.perf_counter()
+        raw = retrieve_many(
+            [vectors[q] for _, q, _ in todo],
+            [p for _, _, p in todo],
+            embedding_fn,
+            k=FIRST_PASS_K,
+        )
+        timings["retrieval_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
+        # 2–3) rank + pack + prompt
+        t0 = time.perf_counter()
+        prompts = []
+        for (idx, query_text, profile), raw_results in zip(todo, raw):
+            if not raw_results:
+                results[idx] = _error("No relevant documents found.")
+                continue
+            prompts.append((idx, *_prepare_prompt(
+                query_text, profile, raw_results, token_budget, mmr_lambda=mmr_lambda
+            )))
+        timings["rank_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
+        # 4) concurrent LLM calls
+        t0 = time.perf_counter()
+        llm = _get_llm()
+
+        def _run(job):
+            idx, prompt, packed = job
+            t_llm = time.perf_counter()
+            try:
+                answer, usage = _generate(llm, prompt, BATCH)
+                res = _answer(answer, packed, usage)
+            except Overloaded as exc:
+                res = _overloaded(exc)
+            except Exception as exc:
+                res = _error(f"query_rag error: {exc}")
+            res["llm_ms"] = round((time.perf_counter() - t_llm) * 1000, 1)
+            return idx, res
+
+        workers = max(1, min(max_concurrency or BATCH_LLM_CONCURRENCY, len(prompts) or 1))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for idx, res in pool.map(_run, prompts):
+                results[idx] = res
+        timings["llm_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
+    timings["total_ms"] = round((time.perf_counter() - t_start) * 1000, 1)
+    for it, res in zip(items, results):
+        res["query"] = it.get("query")
+        res["user_id"] = it.get("user_id")
+    return {
+        "success": True,
+        "count": len(items),
+        "succeeded": sum(1 for r in results if r["success"]),
+        "results": results,
+        "timings": timings,
+    }
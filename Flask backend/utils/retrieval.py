@@ -0,0 +1,397 @@
+"""
+retrieval.py
+—————————————————————————————————
+First-pass candidate retrieval for `query_rag`.
+
+The query is embedded once, then searched in the cheapest place available:
+
+1. the memory-mapped vector snapshot, if one has been exported
+2. the role / topic partitions matching the user's profile
+   (VECTOR_PARTITIONS), merged by chunk id
+3. the whole collection with a metadata `$or` filter – with
+   VECTOR_SHARDS > 1 every shard at once (`search_shards`)
+
+The first one available wins: while a snapshot exists the partitions are
+not searched. Partitions are only used when they cover every arm of
+`profile_filter`, i.e. "role,topic" for a profile with interests; with
+VECTOR_PARTITIONS=role such a profile takes the filtered scan, so chunks
+matching only an interest are not lost.
+
+All paths return [(Document, distance)] with Chroma's semantics
+(lower = more similar), ready for `rank_chunks`.
+
+Scatter-gather (VECTOR_SHARDS > 1)
+----------------------------------
+`search_shards` sends the same top-k query to every shard on a shared
+thread pool and merges whatever came back by distance. Each shard gets
+SHARD_TIMEOUT seconds from the moment a pool thread starts its search, so
+time spent queued behind other requests does not count against it; a
+shard still queued SHARD_TIMEOUT after the scatter began is given up too.
+The pool has a thread per shard for every request thread (GUNICORN_THREADS
+× VECTOR_SHARDS), so that queue is normally empty. A shard that is slow or
+errors is left out of that answer rather than failing it; only all shards
+failing is an error. Per-shard latency is in /api/metrics as
+`retrieval.shard<i>.ms`, and every answer missing a shard is counted in
+`retrieval.partial_results` and logged.
+
+Two-stage (RETRIEVAL_MODE=two_stage)
+------------------------------------
+`retrieve_two_stage` first picks the TWO_STAGE_DOCS closest PDFs from the
+document index (utils/document_index.py, one centroid per PDF), then
+searches only their chunks, and only the shards holding them. If the
+index is not built, or the profile filter leaves too little of those
+PDFs, it falls back to the plain `retrieve`.
+
+Adaptive depth (RETRIEVAL_MODE=adaptive)
+----------------------------------------
+Instead of always fetching FIRST_PASS_K candidates, `retrieve_adaptive`
+starts at ADAPTIVE_K_START and doubles k (up to ADAPTIVE_K_MAX) only while
+the distances are flat (spread < ADAPTIVE_FLAT_SPREAD, i.e. nothing stands
+out yet). If the profile filter matches fewer chunks than the context
+needs, it is topped up from the unfiltered search. After ranking,
+`trim_to_dominant` drops chunks far less similar than the best one
+(ADAPTIVE_TRIM_MARGIN) so a clear winner is not padded with noise.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+from models.user_profile import UserProfile
+from services.personalized_ranking import distance_to_similarity
+from utils import metrics
+from utils.vector_snapshot import load_snapshot
+from utils.document_index import TWO_STAGE_DOCS, top_documents
+from utils.vector_store import (
+    VECTOR_PARTITIONS,
+    VECTOR_SHARDS,
+    get_db,
+    get_partition,
+    get_shards,
+    shard_of,
+)
+
+FIRST_PASS_K = 20
+
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "fixed")          # fixed | adaptive | two_stage
+ADAPTIVE_K_START = int(os.getenv("ADAPTIVE_K_START", "8"))
+ADAPTIVE_K_MAX = int(os.getenv("ADAPTIVE_K_MAX", "40"))
+ADAPTIVE_FLAT_SPREAD = float(os.getenv("ADAPTIVE_FLAT_SPREAD", "0.05"))   # distance units
+ADAPTIVE_TRIM_MARGIN = float(os.getenv("ADAPTIVE_TRIM_MARGIN", "0.1"))    # cosine similarity
+MIN_CONTEXT_CHUNKS = 2
+
+SHARD_TIMEOUT = float(os.getenv("SHARD_TIMEOUT", "2"))          # seconds per scatter
+# one thread per shard for each concurrent request (gunicorn.conf.py: GUNICORN_THREADS)
+SHARD_SEARCH_THREADS = int(os.getenv(
+    "SHARD_SEARCH_THREADS",
+    str(max(4, int(os.getenv("GUNICORN_THREADS", "8")) * VECTOR_SHARDS)),
+))
+
+
+def profile_filter(profile: UserProfile) -> dict:
+    """Chroma `where` clause restricting chunks to the user's role or interests."""
+    role_clause = {"audience": {"$eq": profile.role}}
+    if not profile.interests:
+        return role_clause        # Chroma rejects an empty $in list
+    return {
+        "$or": [
+            role_clause,
+            {"topics": {"$in": list(profile.interests)}},
+        ]
+    }
+
+
+def partitions_for(profile: UserProfile) -> List[Tuple[str, str]]:
+    """
+    (kind, value) of every partition relevant to the profile, or [] when the
+    configured kinds do not cover all of `profile_filter` (role and, if the
+    profile has interests, topic).
+    """
+    if "role" not in VECTOR_PARTITIONS:
+        return []
+    if profile.interests and "topic" not in VECTOR_PARTITIONS:
+        return []
+    return [("role", profile.role)] + [("topic", t) for t in profile.interests]
+
+
+def _key(doc: Document) -> str:
+    return doc.metadata.get("id") or doc.page_content
+
+
+def merge_results(
+    result_lists: Sequence[List[Tuple[Document, float]]],
+    k: int,
+) -> List[Tuple[Document, float]]:
+    """Union several result lists, keeping each chunk's best distance, top `k`."""
+    best: Dict[str, Tuple[Document, float]] = {}
+    for results in result_lists:
+        for doc, dist in results:
+            key = _key(doc)
+            if key not in best or dist < best[key][1]:
+                best[key] = (doc, dist)
+    return sorted(best.values(), key=lambda tup: tup[1])[:k]
+
+
+def _search_partitions(
+    db,
+    query_vec: List[float],
+    profile: UserProfile,
+    k: int,
+) -> List[Tuple[Document, float]]:
+    results = []
+    for kind, value in partitions_for(profile):
+        part = get_partition(kind, value, db)
+        results.append(part.similarity_search_by_vector_with_relevance_scores(query_vec, k=k))
+    return merge_results(results, k)
+
+
+# ---------- Shards ---------- #
+_shard_pool: Optional[ThreadPoolExecutor] = None
+_shard_pool_lock = threading.Lock()
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _shard_pool
+    with _shard_pool_lock:
+        if _shard_pool is None:
+            _shard_pool = ThreadPoolExecutor(SHARD_SEARCH_THREADS, thread_name_prefix="shard")
+        return _shard_pool
+
+
+def _search_one_shard(index: int, shard, query_vec, k: int, chroma_filter, started: dict):
+    started[index] = time.monotonic()            # the shard's SHARD_TIMEOUT starts now
+    t0 = time.perf_counter()
+    try:
+        return shard.similarity_search_by_vector_with_relevance_scores(
+            query_vec, k=k, filter=chroma_filter
+        )
+    finally:
+        metrics.observe(f"retrieval.shard{index}.ms", (time.perf_counter() - t0) * 1000)
+
+
+def search_shards(
+    db,
+    query_vec: List[float],
+    k: int,
+    chroma_filter: Optional[dict] = None,
+    only: Optional[set] = None,
+) -> List[Tuple[Document, float]]:
+    """
+    Top-`k` over every shard of `db` (or the shard indices in `only`),
+    searched concurrently and merged by distance.
+    """
+    shards = [(i, shard) for i, shard in enumerate(get_shards(db)) if only is None or i in only]
+    if len(shards) == 1:
+        return shards[0][1].similarity_search_by_vector_with_relevance_scores(
+            query_vec, k=k, filter=chroma_filter
+        )
+
+    t0 = time.perf_counter()
+    scatter_start = time.monotonic()
+    started: Dict[int, float] = {}
+    futures = {
+        _pool().submit(_search_one_shard, i, shard, query_vec, k, chroma_filter, started): i
+        for i, shard in shards
+    }
+
+    def deadline(fut) -> float:
+        return started.get(futures[fut], scatter_start) + SHARD_TIMEOUT
+
+    pending = set(futures)
+    while pending:
+        now = time.monotonic()
+        live = {fut for fut in pending if deadline(fut) > now}
+        if not live:
+            break
+        done, _ = wait(live, timeout=min(deadline(f) for f in live) - now,
+                       return_when=FIRST_COMPLETED)
+        pending -= done
+    for fut in pending:
+        fut.cancel()                  # a late shard still finishes and records its latency
+
+    results, errors = [], []
+    for fut in futures:
+        if fut in pending:
+            continue
+        if fut.exception() is not None:
+            errors.append(fut.exception())
+        else:
+            results.append(fut.result())
+    queued = sum(1 for fut in pending if futures[fut] not in started)
+    metrics.incr("retrieval.shard_timeouts", len(pending) - queued)
+    metrics.incr("retrieval.shard_queue_timeouts", queued)
+    metrics.incr("retrieval.shard_errors", len(errors))
+    if not results and errors:
+        raise errors[0]
+    if pending or errors:
+        metrics.incr("retrieval.partial_results")
+        print(f"⚠️  Partial shard results: {len(results)}/{len(shards)} shards answered "
+              f"({len(pending) - queued} slow, {queued} still queued, {len(errors)} failed)")
+    metrics.observe("retrieval.scatter_ms", (time.perf_counter() - t0) * 1000)
+    return merge_results(results, k)
+
+
+def retrieve(
+    query_vec: List[float],
+    profile: UserProfile,
+    embedding_fn,
+    k: int = FIRST_PASS_K,
+) -> List[Tuple[Document, float]]:
+    """Top-`k` candidates for an already-embedded query."""
+    chroma_filter = profile_filter(profile)
+
+    # A memory-mapped snapshot (shared by all workers) is preferred when one
+    # has been exported; otherwise Chroma is opened directly.
+    snapshot = load_snapshot()
+    if snapshot is not None:
+        return snapshot.similarity_search_by_vector_with_score(
+            query_vec, k=k, filter=chroma_filter
+        )
+
+    db = get_db(embedding_function=embedding_fn)
+    if partitions_for(profile):
+        results = _search_partitions(db, query_vec, profile, k)
+        if results:
+            return results
+        # partitions not built yet (or empty) – fall back to the filtered scan
+
+    return search_shards(db, query_vec, k, chroma_filter)
+
+
+def retrieve_many(
+    query_vecs: List[List[float]],
+    profiles: List[UserProfile],
+    embedding_fn,
+    k: int = FIRST_PASS_K,
+) -> List[List[Tuple[Document, float]]]:
+    """
+    `retrieve` for a batch of already-embedded queries. Without a snapshot or
+    partitions, queries sharing the same profile filter go to Chroma as one
+    multi-vector query.
+    """
+    if load_snapshot() is not None or VECTOR_PARTITIONS or VECTOR_SHARDS > 1:
+        return [retrieve(v, p, embedding_fn, k) for v, p in zip(query_vecs, profiles)]
+
+    db = get_db(embedding_function=embedding_fn)
+    groups: Dict[tuple, List[int]] = {}
+    for i, p in enumerate(profiles):
+        groups.setdefault((p.role, tuple(p.interests)), []).append(i)
+
+    out: List[Optional[List[Tuple[Document, float]]]] = [None] * len(query_vecs)
+    for members in groups.values():
+        res = db._collection.query(
+            query_embeddings=[query_vecs[i] for i in members],
+            n_results=k,
+            where=profile_filter(profiles[members[0]]),
+            include=["documents", "metadatas", "distances"],
+        )
+        for j, i in enumerate(members):
+            out[i] = [
+                (Document(page_content=text or "", metadata=meta or {}), dist)
+                for text, meta, dist in zip(
+                    res["documents"][j], res["metadatas"][j], res["distances"][j]
+                )
+            ]
+    return out
+
+
+# ---------- Two-stage ---------- #
+def retrieve_two_stage(
+    query_vec: List[float],
+    profile: UserProfile,
+    embedding_fn,
+    k: int = FIRST_PASS_K,
+) -> Tuple[List[Tuple[Document, float]], dict]:
+    """
+    Documents first, then their chunks. Returns (results, info) like
+    `retrieve_adaptive`; info lists the PDFs searched.
+    """
+    db = get_db(embedding_function=embedding_fn)
+    sources = top_documents(db, query_vec, TWO_STAGE_DOCS)
+    results: List[Tuple[Document, float]] = []
+    if sources:
+        where = {"$and": [profile_filter(profile), {"source": {"$in": sources}}]}
+        snapshot = load_snapshot()
+        if snapshot is not None:
+            results = snapshot.similarity_search_by_vector_with_score(query_vec, k=k, filter=where)
+        else:
+            only = {shard_of(s) for s in sources} if VECTOR_SHARDS > 1 else None
+            results = search_shards(db, query_vec, k, where, only)
+
+    fallback = len(results) < MIN_CONTEXT_CHUNKS
+    if fallback:
+        # index not built, or the profile filter emptied these PDFs
+        results = retrieve(query_vec, profile, embedding_fn, k=k)
+    metrics.incr("retrieval.two_stage_fallback", int(fallback))
+    return results, {"documents": sources, "fallback": fallback}
+
+
+# ---------- Adaptive depth ---------- #
+def _search_unfiltered(query_vec, embedding_fn, k: int) -> List[Tuple[Document, float]]:
+    snapshot = load_snapshot()
+    if snapshot is not None:
+        return snapshot.similarity_search_by_vector_with_score(query_vec, k=k)
+    return search_shards(get_db(embedding_function=embedding_fn), query_vec, k)
+
+
+def retrieve_adaptive(
+    query_vec: List[float],
+    profile: UserProfile,
+    embedding_fn,
+    min_results: int = 6,
+) -> Tuple[List[Tuple[Document, float]], dict]:
+    """
+    `retrieve` with a data-dependent k. Returns (results, info) where info
+    records the final k, how often it widened and how many chunks were
+    topped up from outside the profile filter.
+    """
+    k, widened = max(ADAPTIVE_K_START, min_results), 0
+    while True:
+        results = retrieve(query_vec, profile, embedding_fn, k=k)
+        if len(results) < k or k >= ADAPTIVE_K_MAX:
+            break                      # filter exhausted, or as wide as allowed
+        if results[-1][1] - results[0][1] >= ADAPTIVE_FLAT_SPREAD:
+            break                      # the head already stands out
+        k = min(k * 2, ADAPTIVE_K_MAX)
+        widened += 1
+
+    topped_up = 0
+    if len(results) < min_results:
+        # the filter is too narrow for a useful context – fill from everything
+        seen = {_key(doc) for doc, _ in results}
+        for doc, dist in _search_unfiltered(query_vec, embedding_fn, min_results * 2):
+            if len(results) >= min_results:
+                break
+            if _key(doc) not in seen:
+                results.append((doc, dist))
+                topped_up += 1
+
+    metrics.observe("retrieval.k", k)
+    metrics.incr("retrieval.widened", widened)
+    metrics.incr("retrieval.topped_up", topped_up)
+    return results, {"k": k, "widened": widened, "topped_up": topped_up}
+
+
+def trim_to_dominant(
+    ranked: List[Tuple[Document, float]],
+    candidates: List[Tuple[Document, float]],
+) -> List[Tuple[Document, float]]:
+    """
+    Drop ranked chunks whose similarity is more than ADAPTIVE_TRIM_MARGIN
+    below the best one (keeping at least MIN_CONTEXT_CHUNKS), rank order kept.
+    """
+    dist = {_key(doc): d for doc, d in candidates}
+    sims = [distance_to_similarity(dist.get(_key(doc), 2.0)) for doc, _ in ranked]
+    if not sims:
+        return ranked
+    best = max(sims)
+    kept = [pair for pair, s in zip(ranked, sims) if best - s <= ADAPTIVE_TRIM_MARGIN]
+    if len(kept) < MIN_CONTEXT_CHUNKS:
+        kept = ranked[:MIN_CONTEXT_CHUNKS]
+    metrics.observe("retrieval.context_chunks", len(kept))
+    metrics.incr("retrieval.chunks_trimmed", len(ranked) - len(kept))
+    return kept
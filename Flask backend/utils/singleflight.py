@@ -0,0 +1,72 @@
+import re
+import threading
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+# Request coalescing ("single flight"): while a call for a key is running,
+# further callers with the same key wait for it and share its result instead
+# of starting their own. Nothing is cached once the call finishes.
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run `fn` once per concurrent `key`. Returns (result, shared) where
+        `shared` is True for callers that waited on someone else's run.
+        Exceptions from `fn` are re-raised in every waiting caller.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result, False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+            }
+
+
+def normalize_query(text: str) -> str:
+    """Case/whitespace-insensitive form of a question, used in coalescing keys."""
+    return re.sub(r"\s+", " ", text).strip().lower()
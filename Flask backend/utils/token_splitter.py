@@ -0,0 +1,143 @@
+"""
+token_splitter.py
+—————————————————————————————————
+Streaming, token-aware chunker for `split_documents` (SPLITTER=tokens).
+
+The character splitter (800 chars / 80 overlap) yields chunks anywhere
+from ~120 to ~300 tokens depending on the text. Here the budget is counted
+in the chat model's tokens (context_packer's tiktoken encoding):
+
+  • a page is cut into sentences inside paragraphs, as (start, end) spans
+    found with `pattern.finditer(text, pos, endpos)`; their tokens are
+    counted in one batch per page (tiktoken's encode_ordinary_batch)
+  • sentences are packed greedily up to CHUNK_TOKENS; a chunk is the page
+    slice from its first to its last sentence, original whitespace kept
+  • the next chunk starts with the trailing sentences worth at most
+    CHUNK_OVERLAP_TOKENS
+  • a sentence longer than the budget is packed word by word, and a word
+    longer than the budget (URLs, tables, base64) is cut into windows of
+    CHUNK_TOKENS encoded tokens
+
+`split_pages` is a generator: it chunks each page as it is pulled from the
+input iterable and keeps no state across pages. `populate_db` still holds
+the full page and chunk lists (load_documents / split_documents build
+lists, and add_to_chroma needs all chunks for id checks and near-dup), so
+ingestion memory is not bounded by this. Compare it with the character
+splitter with `python -m benchmarks.splitter_benchmark`.
+"""
+
+import itertools
+import os
+import re
+from typing import Iterable, Iterator, List, Tuple
+
+from langchain_core.documents import Document
+
+from utils.context_packer import CONTEXT_MODEL, _encoding
+
+SPLITTER = os.getenv("SPLITTER", "chars")                     # chars | tokens
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "200"))          # ~800 chars of English
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "20"))
+
+_PARAGRAPH = re.compile(r"\n\s*\n")
+# up to . ! ? (plus closing quotes/brackets) followed by whitespace; PDF line
+# wraps are not boundaries
+_SENTENCE = re.compile(r".*?(?:[.!?]+[\"')\]]*(?=\s|$)|$)", re.S)
+_WORD = re.compile(r"\s*(\S+)")          # counted with the space before it
+
+Span = Tuple[int, int, int]          # start, end, tokens
+
+
+def _counter():
+    enc = _encoding(CONTEXT_MODEL)
+    batch = getattr(enc, "encode_ordinary_batch", None)      # tiktoken: parallel, in Rust
+    if batch is not None:
+        return lambda texts: [len(t) for t in batch(texts)]
+    return lambda texts: [len(enc.encode(t)) for t in texts]
+
+
+def _sentence_spans(text: str) -> Iterator[Tuple[int, int, int]]:
+    """(count_from, start, end): the count includes the whitespace before the sentence."""
+    pos = 0
+    paragraph_ends = [m.start() for m in _PARAGRAPH.finditer(text)] + [len(text)]
+    for end in paragraph_ends:
+        for m in _SENTENCE.finditer(text, pos, end):
+            c, e = m.span()
+            s = c
+            while s < e and text[s].isspace():
+                s += 1
+            if s < e:
+                yield c, s, e
+        pos = end
+
+
+def _token_windows(text: str, start: int, end: int, budget: int, count) -> List[Span]:
+    """Cut text[start:end] at every `budget`-th token; pieces are then recounted."""
+    enc = _encoding(CONTEXT_MODEL)
+    tokens = getattr(enc, "encode_ordinary", enc.encode)(text[start:end])
+    if hasattr(enc, "decode_with_offsets"):              # tiktoken: a token may end mid-character
+        offsets = enc.decode_with_offsets(tokens)[1]
+    else:
+        offsets = list(itertools.accumulate((len(enc.decode([t])) for t in tokens), initial=0))
+    cuts = sorted({start + offsets[i] for i in range(0, len(tokens), budget)} | {end})
+    pieces = [(a, b) for a, b in zip(cuts, cuts[1:]) if a < b]
+    return [(a, b, n) for (a, b), n in zip(pieces, count([text[a:b] for a, b in pieces]))]
+
+
+def _units(text: str, budget: int, count) -> List[Span]:
+    """Sentence spans of one page with token counts; over-long ones split into words."""
+    raw = list(_sentence_spans(text))
+    sizes = count([text[c:e] for c, _s, e in raw])
+    units: List[Span] = []
+    for (c, s, e), n in zip(raw, sizes):
+        if n <= budget:
+            units.append((s, e, n))
+            continue
+        words = list(_WORD.finditer(text, s, e))          # one huge "sentence"
+        for m, wn in zip(words, count([m.group() for m in words])):
+            if wn <= budget:
+                units.append((m.start(1), m.end(), wn))
+            else:
+                units.extend(_token_windows(text, m.start(1), m.end(), budget, count))
+    return units
+
+
+def split_text(
+    text: str,
+    chunk_tokens: int = CHUNK_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+) -> Iterator[Tuple[int, int, int]]:
+    """(start, end, tokens) of each chunk of `text`."""
+    count = _counter()
+    window: List[Span] = []
+    tokens = 0
+    emitted_end = -1
+    for unit in _units(text, chunk_tokens, count):
+        if window and tokens + unit[2] > chunk_tokens:
+            yield window[0][0], window[-1][1], tokens
+            emitted_end = window[-1][1]
+            # carry the tail sentences that fit in the overlap budget
+            carry: List[Span] = []
+            carried = 0
+            for u in reversed(window):
+                if carried + u[2] > overlap_tokens or carried + u[2] + unit[2] > chunk_tokens:
+                    break
+                carry.insert(0, u)
+                carried += u[2]
+            window, tokens = carry, carried
+        window.append(unit)
+        tokens += unit[2]
+    if window and window[-1][1] > emitted_end:
+        yield window[0][0], window[-1][1], tokens
+
+
+def split_pages(
+    pages: Iterable[Document],
+    chunk_tokens: int = CHUNK_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+) -> Iterator[Document]:
+    """Chunk each page as it arrives; chunks keep the page's metadata."""
+    for page in pages:
+        text = page.page_content
+        for start, end, _n in split_text(text, chunk_tokens, overlap_tokens):
+            yield Document(page_content=text[start:end], metadata=dict(page.metadata))
@@ -0,0 +1,632 @@
+"""
+vector_snapshot.py
+—————————————————————————————————
+Exports the Chroma collection (embeddings, ids, metadata, page text) into a
+versioned, read-only snapshot on disk and memory-maps it back for search.
+
+Every server worker that opens the same snapshot shares one page-cache copy
+of the vectors instead of loading its own, and opening it is just a few
+mmap() calls, so worker start-up is near-instant.
+
+Layout on disk:
+
+"snapshots/<collection>/      (one tree per collection, see vector_store)
+  CURRENT                 -> "v3"   (name of the live version)
+  v3/
+    manifest.json         version, count, dim, distance space, created_at
+    embeddings.npy        float32 [n, dim]
+    norms.npy             float32 [n]      squared L2 norm of each row
+    ids.bin / ids.offsets.npy               packed utf-8 ids
+    metadatas.bin / metadatas.offsets.npy   packed JSON metadata
+    documents.bin / documents.offsets.npy   packed utf-8 page_content
+    embeddings.int8.npy, int8.scale.npy, int8.norms.npy   int8 codes
+    pq.codes.npy, pq.codebooks.npy          product-quantized codes (optional)
+    index.<field>.rows.npy / index.<field>.values.json    metadata index
+
+The metadata index maps each value of the INDEXED_FIELDS (audience, topics,
+source) to the ascending rows holding it, so a `where` filter over those
+fields becomes a few np.union1d / np.intersect1d calls on memory-mapped
+arrays. Filters on other fields (or snapshots exported before the index
+existed) fall back to decoding the metadata and testing every row.
+
+With quantized codes present, search runs its first pass over the compact
+codes and rescores only the best `k * RESCORE_FACTOR` candidates against the
+float32 rows, so the full-precision matrix is paged in on demand rather than
+scanned.
+
+Scores returned by `VectorSnapshot.similarity_search_by_vector_with_score`
+follow Chroma's semantics (distance, lower = more similar), so results can
+be fed straight into `rank_chunks`.
+"""
+
+import functools
+import json
+import mmap
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from utils.quantization import Int8Quantizer, ProductQuantizer, top_candidates
+from utils.vector_store import collection_name, get_db, get_shards
+
+if TYPE_CHECKING:
+    from langchain_chroma import Chroma
+
+SNAPSHOT_PATH = "snapshots"
+SNAPSHOT_FORMAT = 2      # 2: metadata index
+KEEP_VERSIONS = 2        # older versions are pruned after a successful export
+EXPORT_BATCH = 1000
+RETIRE_GRACE = 30.0      # seconds a replaced snapshot stays mapped for in-flight searches
+
+# first-pass representation: "int8", "pq" or "none" (exact float32 scan)
+QUANTIZATION = os.getenv("SNAPSHOT_QUANTIZATION", "int8")
+PQ_SUBSPACES = int(os.getenv("SNAPSHOT_PQ_SUBSPACES", "96"))
+RESCORE_FACTOR = 4       # candidates rescored at full precision = k * factor
+INDEXED_FIELDS = ("audience", "topics", "source")    # what retrieval filters on
+
+
+# 1.  Packed string columns
+
+def _write_packed(path: str, values: List[bytes]) -> None:
+    offsets = np.zeros(len(values) + 1, dtype=np.int64)
+    with open(f"{path}.bin", "wb") as fh:
+        for i, val in enumerate(values):
+            fh.write(val)
+            offsets[i + 1] = offsets[i] + len(val)
+    np.save(f"{path}.offsets.npy", offsets)
+
+
+class _PackedColumn:
+    """Read-only view over a `.bin` blob + `.offsets.npy` pair."""
+
+    def __init__(self, path: str):
+        self._offsets = np.load(f"{path}.offsets.npy", mmap_mode="r")
+        self._fh = open(f"{path}.bin", "rb")
+        size = int(self._offsets[-1]) if len(self._offsets) else 0
+        # mmap() refuses empty files
+        self._buf = (
+            mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        )
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def raw(self, i: int) -> bytes:
+        return self._buf[int(self._offsets[i]):int(self._offsets[i + 1])]
+
+    def close(self) -> None:
+        if isinstance(self._buf, mmap.mmap):
+            self._buf.close()
+        self._fh.close()
+
+
+# 2.  Metadata filter (subset of Chroma's `where` syntax)
+
+def _match_value(value, cond) -> bool:
+    if not isinstance(cond, dict):
+        return value == cond
+    for op, arg in cond.items():
+        if op == "$eq" and not value == arg:
+            return False
+        if op == "$ne" and not value != arg:
+            return False
+        if op == "$in" and value not in arg:
+            return False
+        if op == "$nin" and value in arg:
+            return False
+        if op not in ("$eq", "$ne", "$in", "$nin"):
+            raise ValueError(f"Unsupported filter operator: {op}")
+    return True
+
+
+def matches_filter(meta: dict, where: Optional[dict]) -> bool:
+    """Evaluate a Chroma-style `where` clause against one metadata dict."""
+    if not where:
+        return True
+    for key, cond in where.items():
+        if key == "$and":
+            if not all(matches_filter(meta, sub) for sub in cond):
+                return False
+        elif key == "$or":
+            if not any(matches_filter(meta, sub) for sub in cond):
+                return False
+        elif key not in meta or not _match_value(meta[key], cond):
+            return False
+    return True
+
+
+class _FieldIndex:
+    """value -> ascending row indices for one metadata field (CSR layout)."""
+
+    def __init__(self, path: str, field: str):
+        self._rows = np.load(os.path.join(path, f"index.{field}.rows.npy"), mmap_mode="r")
+        with open(os.path.join(path, f"index.{field}.values.json"), encoding="utf-8") as fh:
+            self._spans = json.load(fh)          # json.dumps(value) -> [start, end]
+
+    def rows_of(self, value) -> np.ndarray:
+        start, end = self._spans.get(json.dumps(value), (0, 0))
+        return np.asarray(self._rows[start:end], dtype=np.int64)
+
+    def rows_in(self, values) -> np.ndarray:
+        return functools.reduce(np.union1d, (self.rows_of(v) for v in values),
+                                np.zeros(0, dtype=np.int64))
+
+    def present(self) -> np.ndarray:
+        """Rows that have the field at all."""
+        return np.sort(np.asarray(self._rows, dtype=np.int64))
+
+    def match(self, cond) -> Optional[np.ndarray]:
+        """Rows satisfying `cond` (see _match_value), None for an unsupported operator."""
+        if not isinstance(cond, dict):
+            cond = {"$eq": cond}
+        rows = None
+        for op, arg in cond.items():
+            if op == "$eq":
+                part = self.rows_of(arg)
+            elif op == "$in":
+                part = self.rows_in(arg)
+            elif op == "$ne":
+                part = np.setdiff1d(self.present(), self.rows_of(arg), assume_unique=True)
+            elif op == "$nin":
+                part = np.setdiff1d(self.present(), self.rows_in(arg), assume_unique=True)
+            else:
+                return None
+            rows = part if rows is None else np.intersect1d(rows, part, assume_unique=True)
+        return self.present() if rows is None else rows
+
+
+def _write_field_index(out_dir: str, field: str, postings: dict) -> None:
+    spans, rows, start = {}, [], 0
+    for key, key_rows in postings.items():
+        spans[key] = [start, start + len(key_rows)]
+        rows.extend(key_rows)
+        start += len(key_rows)
+    np.save(os.path.join(out_dir, f"index.{field}.rows.npy"), np.asarray(rows, dtype=np.int64))
+    with open(os.path.join(out_dir, f"index.{field}.values.json"), "w", encoding="utf-8") as fh:
+        json.dump(spans, fh)
+
+
+# 3.  Reader
+
+class VectorSnapshot:
+    """
+    Memory-mapped, read-only view of one exported snapshot version.
+    Safe to share between threads; every process maps the same files.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "manifest.json"), encoding="utf-8") as fh:
+            self.manifest = json.load(fh)
+        self.version = self.manifest["version"]
+        self.space = self.manifest.get("space", "l2")
+
+        self.embeddings = np.load(os.path.join(path, "embeddings.npy"), mmap_mode="r")
+        self.norms = np.load(os.path.join(path, "norms.npy"), mmap_mode="r")
+        self._ids = _PackedColumn(os.path.join(path, "ids"))
+        self._metadatas = _PackedColumn(os.path.join(path, "metadatas"))
+        self._documents = _PackedColumn(os.path.join(path, "documents"))
+        self._load_quantized()
+        self._index = {
+            field: _FieldIndex(path, field) for field in self.manifest.get("indexed_fields", [])
+        }
+
+        # decoded lazily, only what filtering / id lookup needs
+        self._meta_cache: Optional[List[dict]] = None
+        self._id_index: Optional[dict] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return int(self.manifest["count"])
+
+    def _load_quantized(self) -> None:
+        self.int8 = self.pq = None
+        available = self.manifest.get("quantization", [])
+        if "int8" in available:
+            self.int8 = (
+                Int8Quantizer(np.load(os.path.join(self.path, "int8.scale.npy"))),
+                np.load(os.path.join(self.path, "embeddings.int8.npy"), mmap_mode="r"),
+                np.load(os.path.join(self.path, "int8.norms.npy"), mmap_mode="r"),
+            )
+        if "pq" in available:
+            self.pq = (
+                ProductQuantizer(np.load(os.path.join(self.path, "pq.codebooks.npy"))),
+                np.load(os.path.join(self.path, "pq.codes.npy"), mmap_mode="r"),
+            )
+
+    def approx_distances(
+        self,
+        query: np.ndarray,
+        rows: Optional[np.ndarray],
+        mode: str,
+    ) -> Optional[np.ndarray]:
+        """First-pass distances from quantized codes, or None if `mode` is unavailable."""
+        if mode == "int8" and self.int8 is not None:
+            quant, codes, norms = self.int8
+            if rows is not None:
+                codes, norms = codes[rows], norms[rows]
+            return quant.distances(codes, norms, query)
+        if mode == "pq" and self.pq is not None:
+            quant, codes = self.pq
+            return quant.distances(codes if rows is None else codes[rows], query)
+        return None
+
+    # ---- row accessors ----
+    def id_at(self, i: int) -> str:
+        return self._ids.raw(i).decode("utf-8")
+
+    def metadata_at(self, i: int) -> dict:
+        if self._meta_cache is not None:
+            return self._meta_cache[i]
+        return json.loads(self._metadatas.raw(i))
+
+    def document_at(self, i: int) -> Document:
+        return Document(
+            page_content=self._documents.raw(i).decode("utf-8"),
+            metadata=dict(self.metadata_at(i)),
+        )
+
+    def row_of(self, doc_id: str) -> Optional[int]:
+        if self._id_index is None:
+            with self._lock:
+                if self._id_index is None:
+                    self._id_index = {self.id_at(i): i for i in range(len(self))}
+        return self._id_index.get(doc_id)
+
+    def _all_metadatas(self) -> List[dict]:
+        if self._meta_cache is None:
+            with self._lock:
+                if self._meta_cache is None:
+                    self._meta_cache = [
+                        json.loads(self._metadatas.raw(i)) for i in range(len(self))
+                    ]
+        return self._meta_cache
+
+    def _index_rows(self, where: dict) -> Optional[np.ndarray]:
+        """Rows matching `where` from the metadata index, None if it cannot answer it."""
+        parts = []
+        for key, cond in where.items():
+            if key in ("$and", "$or"):
+                subs = [self._index_rows(sub) for sub in cond]
+                if any(sub is None for sub in subs):
+                    return None
+                if key == "$and":
+                    part = functools.reduce(np.intersect1d, subs, np.arange(len(self)))
+                else:
+                    part = functools.reduce(np.union1d, subs, np.zeros(0, dtype=np.int64))
+            elif key in self._index:
+                part = self._index[key].match(cond)
+                if part is None:
+                    return None
+            else:
+                return None
+            parts.append(part)
+        return functools.reduce(np.intersect1d, parts, np.arange(len(self)))
+
+    def filter_rows(self, where: Optional[dict]) -> Optional[np.ndarray]:
+        """Row indices matching `where` (ascending), or None when no filter applies."""
+        if not where:
+            return None
+        rows = self._index_rows(where)
+        if rows is not None:
+            return rows.astype(np.int64, copy=False)
+        metas = self._all_metadatas()                 # field not indexed: scan in Python
+        return np.fromiter(
+            (i for i, m in enumerate(metas) if matches_filter(m, where)),
+            dtype=np.int64,
+        )
+
+    # ---- search ----
+    def distances(self, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Chroma-compatible distances from `query` to `rows` (all rows if None)."""
+        emb = self.embeddings if rows is None else self.embeddings[rows]
+        dots = emb @ query
+        if self.space == "ip":
+            return 1.0 - dots
+        if self.space == "cosine":
+            norms = self.norms if rows is None else self.norms[rows]
+            denom = np.sqrt(norms) * float(np.linalg.norm(query)) + 1e-12
+            return 1.0 - dots / denom
+        norms = self.norms if rows is None else self.norms[rows]
+        return norms - 2.0 * dots + float(query @ query)
+
+    def similarity_search_by_vector_with_score(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Optional[dict] = None,
+        quantization: Optional[str] = None,
+    ) -> List[Tuple[Document, float]]:
+        """Same contract as `Chroma.similarity_search_by_vector_with_relevance_scores`."""
+        return [
+            (self.document_at(r), d)
+            for r, d in self.search_rows(embedding, k, filter, quantization)
+        ]
+
+    def search_rows(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Optional[dict] = None,
+        quantization: Optional[str] = None,
+    ) -> List[Tuple[int, float]]:
+        """(row, exact distance) for the `k` nearest rows, closest first."""
+        if len(self) == 0:
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+        rows = self.filter_rows(filter)
+        if rows is not None and rows.size == 0:
+            return []
+        n_rows = len(self) if rows is None else rows.size
+
+        approx = None
+        if n_rows > k * RESCORE_FACTOR:
+            approx = self.approx_distances(query, rows, quantization or QUANTIZATION)
+
+        if approx is not None:
+            # rescore the shortlist against full-precision rows read on demand
+            cand = top_candidates(approx, k * RESCORE_FACTOR)
+            cand_rows = cand if rows is None else rows[cand]
+            cand_rows = np.sort(cand_rows)     # sequential reads from the mmap
+            dist = self.distances(query, cand_rows)
+            rows = cand_rows
+        else:
+            dist = self.distances(query, rows)
+
+        k = min(k, dist.shape[0])
+        top = np.argpartition(dist, k - 1)[:k]
+        top = top[np.argsort(dist[top])]
+
+        row_ids = top if rows is None else rows[top]
+        return [(int(r), float(d)) for r, d in zip(row_ids, dist[top])]
+
+    def close(self) -> None:
+        for col in (self._ids, self._metadatas, self._documents):
+            col.close()
+        # numpy memmaps unmap once the last reference is gone
+        self.embeddings = self.norms = self.int8 = self.pq = None
+        self._index = {}
+
+
+# 4.  Exporter
+
+def default_root() -> str:
+    """Snapshot tree of the live collection (one per embedding dimension)."""
+    return os.path.join(SNAPSHOT_PATH, collection_name())
+
+
+def _current_version_name(snapshot_root: str) -> Optional[str]:
+    try:
+        with open(os.path.join(snapshot_root, "CURRENT"), encoding="utf-8") as fh:
+            return fh.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _next_version(snapshot_root: str) -> int:
+    versions = [
+        int(name[1:]) for name in os.listdir(snapshot_root)
+        if name.startswith("v") and name[1:].isdigit()
+    ]
+    return max(versions, default=0) + 1
+
+
+def _prune_versions(snapshot_root: str, keep: int) -> None:
+    versions = sorted(
+        (int(name[1:]) for name in os.listdir(snapshot_root)
+         if name.startswith("v") and name[1:].isdigit()),
+        reverse=True,
+    )
+    # workers still mapping an old version keep their pages; unlinking is safe
+    for v in versions[keep:]:
+        shutil.rmtree(os.path.join(snapshot_root, f"v{v}"), ignore_errors=True)
+
+
+def _write_quantized(out_dir: str, quantization: str) -> List[str]:
+    embeddings = np.load(os.path.join(out_dir, "embeddings.npy"), mmap_mode="r")
+    if embeddings.size == 0 or quantization == "none":
+        return []
+
+    written = []
+    int8 = Int8Quantizer.fit(embeddings)
+    codes = np.lib.format.open_memmap(
+        os.path.join(out_dir, "embeddings.int8.npy"),
+        mode="w+", dtype=np.int8, shape=embeddings.shape,
+    )
+    for start in range(0, len(embeddings), EXPORT_BATCH):
+        codes[start:start + EXPORT_BATCH] = int8.encode(embeddings[start:start + EXPORT_BATCH])
+    codes.flush()
+    np.save(os.path.join(out_dir, "int8.scale.npy"), int8.scale)
+    np.save(os.path.join(out_dir, "int8.norms.npy"), int8.sq_norms(codes))
+    del codes
+    written.append("int8")
+
+    if quantization == "pq" and embeddings.shape[1] % PQ_SUBSPACES == 0:
+        pq = ProductQuantizer.fit(embeddings, m=PQ_SUBSPACES)
+        np.save(os.path.join(out_dir, "pq.codebooks.npy"), pq.codebooks)
+        np.save(os.path.join(out_dir, "pq.codes.npy"), pq.encode(embeddings))
+        written.append("pq")
+    return written
+
+
+def export_snapshot(
+    db: Optional["Chroma"] = None,
+    snapshot_root: Optional[str] = None,
+    quantization: str = QUANTIZATION,
+) -> dict:
+    """
+    Write the current collection into a new snapshot version and flip
+    CURRENT to it atomically. Returns a summary dict.
+    """
+    if db is None:
+        db = get_db()
+    snapshot_root = snapshot_root or os.path.join(SNAPSHOT_PATH, db._collection.name)
+
+    os.makedirs(snapshot_root, exist_ok=True)
+    version = _next_version(snapshot_root)
+    final_dir = os.path.join(snapshot_root, f"v{version}")
+    tmp_dir = final_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    # one snapshot for the whole corpus, whatever the number of shards
+    sources = get_shards(db)
+    count = sum(len(src.get(include=[])["ids"]) for src in sources)
+    ids, metas, docs, norms = [], [], [], []
+    postings = {field: {} for field in INDEXED_FIELDS}     # field -> json(value) -> rows
+    dim, emb_out, row = 0, None, 0
+
+    for src in sources:
+        src_count = len(src.get(include=[])["ids"])
+        for offset in range(0, src_count, EXPORT_BATCH):
+            batch = src.get(
+                include=["embeddings", "metadatas", "documents"],
+                limit=EXPORT_BATCH,
+                offset=offset,
+            )
+            vectors = np.asarray(batch["embeddings"], dtype=np.float32)
+            if emb_out is None:
+                dim = vectors.shape[1]
+                emb_out = np.lib.format.open_memmap(
+                    os.path.join(tmp_dir, "embeddings.npy"),
+                    mode="w+", dtype=np.float32, shape=(count, dim),
+                )
+            emb_out[row:row + len(vectors)] = vectors
+            for i, meta in enumerate(batch["metadatas"], start=row):
+                for field in INDEXED_FIELDS:
+                    if meta and field in meta:
+                        postings[field].setdefault(json.dumps(meta[field]), []).append(i)
+            row += len(vectors)
+            norms.append(np.einsum("ij,ij->i", vectors, vectors))
+
+            ids.extend(i.encode("utf-8") for i in batch["ids"])
+            metas.extend(json.dumps(m or {}).encode("utf-8") for m in batch["metadatas"])
+            docs.extend((d or "").encode("utf-8") for d in batch["documents"])
+
+    if emb_out is None:
+        np.save(os.path.join(tmp_dir, "embeddings.npy"), np.zeros((0, 0), dtype=np.float32))
+    else:
+        emb_out.flush()
+        del emb_out
+    np.save(
+        os.path.join(tmp_dir, "norms.npy"),
+        np.concatenate(norms) if norms else np.zeros(0, dtype=np.float32),
+    )
+    _write_packed(os.path.join(tmp_dir, "ids"), ids)
+    _write_packed(os.path.join(tmp_dir, "metadatas"), metas)
+    _write_packed(os.path.join(tmp_dir, "documents"), docs)
+    for field, field_postings in postings.items():
+        _write_field_index(tmp_dir, field, field_postings)
+
+    quantized = _write_quantized(tmp_dir, quantization)
+
+    space = (db._collection.metadata or {}).get("hnsw:space", "l2")
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "version": version,
+        "count": len(ids),
+        "dim": dim,
+        "space": space,
+        "quantization": quantized,
+        "indexed_fields": list(INDEXED_FIELDS),
+        "created_at": datetime.utcnow().isoformat(),
+    }
+    with open(os.path.join(tmp_dir, "manifest.json"), "w", encoding="utf-8") as fh:
+        json.dump(manifest, fh, indent=2)
+
+    os.replace(tmp_dir, final_dir)
+    current_tmp = os.path.join(snapshot_root, "CURRENT.tmp")
+    with open(current_tmp, "w", encoding="utf-8") as fh:
+        fh.write(f"v{version}")
+    os.replace(current_tmp, os.path.join(snapshot_root, "CURRENT"))
+    _prune_versions(snapshot_root, KEEP_VERSIONS)
+
+    print(f"📦 Exported snapshot v{version} ({len(ids)} chunks, dim={dim})")
+    return {"success": True, "path": final_dir, **manifest}
+
+
+def snapshot_exists(snapshot_root: Optional[str] = None) -> bool:
+    return _current_version_name(snapshot_root or default_root()) is not None
+
+
+def refresh_snapshot_if_present(db: Optional["Chroma"] = None) -> Optional[dict]:
+    """Re-export after the collection changed, but only if snapshots are in use."""
+    root = os.path.join(SNAPSHOT_PATH, db._collection.name) if db else None
+    if not snapshot_exists(root):
+        return None
+    return export_snapshot(db)
+
+
+# 5.  Per-process loader
+
+_loaded: Optional[VectorSnapshot] = None
+_loaded_name: Optional[str] = None
+_load_lock = threading.Lock()
+_retired: List[Tuple[float, VectorSnapshot]] = []     # (retired at, snapshot)
+
+
+def _retire_loaded() -> None:
+    """Swap out the mapped snapshot; it is closed RETIRE_GRACE seconds later. Caller holds _load_lock."""
+    global _loaded, _loaded_name
+
+    if _loaded is not None:
+        _retired.append((time.monotonic(), _loaded))
+    _loaded = _loaded_name = None
+
+
+def _close_retired() -> None:
+    """Unmap snapshots retired long enough ago that no search can still be reading them."""
+    cutoff = time.monotonic() - RETIRE_GRACE
+    while _retired and _retired[0][0] <= cutoff:
+        _retired.pop(0)[1].close()
+
+
+def load_snapshot(snapshot_root: Optional[str] = None) -> Optional[VectorSnapshot]:
+    """
+    Return the live snapshot, memory-mapped read-only, or None if no snapshot
+    has been exported. Re-maps automatically when CURRENT moves to a new version;
+    the replaced one is unmapped after RETIRE_GRACE.
+    """
+    global _loaded, _loaded_name
+
+    snapshot_root = snapshot_root or default_root()
+    name = _current_version_name(snapshot_root)
+    path = os.path.join(snapshot_root, name) if name else None
+    if path is not None and _loaded is not None and path == _loaded_name and not _retired:
+        return _loaded
+
+    with _load_lock:
+        _close_retired()
+        if path is None:
+            if _loaded_name is not None and _loaded_name.startswith(snapshot_root + os.sep):
+                _retire_loaded()                     # snapshot dropped (populate --reset)
+            return None
+        if _loaded is None or path != _loaded_name:
+            _retire_loaded()
+            _loaded = VectorSnapshot(path)
+            _loaded_name = path
+        return _loaded
+
+
+def drop_snapshots() -> None:
+    """Delete every exported snapshot (populate --reset); workers stop using theirs on the next query."""
+    shutil.rmtree(SNAPSHOT_PATH, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    import sys
+
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "export"
+    if cmd == "export":
+        print(export_snapshot())
+    elif cmd == "info":
+        snap = load_snapshot()
+        print(snap.manifest if snap else "No snapshot exported yet.")
+    else:
+        print("usage: python -m utils.vector_snapshot [export|info]")
@@ -0,0 +1,359 @@
+"""
+vector_store.py
+—————————————————————————————————
+Single place that knows how to open the Chroma collection.
+
+Each embedding dimension lives in its own collection, because vectors of
+different sizes cannot share an index:
+
+    1536 (native)  -> "langchain"        (the original collection name)
+    512            -> "langchain_d512"
+
+The live dimension comes from EMBEDDING_DIMENSIONS (see get_embedding_function).
+
+Client / server
+---------------
+By default Chroma is embedded: each process opens the files in chroma/.
+With CHROMA_HOST (and CHROMA_PORT) set, every process talks to one Chroma
+server over a pooled HTTP client instead. API nodes then share a single
+store, can be scaled out, and ingestion can run anywhere. Either way
+`get_client()` hands out one client per process.
+
+Shards
+------
+With VECTOR_SHARDS=N (> 1) chunks are not stored in the collection itself
+but in N collections "langchain__shard0" … "langchain__shard{N-1}"; a
+PDF's chunks all go to shard md5(source) % N. `get_shards(db)` lists
+them (just [db] when unsharded), so callers loop over it.
+
+Partitions
+----------
+With VECTOR_PARTITIONS=role (or "role,topic") ingestion also copies every
+chunk into one small collection per audience role / topic tag, e.g.
+"langchain__role_developer", "langchain__topic_ai". Queries then search only
+the partitions matching the user's role and interests instead of the whole
+collection with a metadata filter, as long as the partitions cover the
+whole filter (see utils/retrieval.partitions_for) and no snapshot has been
+exported (the snapshot takes precedence).
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from utils.get_embedding_function import (
+    NATIVE_DIMENSIONS,
+    get_embedding_dimensions,
+    get_embedding_function,
+)
+
+if TYPE_CHECKING:
+    from langchain_chroma import Chroma
+
+CHROMA_PATH = "chroma"
+BASE_COLLECTION = "langchain"
+
+# client/server mode: set CHROMA_HOST to use a running `chroma run` server
+# instead of the embedded store in CHROMA_PATH
+CHROMA_HOST = os.getenv("CHROMA_HOST", "")
+CHROMA_PORT = int(os.getenv("CHROMA_PORT", "8000"))
+CHROMA_SSL = os.getenv("CHROMA_SSL", "0") == "1"
+CHROMA_HTTP_MAX_CONNECTIONS = int(os.getenv("CHROMA_HTTP_MAX_CONNECTIONS", "32"))
+CHROMA_HTTP_KEEPALIVE = float(os.getenv("CHROMA_HTTP_KEEPALIVE", "60"))   # seconds
+# >1 spreads chunks over N collections by hash of their source PDF;
+# retrieval searches them concurrently (utils/retrieval.search_shards)
+VECTOR_SHARDS = max(1, int(os.getenv("VECTOR_SHARDS", "1")))
+META_COLLECTION = "corpus_meta"         # server mode: holds the corpus version
+CORPUS_VERSION_TTL = float(os.getenv("CORPUS_VERSION_TTL", "2"))
+
+# which metadata tags get their own partition collections: "", "role", "role,topic"
+VECTOR_PARTITIONS = [
+    p.strip() for p in os.getenv("VECTOR_PARTITIONS", "").split(",") if p.strip()
+]
+# metadata key holding each partition kind's comma-separated tags (see tag_chunks)
+PARTITION_FIELDS = {"role": "audience", "topic": "topics"}
+# changes whenever chunks are added or removed; shared by all processes via disk
+CORPUS_VERSION_FILE = os.path.join(CHROMA_PATH, "corpus_version")
+
+
+def collection_name(dimensions: Optional[int] = None) -> str:
+    dims = get_embedding_dimensions(dimensions)
+    return BASE_COLLECTION if dims == NATIVE_DIMENSIONS else f"{BASE_COLLECTION}_d{dims}"
+
+
+def get_db(
+    dimensions: Optional[int] = None,
+    embedding_function=None,
+) -> "Chroma":
+    """Open the collection for `dimensions` (defaults to the configured one)."""
+    from langchain_chroma import Chroma   # chromadb is slow to import; only load it when used
+
+    dims = get_embedding_dimensions(dimensions)
+    return Chroma(
+        collection_name=collection_name(dims),
+        client=get_client(),
+        embedding_function=embedding_function or get_embedding_function(dims),
+    )
+
+
+# ---------- Client ---------- #
+_client = None
+_client_lock = threading.Lock()
+_opened_version: Optional[str] = None
+
+
+def server_mode() -> bool:
+    return bool(CHROMA_HOST)
+
+
+def _new_client():
+    import chromadb
+    from chromadb.config import Settings
+
+    if server_mode():
+        # one httpx pool per process, shared by every thread and collection
+        return chromadb.HttpClient(
+            host=CHROMA_HOST,
+            port=CHROMA_PORT,
+            ssl=CHROMA_SSL,
+            settings=Settings(
+                anonymized_telemetry=False,
+                chroma_http_keepalive_secs=CHROMA_HTTP_KEEPALIVE,
+                chroma_http_max_connections=CHROMA_HTTP_MAX_CONNECTIONS,
+                chroma_http_max_keepalive_connections=CHROMA_HTTP_MAX_CONNECTIONS,
+            ),
+        )
+    return chromadb.PersistentClient(
+        path=CHROMA_PATH, settings=Settings(anonymized_telemetry=False)
+    )
+
+
+def get_client():
+    """
+    The process-wide Chroma client: embedded (CHROMA_PATH) or, with
+    CHROMA_HOST set, HTTP to a shared Chroma server.
+
+    Embedded mode reopens it when another process changed the corpus
+    (populate / clear in another gunicorn worker), because an embedded
+    client keeps its own in-memory index. A server is always current.
+    """
+    global _client, _opened_version
+    version = None if server_mode() else corpus_version()
+    with _client_lock:
+        if _client is not None and version != _opened_version:
+            reset_client()
+        if _client is None:
+            _client = _new_client()
+            _opened_version = version
+        return _client
+
+
+def reset_client() -> None:
+    """Forget the cached client (after fork, or when embedded files changed)."""
+    global _client
+    from chromadb.api.shared_system_client import SharedSystemClient
+
+    _client = None
+    SharedSystemClient.clear_system_cache()      # chromadb caches one system per path / host
+
+
+def reset_store() -> None:
+    """Delete everything (populate --reset): the directory, or our collections on the server."""
+    if server_mode():
+        client = get_client()
+        for col in client.list_collections():
+            name = getattr(col, "name", col)
+            if name == BASE_COLLECTION or name.startswith(f"{BASE_COLLECTION}_"):
+                client.delete_collection(name)
+    elif os.path.exists(CHROMA_PATH):
+        with _client_lock:
+            reset_client()
+        shutil.rmtree(CHROMA_PATH)
+
+    from utils.vector_snapshot import drop_snapshots      # imports this module
+
+    drop_snapshots()               # a snapshot of the old corpus would keep serving it
+    bump_corpus_version()
+
+
+def store_location() -> str:
+    return f"http{'s' if CHROMA_SSL else ''}://{CHROMA_HOST}:{CHROMA_PORT}" if server_mode() else CHROMA_PATH
+
+
+# ---------- Corpus version ---------- #
+_version_cache = (0.0, "0")
+
+
+def corpus_version() -> str:
+    global _version_cache
+    if server_mode():
+        # kept on the server so every node agrees; re-read at most every CORPUS_VERSION_TTL s
+        fetched_at, version = _version_cache
+        if time.monotonic() - fetched_at < CORPUS_VERSION_TTL:
+            return version
+        meta = _meta_collection().metadata or {}
+        version = str(meta.get("version", "0"))
+        _version_cache = (time.monotonic(), version)
+        return version
+    try:
+        with open(CORPUS_VERSION_FILE, encoding="utf-8") as fh:
+            return fh.read().strip() or "0"
+    except FileNotFoundError:
+        return "0"
+
+
+def _meta_collection():
+    return get_client().get_or_create_collection(META_COLLECTION, embedding_function=None)
+
+
+def bump_corpus_version() -> str:
+    """Mark the corpus as changed (call after adding or deleting chunks)."""
+    global _version_cache
+    version = uuid.uuid4().hex
+    if server_mode():
+        _meta_collection().modify(metadata={"version": version})
+        _version_cache = (time.monotonic(), version)
+        return version
+    os.makedirs(CHROMA_PATH, exist_ok=True)
+    tmp = CORPUS_VERSION_FILE + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        fh.write(version)
+    os.replace(tmp, CORPUS_VERSION_FILE)
+    return version
+
+
+# ---------- Shards ---------- #
+def shard_of(source: str, shards: int = VECTOR_SHARDS) -> int:
+    # not hash(): must be stable across processes and restarts. Not crc32
+    # either – it is linear, and data/a1.pdf … data/a9.pdf all land together
+    digest = hashlib.md5((source or "").encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % shards
+
+
+def get_shard(index: int, db: Optional["Chroma"] = None) -> "Chroma":
+    from langchain_chroma import Chroma
+
+    db = db or get_db()
+    return Chroma(
+        collection_name=f"{db._collection.name}__shard{index}",
+        client=db._client,
+        embedding_function=db.embeddings,
+    )
+
+
+def get_shards(db: Optional["Chroma"] = None) -> List["Chroma"]:
+    """Every collection holding chunks of `db`: its shards, or `db` itself."""
+    db = db or get_db()
+    if VECTOR_SHARDS == 1:
+        return [db]
+    return [get_shard(i, db) for i in range(VECTOR_SHARDS)]
+
+
+def get_by_ids(db: "Chroma", ids: List[str], include: List[str]) -> dict:
+    """`db.get(ids=...)` across shards; result lists line up like Chroma's."""
+    merged: Dict[str, list] = {"ids": [], **{field: [] for field in include}}
+    for shard in get_shards(db):
+        part = shard.get(ids=ids, include=include)
+        merged["ids"].extend(part["ids"])
+        for field in include:
+            merged[field].extend(part[field])
+    return merged
+
+
+def count_chunks(db: Optional["Chroma"] = None) -> int:
+    return sum(shard._collection.count() for shard in get_shards(db))
+
+
+# ---------- Partitions ---------- #
+def partition_name(kind: str, value: str, base: Optional[str] = None) -> str:
+    """Collection holding the chunks tagged `value`, e.g. langchain__role_developer."""
+    slug = re.sub(r"[^a-z0-9]+", "-", value.lower()).strip("-") or "none"
+    return f"{base or collection_name()}__{kind}_{slug}"
+
+
+def get_partition(kind: str, value: str, db: Optional["Chroma"] = None) -> "Chroma":
+    """Open a partition of `db` (defaults to the live collection), sharing its client."""
+    from langchain_chroma import Chroma
+
+    db = db or get_db()
+    return Chroma(
+        collection_name=partition_name(kind, value, db._collection.name),
+        client=db._client,
+        embedding_function=db.embeddings,
+    )
+
+
+def partition_values(kind: str, metadata: dict) -> List[str]:
+    raw = metadata.get(PARTITION_FIELDS[kind]) or ""
+    return [v for v in raw.split(",") if v]
+
+
+def add_to_partitions(db: "Chroma", ids: List[str], base: Optional["Chroma"] = None) -> Dict[str, int]:
+    """
+    Copy the given chunks of `db` (with their stored embeddings, so nothing
+    is re-embedded) into every partition their tags map to. Partitions
+    belong to `base` (defaults to `db`; pass the main collection when `db`
+    is one of its shards).
+    """
+    if not VECTOR_PARTITIONS or not ids:
+        return {}
+    data = db.get(ids=ids, include=["embeddings", "metadatas", "documents"])
+
+    groups: Dict[tuple, List[int]] = {}
+    for i, meta in enumerate(data["metadatas"]):
+        for kind in VECTOR_PARTITIONS:
+            for value in partition_values(kind, meta or {}):
+                groups.setdefault((kind, value), []).append(i)
+
+    counts = {}
+    for (kind, value), rows in groups.items():
+        part = get_partition(kind, value, base or db)
+        part._collection.upsert(
+            ids=[data["ids"][i] for i in rows],
+            embeddings=[data["embeddings"][i] for i in rows],
+            metadatas=[data["metadatas"][i] for i in rows],
+            documents=[data["documents"][i] for i in rows],
+        )
+        counts[part._collection.name] = len(rows)
+    return counts
+
+
+def rebuild_partitions(batch_size: int = 1000, db: Optional["Chroma"] = None) -> Dict[str, int]:
+    """Backfill partitions of `db` (the live collection by default), e.g. after enabling them."""
+    db = db or get_db()
+    totals: Dict[str, int] = {}
+    for shard in get_shards(db):
+        all_ids = shard.get(include=[])["ids"]
+        for start in range(0, len(all_ids), batch_size):
+            for name, n in add_to_partitions(shard, all_ids[start:start + batch_size], db).items():
+                totals[name] = totals.get(name, 0) + n
+    return totals
+
+
+def drop_partitions(db: "Chroma") -> int:
+    """
+    Delete every partition collection belonging to `db`'s collection (and the
+    derived document index, "<name>__docs"); shards are kept.
+    """
+    prefix = f"{db._collection.name}__"
+    dropped = 0
+    for col in db._client.list_collections():
+        name = getattr(col, "name", col)       # chromadb returns names or objects
+        if name.startswith(prefix) and not name[len(prefix):].startswith("shard"):
+            db._client.delete_collection(name)
+            dropped += 1
+    return dropped
+
+
+if __name__ == "__main__":
+    import sys
+
+    if sys.argv[1:] == ["rebuild-partitions"]:
+        print(rebuild_partitions())
+    else:
+        print("usage: python -m utils.vector_store rebuild-partitions")
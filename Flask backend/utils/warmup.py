@@ -0,0 +1,177 @@
+"""
+warmup.py
+—————————————————————————————————
+Gets a new process hot before it takes traffic. Otherwise the first
+queries pay for opening Chroma, paging in the vector index, building the
+OpenAI clients and connecting to SQLite.
+
+`start_warmup()` runs these steps on a background thread:
+
+  1. profiles   – open the SQLite pool
+  2. collection – open Chroma and run one query so the HNSW index is loaded
+  3. snapshot   – map the vector snapshot (if exported) and touch its pages
+  4. clients    – build the (per-process, cached) embedding and chat clients
+
+and, opt-in, only when the query log is on (QUERY_LOG=1):
+
+  5. priming    – the WARMUP_QUERIES most asked questions of the last
+                  WARMUP_WINDOW_HOURS (utils/query_log.py): their profiles go
+                  into the profile cache and their embeddings into the query
+                  embedding cache, and each is retrieved once.
+                  There are no LLM calls.
+
+Without the log there is nothing to prime from, so the step is not run.
+
+`is_ready()` flips to True when it finishes. If a step fails, the error is
+recorded and the process is still marked ready, because a cold process
+beats no process. /api/status returns 503 until then. WARMUP=0 skips the
+warm-up entirely.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+
+WARMUP = os.getenv("WARMUP", "1") != "0"
+# set by gunicorn.conf.py: the master preloads the app but must not warm
+# Chroma / SQLite / HTTP clients – those don't survive fork; workers do it
+PREFORK_SERVER = os.getenv("PREFORK_SERVER") == "1"
+WARMUP_QUERIES = int(os.getenv("WARMUP_QUERIES", "20"))
+WARMUP_WINDOW_HOURS = float(os.getenv("WARMUP_WINDOW_HOURS", "24"))
+
+_status: dict = {"ready": False, "state": "pending", "steps": {}}
+_status_lock = threading.Lock()
+_started = False
+
+
+def _set_status(**fields) -> None:
+    with _status_lock:
+        _status.update(fields)
+
+
+def is_ready() -> bool:
+    with _status_lock:
+        return _status["ready"]
+
+
+def warmup_status() -> dict:
+    with _status_lock:
+        return {**_status, "steps": dict(_status["steps"])}
+
+
+# ---------- Steps ---------- #
+def _profiles() -> dict:
+    from sqlalchemy import text
+    from services.profile_service import SessionLocal
+
+    with SessionLocal() as session:
+        session.execute(text("SELECT 1"))
+    return {}
+
+
+def _collection() -> dict:
+    from utils.vector_store import get_db, get_shards
+
+    count = 0
+    for shard in get_shards(get_db()):
+        n = shard._collection.count()
+        if n:
+            sample = shard._collection.get(limit=1, include=["embeddings"])
+            shard._collection.query(query_embeddings=[list(sample["embeddings"][0])], n_results=1)
+        count += n
+    return {"chunks": count}
+
+
+def _snapshot() -> dict:
+    from utils.vector_snapshot import load_snapshot
+
+    snapshot = load_snapshot()
+    if snapshot is None:
+        return {"loaded": False}
+    snapshot.embeddings.sum()          # fault the mmap'd pages in once
+    return {"loaded": True, "rows": len(snapshot)}
+
+
+def _clients() -> dict:
+    from utils.get_embedding_function import get_embedding_function
+    from utils.query_rag import _get_llm
+
+    # both are cached per process, so these are the instances requests use
+    get_embedding_function()
+    _get_llm()
+    return {}
+
+
+def _prime() -> dict:
+    from services.profile_service import get_many
+    from utils.query_log import frequent
+    from utils.query_rag import prime_query_embeddings
+    from utils.retrieval import FIRST_PASS_K, retrieve
+    from utils.get_embedding_function import get_embedding_function
+
+    top = frequent(WARMUP_QUERIES, WARMUP_WINDOW_HOURS)
+    if not top:
+        return {"queries": 0}
+    profiles = get_many({uid for _, uid, _ in top})          # fills the profile cache
+    vectors = prime_query_embeddings([q for q, _, _ in top])
+    embedding_fn = get_embedding_function()
+    for (query, uid, _n), vec in zip(top, vectors):
+        if uid in profiles:
+            retrieve(vec, profiles[uid], embedding_fn, k=FIRST_PASS_K)
+    return {"queries": len(top), "users": len(profiles)}
+
+
+STEPS = [
+    ("profiles", _profiles),
+    ("collection", _collection),
+    ("snapshot", _snapshot),
+    ("clients", _clients),
+]
+PRIMING_STEP = ("priming", _prime)     # opt-in: needs the query log
+
+
+def warm_up() -> dict:
+    """Run every step in order; a failing step is recorded and skipped."""
+    from utils.query_log import QUERY_LOG
+
+    _set_status(state="running", started_at=datetime.utcnow().isoformat(), steps={})
+    t_start = time.perf_counter()
+    errors = {}
+    for name, step in STEPS + ([PRIMING_STEP] if QUERY_LOG else []):
+        t0 = time.perf_counter()
+        try:
+            info = step()
+        except Exception as exc:
+            info, errors[name] = {}, str(exc)
+        with _status_lock:
+            _status["steps"][name] = {"ms": round((time.perf_counter() - t0) * 1000, 1), **info}
+    seconds = round(time.perf_counter() - t_start, 2)
+    _set_status(ready=True, state="done", seconds=seconds, errors=errors,
+                finished_at=datetime.utcnow().isoformat())
+    print(f"🔥 Warm-up finished in {seconds}s" + (f" (errors: {errors})" if errors else ""))
+    return warmup_status()
+
+
+def start_warmup(force: bool = False) -> None:
+    """Kick off `warm_up` once per process on a daemon thread."""
+    global _started
+    if PREFORK_SERVER and not force:
+        return                     # pre-fork master: utils/prefork.after_fork starts it
+    with _status_lock:
+        if _started:
+            return
+        _started = True
+    if not WARMUP:
+        _set_status(ready=True, state="skipped")
+        return
+    threading.Thread(target=warm_up, name="warmup", daemon=True).start()
+
+
+def reset_after_fork() -> None:
+    """A forked worker starts un-warmed, whatever the parent's flags said."""
+    global _started, _status_lock
+    _status_lock = threading.Lock()          # the parent may have held it at fork
+    _started = False
+    _status.clear()
+    _status.update(ready=False, state="pending", steps={})
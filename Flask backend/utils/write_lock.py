@@ -0,0 +1,41 @@
+"""
+write_lock.py
+—————————————————————————————————
+One writer at a time for the Chroma directory, across every process
+(gunicorn workers, CLI scripts). Populate, clear and embedding migration
+take the lock; readers never do.
+
+The lock file sits next to chroma/ (not inside it) so `clear` can delete
+the directory while holding it.
+"""
+
+import os
+from contextlib import contextmanager
+from typing import Optional
+
+from filelock import FileLock, Timeout
+
+WRITE_LOCK_PATH = os.getenv("CHROMA_WRITE_LOCK", "chroma.write.lock")
+WRITE_LOCK_TIMEOUT = float(os.getenv("CHROMA_WRITE_LOCK_TIMEOUT", "30"))   # seconds
+
+
+class WriterBusy(Exception):
+    """Another process is already writing to Chroma."""
+
+
+@contextmanager
+def single_writer(timeout: Optional[float] = None):
+    lock = FileLock(WRITE_LOCK_PATH)
+    try:
+        lock.acquire(timeout=WRITE_LOCK_TIMEOUT if timeout is None else timeout)
+    except Timeout:
+        raise WriterBusy("Another populate / clear / migration is in progress.") from None
+    try:
+        yield
+    finally:
+        lock.release()
+
+
+def busy_result(exc: WriterBusy) -> dict:
+    # picked up by app.py to answer 409
+    return {"success": False, "busy": True, "message": str(exc)}
@@ -0,0 +1,17 @@
+"""
+wsgi.py
+—————————————————————————————————
+WSGI entry point for the pre-fork server:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+With `preload_app` this is imported once in the master, so the read-only
+shared state is loaded here and inherited by every worker.
+"""
+
+from app import app
+from utils.prefork import preload_shared_state
+
+preload_shared_state()
+
+application = app